@@ -1,15 +1,29 @@
 from pathlib import Path
 
 import pandas as pd
-from model.analysis import Analysis
+from model.metrics import load_rates
 from model.state import CancerState, HpvState, HpvStrain
 
-from src.helper_functions import combine_age_groups
+from src.helper_functions import combine_age_groups, count_entries
+
+
+# ----- The rates behind the targets. Runs count them into metrics.parquet (see `metrics` in the parameters), so the
+# targets can be made without the state changes.
+TARGET_METRICS = {
+    "hpv_lr": dict(kind="prevalence", field=HpvStrain.LOW_RISK.name, states=HpvState.HPV.value),
+    "hpv_hr": dict(kind="prevalence", field=HpvStrain.HIGH_RISK.name, states=HpvState.HPV.value),
+    "hpv_16": dict(kind="prevalence", field=HpvStrain.SIXTEEN.name, states=HpvState.HPV.value),
+    "hpv_18": dict(kind="prevalence", field=HpvStrain.EIGHTEEN.name, states=HpvState.HPV.value),
+    "cin23_hr": dict(kind="prevalence", field=HpvStrain.HIGH_RISK.name, states=HpvState.CIN_2_3.value),
+    "cin23_16": dict(kind="prevalence", field=HpvStrain.SIXTEEN.name, states=HpvState.CIN_2_3.value),
+    "cin23_18": dict(kind="prevalence", field=HpvStrain.EIGHTEEN.name, states=HpvState.CIN_2_3.value),
+    "cancer_inc": dict(kind="incidence", field=CancerState.id, states=CancerState.LOCAL.value),
+}
 
 
 def run_analysis(scenario_dir: Path, iteration: int):
 
-    analysis = Analysis(scenario_dir, iteration)
+    rates = load_rates(scenario_dir, iteration, TARGET_METRICS)
 
     hpv_age_groups = [20, 30, 40, 50, 60, 100]
     cin23_age_groups = [20, 25, 30, 40, 50, 60, 80, 100]
@@ -17,39 +31,33 @@ def run_analysis(scenario_dir: Path, iteration: int):
 
     # ----- The HPV Prevalence Targets -------------------------------------------------------------------------------
     # (1) ----- Low-Risk HPV Prevalence
-    df = analysis.prevalence(field=HpvStrain.LOW_RISK.name, states=(HpvState.HPV.value,),)
-    results_df = combine_age_groups(df=df * 100, ages=hpv_age_groups, target="HPV_LR").loc[0:3]
+    results = [combine_age_groups(df=rates["hpv_lr"] * 100, ages=hpv_age_groups, target="HPV_LR").loc[0:3]]
     # (2) ----- High-Risk HPV Prevalence
-    df = analysis.prevalence(field=HpvStrain.HIGH_RISK.name, states=(HpvState.HPV,),)
-    results_df = results_df.append(combine_age_groups(df=df * 100, ages=hpv_age_groups, target="HPV_HR").loc[0:3])
+    results.append(combine_age_groups(df=rates["hpv_hr"] * 100, ages=hpv_age_groups, target="HPV_HR").loc[0:3])
     # (3) ----- 16
-    df = analysis.prevalence(field=HpvStrain.SIXTEEN.name, states=(HpvState.HPV,),)
-    results_df = results_df.append(combine_age_groups(df=df * 100, ages=hpv_age_groups, target="HPV_16").loc[0:3])
+    results.append(combine_age_groups(df=rates["hpv_16"] * 100, ages=hpv_age_groups, target="HPV_16").loc[0:3])
     # (4) ----- 18
-    df = analysis.prevalence(field=HpvStrain.EIGHTEEN.name, states=(HpvState.HPV,),)
-    results_df = results_df.append(combine_age_groups(df=df * 100, ages=hpv_age_groups, target="HPV_18").loc[0:3])
+    results.append(combine_age_groups(df=rates["hpv_18"] * 100, ages=hpv_age_groups, target="HPV_18").loc[0:3])
 
     # ----- The 6 CIN23 Prevalence Targets -----------------------------------------------------------------------------
     # (5) ----- High-Risk
-    df = analysis.prevalence(field=HpvStrain.HIGH_RISK.name, states=(HpvState.CIN_2_3,),)
-    results_df = results_df.append(combine_age_groups(df=df * 100, ages=cin23_age_groups, target="CIN23_HR").loc[0:5])
+    results.append(combine_age_groups(df=rates["cin23_hr"] * 100, ages=cin23_age_groups, target="CIN23_HR").loc[0:5])
     # (6) ----- SIXTEEN
-    df = analysis.prevalence(field=HpvStrain.SIXTEEN.name, states=(HpvState.CIN_2_3,),)
-    results_df = results_df.append(combine_age_groups(df=df * 100, ages=cin23_age_groups, target="CIN23_16").loc[0:5])
+    results.append(combine_age_groups(df=rates["cin23_16"] * 100, ages=cin23_age_groups, target="CIN23_16").loc[0:5])
     # (7) ----- EIGHTEEN
-    df = analysis.prevalence(field=HpvStrain.EIGHTEEN.name, states=(HpvState.CIN_2_3,),)
-    results_df = results_df.append(combine_age_groups(df=df * 100, ages=cin23_age_groups, target="CIN23_18").loc[0:5])
+    results.append(combine_age_groups(df=rates["cin23_18"] * 100, ages=cin23_age_groups, target="CIN23_18").loc[0:5])
 
     # ----- The Cancer Incidence Targets -------------------------------------------------------------------------------
     # (8) ----- Cancer Incidence Overall
-    df = 100_000 * analysis.incidence(CancerState.id, CancerState.LOCAL.value)
-    results_df = results_df.append(combine_age_groups(df=df, ages=cancer_age_groups, target="Cancer_Inc"))
+    df = 100_000 * rates["cancer_inc"]
+    results.append(combine_age_groups(df=df, ages=cancer_age_groups, target="Cancer_Inc"))
 
     # ----- Where did the Cancer come from -----------------------------------------------------------------------------
     # (9) ----- Cause of Cancer
-    cancer_16 = list(analysis.agent_events[HpvStrain.SIXTEEN.name]["To"].values).count(HpvState.CANCER.value)
-    cancer_18 = list(analysis.agent_events[HpvStrain.EIGHTEEN.name]["To"].values).count(HpvState.CANCER.value)
-    cancer_hr = list(analysis.agent_events[HpvStrain.HIGH_RISK.name]["To"].values).count(HpvState.CANCER.value)
+    iteration_dir = Path(scenario_dir).joinpath(f"iteration_{iteration}")
+    cancer_16 = count_entries(iteration_dir, HpvStrain.SIXTEEN.name, HpvState.CANCER.value)
+    cancer_18 = count_entries(iteration_dir, HpvStrain.EIGHTEEN.name, HpvState.CANCER.value)
+    cancer_hr = count_entries(iteration_dir, HpvStrain.HIGH_RISK.name, HpvState.CANCER.value)
     cancer_total = max(sum([cancer_16, cancer_18, cancer_hr]), 1)
     percent_16 = cancer_16 / cancer_total
     percent_18 = cancer_18 / cancer_total
@@ -58,8 +66,9 @@ def run_analysis(scenario_dir: Path, iteration: int):
     temp_df["Target"] = ["Cause of Cancer: 16", "Cause of Cancer: 18", "Cause of Cancer: HR"]
     temp_df["Age"] = "N/A"
     temp_df["Model"] = [percent_16, percent_18, percent_hr]
-    results_df = results_df.append(temp_df).reset_index(drop=True)
+    results.append(temp_df)
 
     # ---- Save as CSV
+    results_df = pd.concat(results).reset_index(drop=True)
     results_df.columns = ["Target", "Age", str(iteration)]
-    results_df.to_csv(analysis.iteration_dir.joinpath("analysis_values.csv"), index=False)
+    results_df.to_csv(iteration_dir.joinpath("analysis_values.csv"), index=False)
@@ -0,0 +1,78 @@
+import numpy as np
+
+from model.state import CancerDetectionState, CancerState, HivState, LifeState
+
+
+class ActiveSets:
+    def __init__(self, model):
+        """ Sorted index arrays of the agents that each state steps over. All sets only contain living agents.
+            - alive: every living agent
+            - cancer_free: agents without cancer (stepped by each HPV strain)
+            - undetected_cancer: agents with undetected cancer (stepped by cancer and cancer detection)
+            - hiv_negative: agents without HIV (stepped by HIV)
+        The sets are updated from the transitions that occur, instead of being rebuilt from the full population.
+        """
+        self.model = model
+        self.alive = None
+        self.cancer_free = None
+        self.undetected_cancer = None
+        self.hiv_negative = None
+        self.rebuild()
+
+    def rebuild(self):
+        """ Recompute every set from the state arrays. Required if the state arrays are changed directly.
+        """
+        alive = self.model.life.values == LifeState.ALIVE
+        cancer = self.model.cancer.values
+        self.alive = np.flatnonzero(alive)
+        self.cancer_free = np.flatnonzero(alive & (cancer == CancerState.NORMAL))
+        undetected = self.model.cancer_detection.values == CancerDetectionState.UNDETECTED
+        self.undetected_cancer = np.flatnonzero(alive & (cancer != CancerState.NORMAL) & undetected)
+        self.hiv_negative = np.flatnonzero(alive & (self.model.hiv.values == HivState.NORMAL))
+
+    # ----- Transitions ------------------------------------------------------------------------------------------------
+    def remove_dead(self, indices: np.array):
+        self.alive = remove_indices(self.alive, indices)
+        self.cancer_free = remove_indices(self.cancer_free, indices)
+        self.undetected_cancer = remove_indices(self.undetected_cancer, indices)
+        self.hiv_negative = remove_indices(self.hiv_negative, indices)
+
+    def add_cancer(self, indices: np.array):
+        self.cancer_free = remove_indices(self.cancer_free, indices)
+        self.undetected_cancer = add_indices(self.undetected_cancer, indices)
+
+    def remove_detected(self, indices: np.array):
+        self.undetected_cancer = remove_indices(self.undetected_cancer, indices)
+
+    def remove_hiv(self, indices: np.array):
+        self.hiv_negative = remove_indices(self.hiv_negative, indices)
+
+
+def remove_indices(array: np.array, indices: np.array) -> np.array:
+    """ Remove indices from a sorted array. Indices that are not in the array are ignored.
+    """
+    indices = np.atleast_1d(indices)
+    if len(indices) == 0 or len(array) == 0:
+        return array
+    positions = np.searchsorted(array, indices)
+    within = positions < len(array)
+    positions = positions[within]
+    return np.delete(array, positions[array[positions] == indices[within]])
+
+
+def add_indices(array: np.array, indices: np.array) -> np.array:
+    """ Add indices (that are not already present) to a sorted array, keeping it sorted.
+    """
+    indices = np.setdiff1d(indices, array)
+    if len(indices) == 0:
+        return array
+    return np.insert(array, np.searchsorted(array, indices), indices)
+
+
+def contains(array: np.array, indices: np.array) -> np.array:
+    """ Return a boolean array, one per index, that is True if the index is in the sorted array.
+    """
+    if len(array) == 0:
+        return np.zeros(len(indices), dtype=bool)
+    positions = np.minimum(np.searchsorted(array, indices), len(array) - 1)
+    return array[positions] == indices
@@ -0,0 +1,38 @@
+import numpy as np
+
+from model.state import TimeSinceCancerDetectionState
+
+# The value of facts that have not happened yet, such as the last screening age of a woman who was never screened
+NEVER = -1
+
+
+class AgentStore:
+    def __init__(self, count: int):
+        """ Preallocated arrays of per-agent facts that are not model states. Like every agent array, position i holds
+        the agent `model.unique_ids[i]`.
+            - last_screen_age: the age of the agent's last screening (NEVER if she has not been screened)
+            - cin_treatment_method: the index of the agent's CIN treatment method in
+              `CinTreatmentMethodFactory.methods` (NEVER until she is first treated)
+            - hiv_detected: the agent's HIV has been detected
+            - hpv_vaccinated: the agent has been vaccinated against HPV
+            - detection_time: the time step her cancer was detected (NEVER if it has not been)
+            - time_since_detection: the agent's `TimeSinceCancerDetectionState`
+        """
+        self.last_screen_age = np.full(count, NEVER, dtype=np.int16)
+        self.cin_treatment_method = np.full(count, NEVER, dtype=np.int8)
+        self.hiv_detected = np.zeros(count, dtype=bool)
+        self.hpv_vaccinated = np.zeros(count, dtype=bool)
+        self.detection_time = np.full(count, NEVER, dtype=np.int16)
+        self.time_since_detection = np.full(count, TimeSinceCancerDetectionState.UNDETECTED.value, dtype=np.int8)
+
+    def array_names(self) -> list:
+        """ Return the name of every array. Arrays hold one value (or column) per agent.
+        """
+        return [
+            "last_screen_age",
+            "cin_treatment_method",
+            "hiv_detected",
+            "hpv_vaccinated",
+            "detection_time",
+            "time_since_detection",
+        ]
@@ -44,18 +44,20 @@ class Analysis:
         self.chart_ids = [HivState.id, CancerState.id, CancerDetectionState.id, LifeState.id]
         self.chart_ids = self.chart_ids + [HpvStrain(strain).name for strain in HpvStrain]
 
-        self.agent_events = {}
+        # The state changes are only read when needed: prevalence on snapshots doesn't need them, and summary runs
+        # don't write them
+        self._state_events = None
+        self._agent_events = None
         agent_timelines = {}
 
-        self.state_events = pd.read_parquet(self.iteration_dir.joinpath("state_changes.parquet"))
+        # Runs with output snapshots saved each agent's states at every age - no need to rebuild the timelines
+        snapshot_dir = self.iteration_dir.joinpath("snapshots")
 
         for chart_id in self.chart_ids:
-            self.agent_events[chart_id] = (
-                self.state_events[self.state_events.State == chart_id]
-                .set_index(["Unique_ID", "Time"])
-                .drop(["State"], axis=1)
-            )
-            agent_timelines[chart_id] = self.create_timeline_from_events(self.agent_events[chart_id])
+            if snapshot_dir.exists():
+                agent_timelines[chart_id] = self.load_timeline(snapshot_dir.joinpath(f"{chart_id}.npy"))
+            else:
+                agent_timelines[chart_id] = self.create_timeline_from_events(self.agent_events[chart_id])
 
         self.agent_timeline = pd.DataFrame(agent_timelines)
 
@@ -67,13 +69,39 @@ class Analysis:
         self.cache_count_in = {}
         self.cache_count_new = {}
 
+    @property
+    def state_events(self) -> pd.DataFrame:
+        """ Every state change of the run, read from state_changes.parquet on first use
+        """
+        if self._state_events is None:
+            path = self.iteration_dir.joinpath("state_changes.parquet")
+            if not path.exists():
+                raise FileNotFoundError(f"{path} does not exist. State changes are only saved at output level full.")
+            self._state_events = pd.read_parquet(path)
+        return self._state_events
+
+    @property
+    def agent_events(self) -> dict:
+        """ The state changes of each statechart, with the age at which each happened
+        """
+        if self._agent_events is None:
+            self._agent_events = {}
+            for chart_id in self.chart_ids:
+                events = (
+                    self.state_events[self.state_events.State == chart_id]
+                    .set_index(["Unique_ID", "Time"])
+                    .drop(["State"], axis=1)
+                )
+                self.add_ages(events)
+                self._agent_events[chart_id] = events
+        return self._agent_events
+
     def create_timeline_from_events(self, events: pd.DataFrame) -> pd.Series:
         """ A timeline series contains one element per agent and time step, where every time step is represented.
             It provides the agent's state at each time step.
         """
-        events.reset_index(inplace=True)
-        events["Age"] = round(events["Time"] / self.params.steps_per_year, 0) + self.params.initial_age
-        events["Age"] = events["Age"].astype(int)
+        if "Age" not in events.columns:
+            self.add_ages(events)
         e_indexed = events.set_index(["Unique_ID", "Age"])
 
         # If there are multiple transitions for an index, go from 1 to 3, or 2 to 4. Instead of 1 to 2, and 2 to 3
@@ -83,10 +111,23 @@ class Analysis:
         # At the initial age: All start at the base state (1).
         timeline[(timeline.index.get_level_values("Age") == self.params.initial_age) & np.isnan(timeline.values)] = 1
         # Fill NAs with value above until reaching next valid value
-        timeline = timeline.fillna(method="ffill").astype("category")
+        timeline = timeline.ffill().astype("category")
 
         return timeline
 
+    def add_ages(self, events: pd.DataFrame):
+        """ Add the age at which each event happened
+        """
+        events.reset_index(inplace=True)
+        events["Age"] = round(events["Time"] / self.params.steps_per_year, 0) + self.params.initial_age
+        events["Age"] = events["Age"].astype(int)
+
+    def load_timeline(self, path: Path) -> pd.Series:
+        """ Create a timeline from a snapshot panel, which holds one row per age and one column per agent
+        """
+        panel = np.load(path, mmap_mode="r")
+        return pd.Series(panel.T.ravel(), index=self.agent_age_index, name="state").astype("category")
+
     def prevalence(self, field: str, states: tuple, filter_dict: dict = dict(), alive_only: bool = True):
         """ Return a series containing the prevalence rate for the given states. The prevalence rate at a given time
         step is defined as the proportion of the living population who are in one of the states at that time step.
@@ -1,16 +1,15 @@
-import pickle as pickle
-
 import numpy as np
 
-from model.misc_functions import normalize, random_selection
-from model.state import CancerDetectionState, CancerState, EventState, LifeState, TimeSinceCancerDetectionState
+from model.misc_functions import random_selections
+from model.random_streams import agent_random
+from model.state import CancerState, EventState, LifeState, TimeSinceCancerDetectionState
+from model.transition_table import load_transition_table
 
 
 class Cancer(EventState):
     def __init__(self, model):
-        with (open(model.transition_dir.joinpath("cancer_dictionary.pickle"), "rb")) as openfile:
-            cancer_dict = pickle.load(openfile)
-        super().__init__(enum=CancerState, transition_dict=cancer_dict)
+        cancer_table = load_transition_table(model.transition_dir, "cancer")
+        super().__init__(enum=CancerState, transition_dict=cancer_table)
         """ Cancer Status Tracker
             - Probability of NORMAL -> LOCAL transition is handled within the HPV class
             - Probability of further cancer progression is based on cancer detection and cancer states.
@@ -19,77 +18,62 @@ class Cancer(EventState):
                 - Cancer progression status changes (handled in this class)
         """
         self.model = model
+        self.rng = model.streams.stream("cancer")
         self.transition_probability_dict = self.make_transition_probabilities()
+        self.probability_table = self.transition_probability_dict
+        self.transition_cdf = self.transition_dict.conditional_cdf(state_axis=1)
         self.probabilities = np.zeros(0)
         # Everyone starts out cancer free
-        self.initiate(count=self.model.params.num_agents, state=CancerState.NORMAL, dtype=np.int8)
+        self.initiate(count=self.model.num_agents, state=CancerState.NORMAL, dtype=np.int8)
 
     def step(self):
         """ Simulate progression through the cancer states: Must be living, be LOCAL or REGIONAL, and not be detected
             Note: Transition from Normal to Cancer is handled elsewhere
         """
-        non_normal_status = np.isin(self.values, [CancerState.LOCAL, CancerState.REGIONAL])
-        not_detected = self.model.cancer_detection.values == CancerDetectionState.UNDETECTED
-        unique_ids = self.model.unique_ids[self.model.life.living & non_normal_status & not_detected]
-
-        probabilities = self.probabilities[unique_ids]
-        selected_agents = unique_ids[probabilities > self.model.rng.rand(len(probabilities))]
+        selected_agents = self.select_agents(self.eligible_agents())
 
-        # ----- Force a transition
-        for unique_id in selected_agents:
-            key = (self.model.cancer_detection.values[unique_id], self.values[unique_id])
+        # ----- Force a transition: the conditional cdfs are shared and read-only
+        if len(selected_agents) > 0:
+            detection_states = self.model.cancer_detection.values[selected_agents]
+            current_states = self.values[selected_agents]
+            cdfs = self.transition_cdf.gather(detection_states, current_states)
+            randoms = agent_random(self.rng, selected_agents)
+            new = random_selections(randoms, cdfs, self.integers).astype(self.values.dtype)
 
-            current_state = self.values[unique_id]
-            key = (self.model.cancer_detection.values[unique_id], current_state)
-            probs_list = self.transition_dict[key]
-            # --- Remove their current states probability
-            probs_list[current_state - 1] = 0
-            cdf = normalize(probs_list, return_cdf=True)
-            new = random_selection(self.model.rng.rand(), cdf, self.integers)
-
-            self.model.state_changes.record_event(
-                (self.model.time, unique_id, CancerState.int, self.values[unique_id], new)
-            )
-            self.values[unique_id] = new
+            self.model.record_state_changes(selected_agents, CancerState.int, current_states, new)
+            self.values[selected_agents] = new
 
             # ----- Update Cancer detection probability and cancer transition probability
-            self.model.cancer_detection.probabilities[unique_id] = self.model.cancer_detection.transition_dict[new]
-            key = (self.model.cancer_detection.values[unique_id], new)
-            self.probabilities[unique_id] = self.transition_probability_dict[key]
+            self.model.cancer_detection.refresh_probabilities(selected_agents)
+            self.refresh_probabilities(selected_agents)
 
             # ----- Update death probabilities
-            hiv_state = self.model.hiv.values[unique_id]
-            self.model.life.probabilities[unique_id] = self.model.life.transition_dict[(self.model.age, hiv_state, new)]
+            self.model.life.refresh_probabilities(selected_agents)
 
             # --- If agent dies:
-            if new == CancerState.DEAD:
-                self.model.state_changes.record_event(
-                    (self.model.time, unique_id, LifeState.int, LifeState.ALIVE.value, LifeState.DEAD.value)
-                )
-                self.model.life.values[unique_id] = LifeState.DEAD.value
+            died = selected_agents[new == CancerState.DEAD]
+            self.model.record_state_changes(died, LifeState.int, LifeState.ALIVE.value, LifeState.DEAD.value)
+            self.model.life.values[died] = LifeState.DEAD.value
+            self.model.active_sets.remove_dead(died)
 
-        # ----- Update Cancer Detection
-        for unique_id, v in self.model.dicts.time_since_cancer_detection.items():
-            if v == TimeSinceCancerDetectionState.WITHIN_5_YEARS:
-                if self.model.compute_years_since(self.model.dicts.cancer_detection_time[unique_id]) > 5:
-                    self.model.dicts.time_since_cancer_detection[
-                        unique_id
-                    ] = TimeSinceCancerDetectionState.BEYOND_5_YEARS.value
+        self.update_time_since_detection()
 
-    def make_transition_probabilities(self):
-        """ Create a dictionary of probabilities to transition (excluding the current state)
+    def update_time_since_detection(self):
+        """ Move agents detected more than 5 years ago to BEYOND_5_YEARS
         """
-        probs = dict()
-        for k, v in self.transition_dict.items():
-            state = k[1]
-            probability_to_transition = 1 - v[state - 1]
-            probs[k] = probability_to_transition
-        return probs
+        store = self.model.agent_store
+        within = store.time_since_detection == TimeSinceCancerDetectionState.WITHIN_5_YEARS
+        beyond = within & (self.model.compute_years_since(store.detection_time) > 5)
+        store.time_since_detection[beyond] = TimeSinceCancerDetectionState.BEYOND_5_YEARS.value
 
-    def initiate_probabilities(self):
-        """ Loop up each agents transition probability.
+    def make_transition_probabilities(self):
+        """ Create a table of probabilities to transition (excluding the current state)
         """
-        keys = list(zip(self.model.cancer_detection.values, self.values))
-        self.probabilities = np.zeros(len(keys))
-        for unique_id, key in enumerate(keys):
-            self.probabilities[unique_id] = self.transition_probability_dict[key]
+        return self.transition_dict.leave_probabilities(state_axis=1)
+
+    def eligible_agents(self) -> np.array:
+        unique_ids = self.model.active_sets.undetected_cancer
+        return unique_ids[np.isin(self.values[unique_ids], [CancerState.LOCAL, CancerState.REGIONAL])]
+
+    def probability_key(self, unique_ids) -> tuple:
+        return self.model.cancer_detection.values[unique_ids], self.values[unique_ids]
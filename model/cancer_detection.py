@@ -1,53 +1,80 @@
-import pickle
-
 import numpy as np
 
 from model.event import Event
 from model.state import CancerDetectionState, CancerState, EventState, TimeSinceCancerDetectionState
+from model.transition_table import PackedLookup, TransitionTable, load_transition_table
 
 
 class CancerDetection(EventState):
     def __init__(self, model):
-        with (open(model.transition_dir.joinpath("cancer_detection_dictionary.pickle"), "rb")) as openfile:
-            cancer_detection_dict = pickle.load(openfile)
-        super().__init__(enum=CancerDetectionState, transition_dict=cancer_detection_dict)
+        cancer_detection_table = load_transition_table(model.transition_dir, "cancer_detection")
+        super().__init__(enum=CancerDetectionState, transition_dict=cancer_detection_table)
         self.model = model
+        self.rng = model.streams.stream("cancer_detection")
         # No one can be deteced yet
-        self.initiate(count=self.model.params.num_agents, state=CancerDetectionState.UNDETECTED, dtype=np.int8)
-        self.probabilities = np.zeros(self.model.params.num_agents)
+        self.initiate(count=self.model.num_agents, state=CancerDetectionState.UNDETECTED, dtype=np.int8)
+        self.probabilities = np.zeros(self.model.num_agents)
 
     def step(self):
         """ Simulate NORMAL Cancer Detection: Must be alive, undetected, and have cancer
         Note: cancer.step() is responsible for updating the cancer_detection probabilities
         """
-        undetected = self.values == CancerDetectionState.UNDETECTED
-        non_normal_status = self.model.cancer.values != CancerState.NORMAL
-
-        use_agents = self.model.unique_ids[self.model.life.living & undetected & non_normal_status]
-        probabilities = self.probabilities[use_agents]
-        selected_agents = probabilities > self.model.rng.rand(len(probabilities))
-
-        from_v = CancerDetectionState.UNDETECTED.value
-        to_v = CancerDetectionState.DETECTED.value
-        for unique_id in self.model.unique_ids[use_agents][selected_agents]:
-            self.model.state_changes.record_event((self.model.time, unique_id, CancerDetectionState.int, from_v, to_v))
-            self.values[unique_id] = CancerDetectionState.DETECTED.value
-            # ----- Treat cancer and update dictionaries
-            self.treat_cancer(unique_id)
-            self.model.dicts.cancer_detection_time[unique_id] = self.model.time
-            self.model.dicts.time_since_cancer_detection[unique_id] = TimeSinceCancerDetectionState.WITHIN_5_YEARS.value
-
-    def treat_cancer(self, unique_id: int):
+        selected_agents = self.select_agents(self.eligible_agents())
+        self.model.active_sets.remove_detected(selected_agents)
+
+        self.model.record_state_changes(
+            selected_agents,
+            CancerDetectionState.int,
+            CancerDetectionState.UNDETECTED.value,
+            CancerDetectionState.DETECTED.value,
+        )
+        self.values[selected_agents] = CancerDetectionState.DETECTED.value
+        self.treat_detected(selected_agents)
+
+    def treat_detected(self, unique_ids: np.array):
+        """ Treat the cancer of newly detected agents and update their detection times
+        """
+        self.treat_cancer(unique_ids)
+        store = self.model.agent_store
+        store.detection_time[unique_ids] = self.model.time
+        store.time_since_detection[unique_ids] = TimeSinceCancerDetectionState.WITHIN_5_YEARS.value
+
+    def eligible_agents(self) -> np.array:
+        return self.model.active_sets.undetected_cancer
+
+    def probability_key(self, unique_ids) -> tuple:
+        return (self.model.cancer.values[unique_ids],)
+
+    def update_probabilities(self):
+        """ Detection probabilities are only looked up when an agent's cancer progresses (see `Cancer.step`)
+        """
+        pass
+
+    def make_packed_lookup(self) -> PackedLookup:
+        # Newly onset LOCAL cancers are never given a detection probability: the HPV step does not look one up, and
+        # one is only found once the cancer progresses. Zero the LOCAL entry so both lookup modes agree.
+        table = self.probability_table
+        table = TransitionTable(data=table.data.copy(), offsets=table.offsets, scalar_key=table.scalar_key)
+        table.data[CancerState.LOCAL.value - table.offsets[0]] = 0
+        return PackedLookup(table, age_axis=self.age_axis)
+
+    def treat_cancer(self, unique_ids: np.array):
         """ Other than the cost, the model doesn't explicitly implement anything related to cancer treatment.
         """
-        state = self.model.cancer.values[unique_id]
-        if state == CancerState.LOCAL:
-            cost = self.model.params.treatment.cancer_cost_local
-        elif state == CancerState.REGIONAL:
-            cost = self.model.params.treatment.cancer_cost_regional
-        elif state == CancerState.DISTANT:
-            cost = self.model.params.treatment.cancer_cost_distant
-        else:
-            raise NotImplementedError("Unexpected cancer state {}".format(state))
-
-        self.model.events.record_event((self.model.time, unique_id, Event.TREATMENT_CANCER.value, cost))
+        treatment = self.model.params.treatment
+        costs = {
+            CancerState.LOCAL.value: treatment.cancer_cost_local,
+            CancerState.REGIONAL.value: treatment.cancer_cost_regional,
+            CancerState.DISTANT.value: treatment.cancer_cost_distant,
+        }
+        states = self.model.cancer.values[unique_ids]
+        unexpected = ~np.isin(states, list(costs))
+        if unexpected.any():
+            raise NotImplementedError("Unexpected cancer state {}".format(states[unexpected][0]))
+        cost = np.zeros(len(unique_ids))
+        for state, state_cost in costs.items():
+            cost[states == state] = state_cost
+
+        self.model.events.record_events(
+            self.model.time, self.model.unique_ids[unique_ids], Event.TREATMENT_CANCER.value, cost
+        )
@@ -1,38 +1,61 @@
 import numpy as np
+import pandas as pd
 
 from enum import Enum
 from pathlib import Path
 from tqdm import trange
 
+from model.active_sets import ActiveSets
+from model.agent_store import NEVER, AgentStore
 from model.event import Event
 from model.logger import LoggerFactory
+from model.metrics import MetricsCollector
+from model.snapshots import StateSnapshots
 from model.parameters import Parameters
+from model.random_streams import RandomStreams, ReplicatedStreams, agent_random
 from model.vaccine import VaccinationProtocol
-from model.misc_functions import EventStorage
+from model.misc_functions import EventStorage, FirstPassageStorage, ParquetSink, SummaryStorage
 from model.treatment import CinTreatmentMethodFactory
+from model.waiting_times import WaitingTimes
+from model.screening_calendar import ScreeningCalendar
 from model.screening import ScreeningState, DnaScreeningTest, ViaScreeningTest, CancerInspectionScreeningTest, protocols
 from model.state import HpvState, HpvStrain, CancerDetectionState, HpvImmunity, Empty, int_map
+from model.state import CancerState, HivState, LifeState
 
 from model.cancer_detection import CancerDetection
 from model.cancer import Cancer
 from model.life import Life
 from model.hiv import Hiv
-from model.hpv import Hpv
+from model.hpv import Hpv, HpvStrains
 
 
 class CervicalModel:
-    def __init__(self, scenario_dir: Path, iteration: int = 0, logger: LoggerFactory = None, seed: int = 1111):
+    def __init__(
+        self,
+        scenario_dir: Path,
+        iteration: int = 0,
+        logger: LoggerFactory = None,
+        seed: int = 1111,
+        replications: int = 1,
+    ):
         """Create a new CervicalModel simulator.
 
         Args:
             scenario_dir (Path): Directory containing the model's input files.
             iteration (int, optional): [description]. Defaults to 0.
             logger (LoggerFactory, optional): Logger to use for writing log messages. Defaults to None.
-            seed (int, optional): [description]. Defaults to 1111.
+            seed (int, optional): The seed of the run's random streams. Each component's stream is derived from the
+                seed, the scenario name, and the iteration. Replication `r` draws from the streams of iteration
+                `iteration + r`, so it matches a run of that iteration on its own. Defaults to 1111.
+            replications (int, optional): The number of independent populations to simulate together. Replication
+                `r` holds agents `r * num_agents` to `(r + 1) * num_agents - 1`, and its output is written as
+                iteration `iteration + r`. Defaults to 1.
         """
 
         # ----- Setup the class structure
         self.scenario_dir = scenario_dir
+        self.iteration = iteration
+        self.replications = replications
         self.iteration_dir = self.scenario_dir.joinpath(f"iteration_{iteration}")
         self.iteration_dir.mkdir(exist_ok=True)
         # Use the iteration specific transition dictionaries if they exists
@@ -41,39 +64,49 @@ class CervicalModel:
             self.transition_dir = self.iteration_dir.joinpath("transition_dictionaries")
         self.params = Parameters()
         self.params.update_from_file(self.scenario_dir.joinpath("parameters.yml"))
+        # The agents of every replication
+        self.num_agents = self.params.num_agents * replications
         self.time = 0
-        self.rng = np.random.RandomState(seed)
+        # --- Each component draws from its own stream. `self.rng` is for anything without a stream of its own.
+        streams = [
+            RandomStreams(
+                seed, key=(self.scenario_dir.name, iteration + replication), buffer_size=self.params.random_buffer_size
+            )
+            for replication in range(replications)
+        ]
+        self.streams = streams[0] if replications == 1 else ReplicatedStreams(streams, self.replication_of)
+        self.rng = self.streams.stream("model")
         self.logger = logger
         self.logger.info("Random seed: {}".format(seed))
         self.logger.info("Model parameters: \n{}".format(self.params))
 
         # ----- Setup the storage containers
-        self.state_changes = EventStorage(column_names=["Time", "Unique_ID", "State_ID", "From", "To"])
-        self.events = EventStorage(column_names=["Time", "Unique_ID", "Event", "Cost"])
-        # --- Dictionaries
-        self.dicts = Empty("Collection of Dictionaries")
-        self.dicts.cancer_detection_time = dict()
-        self.dicts.time_since_cancer_detection = dict()
-        self.dicts.cin_treatment_methods = dict()
-        self.dicts.last_screen_age = dict()
-        # --- Sets
-        self.hiv_detected = set()
-        self.hpv_vaccinations = set()
+        self.setup_storage()
+        # --- Per-agent facts (screening history, treatment method, HIV detection, vaccination)
+        self.agent_store = AgentStore(count=self.num_agents)
 
         # ----- Setup the model states
         self.life = Life(model=self)
         self.hiv = Hiv(model=self)
         self.cancer_detection = CancerDetection(model=self)
         self.cancer = Cancer(model=self)
-        # --- HPV State: One for every strain
+        # --- HPV State: One for every strain. The strains' arrays are rows of the matrices in `self.hpv`
+        self.hpv = HpvStrains(model=self)
         self.hpv_strains = dict()
         for strain in [item.value for item in HpvStrain]:
             self.hpv_strains[strain] = Hpv(model=self, strain=strain)
+        self.setup_probability_lookup()
+        self.setup_sampling()
 
         # ----- Now that States are in place, load the agents
         self.load_agents()
 
+        self.setup_engine()
+        self.setup_metrics()
+        self.snapshots = StateSnapshots(model=self) if self.params.output.snapshots else None
+
         # ----- Setup the protocols
+        self.screening_calendar = ScreeningCalendar(model=self)
         self.cin_treatment_method_factory = CinTreatmentMethodFactory(model=self)
         self.via_screening_test = ViaScreeningTest(model=self)
         self.dna_screening_test = DnaScreeningTest(model=self)
@@ -88,7 +121,53 @@ class CervicalModel:
         )
         self.vaccination_protocol = VaccinationProtocol(model=self)
 
+    def setup_probability_lookup(self):
+        """ With a packed lookup, probabilities are found from the agents' current states instead of being cached
+        """
+        lookup = self.params.probability_lookup
+        if lookup not in ["cached", "packed"]:
+            raise ValueError(f"Unknown probability_lookup: {lookup}. Must be one of 'cached' or 'packed'.")
+        if lookup == "packed":
+            for state in self.event_states():
+                state.packed_lookup = state.make_packed_lookup()
+
+    def setup_sampling(self):
+        sampling = self.params.sampling
+        if sampling not in ["bernoulli", "waiting_time", "binomial"]:
+            raise ValueError(
+                f"Unknown sampling: {sampling}. Must be one of 'bernoulli', 'waiting_time', or 'binomial'."
+            )
+        for state in self.event_states():
+            if sampling == "waiting_time":
+                state.waiting_times = WaitingTimes(model=self, count=self.num_agents, rng=state.rng)
+            elif sampling == "binomial":
+                state.class_lookup = state.packed_lookup or state.make_packed_lookup()
+
+    def setup_engine(self):
+        """ The numba engine replaces the monthly steps of the state classes. It is only imported if it is used.
+        """
+        engine = self.params.engine
+        if engine not in ["python", "numba"]:
+            raise ValueError(f"Unknown engine: {engine}. Must be one of 'python' or 'numba'.")
+        self.engine = None
+        if engine == "numba":
+            from model.numba_engine import NumbaEngine
+
+            self.engine = NumbaEngine(model=self)
+
+    def setup_metrics(self, metrics: dict = None):
+        """ Count the prevalence and incidence metrics (by default those in the parameters) during the run
+        """
+        metrics = self.params.metrics if metrics is None else metrics
+        self.metrics = MetricsCollector(model=self, metrics=metrics) if metrics else None
+
+    def event_states(self) -> list:
+        return [self.life, self.hiv, self.cancer_detection, self.cancer, *self.hpv_strains.values()]
+
     def run(self, print_status=False):
+        # Full output is written to the output files chunk by chunk during the run, so it is never all held in memory
+        if self.params.output.level == "full" and self.state_changes.sink is None:
+            self.setup_sinks()
         # Run the model
         run_range = range(self.params.num_steps)
         if print_status:
@@ -97,33 +176,159 @@ class CervicalModel:
             self.step()
         self.save_output()
 
+    def setup_storage(self):
+        """ The output level selects how state changes and events are recorded:
+            - none: nothing is recorded or written
+            - summary: state changes and events are counted by replication and age (and the cost of events summed)
+            - first_passage: the time each agent first enters each state, and summarized events
+            - full: every state change and event. `run` writes full chunks to the output files as they fill.
+        """
+        level = self.params.output.level
+        if level not in OUTPUT_LEVELS:
+            raise ValueError(f"Unknown output level: {level}. Must be one of {', '.join(OUTPUT_LEVELS)}.")
+        state_columns = ["Time", "Unique_ID", "State_ID", "From", "To"]
+        event_columns = ["Time", "Unique_ID", "Event", "Cost"]
+        if level == "full":
+            time = np.uint16 if self.params.num_steps < 2 ** 16 else np.uint32
+            self.state_changes = EventStorage(
+                column_names=state_columns, dtypes=[time, np.uint32, np.int8, np.int8, np.int8],
+            )
+            self.events = EventStorage(column_names=event_columns, dtypes=[time, np.uint32, np.int8, np.float64])
+            return
+        if level == "none":
+            self.state_changes = EventStorage(column_names=state_columns, store_events=False)
+            self.events = EventStorage(column_names=event_columns, store_events=False)
+            return
+
+        # ----- Summaries are grouped by iteration (one per replication) and age
+        years = self.params.num_steps // self.params.steps_per_year + 1
+        group = ["Iteration", "Age"]
+        shape = (self.replications, years)
+        offsets = [self.iteration, self.params.initial_age]
+
+        def key(columns: dict) -> list:
+            return [columns["Unique_ID"] // self.params.num_agents, columns["Time"] // self.params.steps_per_year]
+
+        self.events = SummaryStorage(
+            column_names=event_columns,
+            names=group + ["Event"],
+            shape=shape + (max(event.value for event in Event) + 1,),
+            key=lambda columns: key(columns) + [columns["Event"]],
+            offsets=offsets + [0],
+            sum_column="Cost",
+        )
+        if level == "first_passage":
+            self.state_changes = FirstPassageStorage(
+                column_names=state_columns,
+                count=self.num_agents,
+                tracked=first_passage_states(),
+                others=FIRST_PASSAGE_EVENTS,
+            )
+            return
+        states = max(int_map) + 1
+        self.state_changes = SummaryStorage(
+            column_names=state_columns,
+            names=group + ["State_ID", "From", "To"],
+            shape=shape + (states, len(HpvState) + 1, len(HpvState) + 1),
+            key=lambda columns: key(columns) + [columns["State_ID"], columns["From"], columns["To"]],
+            offsets=offsets + [0, 0, 0],
+        )
+
     def save_output(self):
-        # Save the output
-        df = self.state_changes.make_events()
-        df["State"] = df["State_ID"].map(int_map)
-        location1 = self.iteration_dir.joinpath("state_changes.parquet")
-        df.drop("State_ID", axis=1).to_parquet(location1, index=False)
-        location2 = self.iteration_dir.joinpath("events.parquet")
-        self.events.make_events().to_parquet(location2, index=False)
+        # Save the output. Events that were not written during the run are written now.
+        if self.metrics is not None:
+            self.metrics.save(self.replication_dirs())
+        if self.snapshots is not None:
+            self.snapshots.save(self.replication_dirs(), self.params.num_agents)
+        level = self.params.output.level
+        if level == "none":
+            return
+        if level != "full":
+            self.save_summaries()
+            return
+        if self.state_changes.sink is None:
+            self.setup_sinks()
+        for storage in [self.state_changes, self.events]:
+            storage.flush()
+            storage.sink.close()
+
+    def save_summaries(self):
+        """ Write each replication's summarized events, and its state summary or first passage times
+        """
+        events = self.events.make_events()
+        if isinstance(self.state_changes, FirstPassageStorage):
+            states, file_name = self.state_changes.make_events(), "first_passage.parquet"
+        else:
+            states, file_name = format_state_changes(self.state_changes.make_events()), "state_summary.parquet"
+        for replication, iteration_dir in enumerate(self.replication_dirs()):
+            iteration = self.iteration + replication
+            events_replication = events[events["Iteration"] == iteration].drop("Iteration", axis=1)
+            events_replication.to_parquet(iteration_dir.joinpath("event_summary.parquet"), index=False)
+            if "Iteration" in states:
+                states_replication = states[states["Iteration"] == iteration].drop("Iteration", axis=1)
+            else:
+                states_replication = self.select_replication(states, replication)
+            states_replication.to_parquet(iteration_dir.joinpath(file_name), index=False)
+
+    def setup_sinks(self):
+        """ Write the state changes and events to each replication's Parquet files, one row group per chunk
+        """
+        directories = self.replication_dirs()
+        self.state_changes.sink = ParquetSink(
+            paths=[directory.joinpath("state_changes.parquet") for directory in directories],
+            prepare=format_state_changes,
+            split=self.select_replication,
+        )
+        self.events.sink = ParquetSink(
+            paths=[directory.joinpath("events.parquet") for directory in directories], split=self.select_replication,
+        )
+
+    def replication_dirs(self) -> list:
+        """ Return the output directory of each replication. The first replication uses `self.iteration_dir`.
+        """
+        directories = [self.iteration_dir]
+        for replication in range(1, self.replications):
+            directory = self.scenario_dir.joinpath(f"iteration_{self.iteration + replication}")
+            directory.mkdir(exist_ok=True)
+            directories.append(directory)
+        return directories
+
+    def replication_of(self, positions: np.array) -> np.array:
+        """ Return the replication of the agents at the given positions
+        """
+        return self.unique_ids[positions] // self.params.num_agents
+
+    def select_replication(self, df: pd.DataFrame, replication: int) -> pd.DataFrame:
+        """ Return the rows of an output table that belong to one replication, numbering its agents from 0
+        """
+        if self.replications == 1:
+            return df
+        num_agents = self.params.num_agents
+        df = df[df["Unique_ID"] // num_agents == replication].reset_index(drop=True)
+        df["Unique_ID"] = df["Unique_ID"] - replication * num_agents
+        return df
 
     def step(self):
         if self.time % self.params.steps_per_year == 0:
             self.yearly_update()
         # ----- Order: Hpv (by strain), Hiv, Cancer Progression, Cancer Detection, Life
-        self.life.update_living()
-        self.step_hpv()
-        self.step_hiv()
-        self.step_cancer()
-        self.step_cancer_detection()
-        self.step_life()
+        if self.engine is not None:
+            self.engine.step()
+        else:
+            self.step_hpv()
+            self.step_hiv()
+            self.step_cancer()
+            self.step_cancer_detection()
+            self.step_life()
         self.time += 1
+        if self.metrics is not None:
+            self.metrics.update()
+        if self.snapshots is not None:
+            self.snapshots.update()
 
     def step_hpv(self):
-        self.hpv_strains[HpvStrain.LOW_RISK].step()
-        self.hpv_strains[HpvStrain.HIGH_RISK].step()
-        self.hpv_strains[HpvStrain.SIXTEEN].step()
-        self.hpv_strains[HpvStrain.EIGHTEEN].step()
-        self.hpv_strains[max(HpvStrain)].update_hpv_state()
+        # ----- All strains step together. This also updates the max HPV state of agents that transition.
+        self.hpv.step()
 
     def step_hiv(self):
         self.hiv.step()
@@ -137,24 +342,33 @@ class CervicalModel:
     def step_life(self):
         self.life.step()
 
+    def record_state_changes(self, positions: np.array, state_ids, from_states, to_states):
+        """ Record state changes of the agents at the given positions, and count them for the metrics
+        """
+        unique_ids = self.unique_ids[positions]
+        self.state_changes.record_events(self.time, unique_ids, state_ids, from_states, to_states)
+        if self.metrics is not None:
+            self.metrics.record_state_changes(unique_ids, state_ids, to_states)
+
+    @property
+    def hiv_detected(self) -> np.array:
+        return self.agent_store.hiv_detected
+
     def load_agents(self):
         """ Add the agents to the model based on parameter inputs
         Order matters here, as some states rely on otherss
         """
-        num_agents = self.params.num_agents
+        num_agents = self.num_agents
         self.age = self.params.initial_age
+        # Position i of every agent array holds agent unique_ids[i]. Positions change if dead agents are compacted.
         self.unique_ids = np.array([item for item in range(num_agents)])
 
-        self.cancer.initiate_probabilities()
-
-        for hpv in self.hpv_strains.values():
-            hpv.initiate(count=num_agents, state=HpvState.NORMAL, dtype=np.int8)
-            hpv.hpv_immunity = self.initiate_array(count=num_agents, state=HpvImmunity.NORMAL, dtype=np.int8)
-            hpv.update_probabilities()
+        self.cancer.update_probabilities()
 
-        # - Only required to call this for one strain - as it finds the max of all strains
+        # - The max HPV state is the highest state of any strain
         self.max_hpv_state = Empty("max_hpv_state")
-        self.hpv_strains[max(HpvStrain)].update_hpv_state()
+        self.hpv.initiate(count=num_agents)
+        self.hpv.update_probabilities()
 
         self.life.update_probabilities()
         self.hiv.update_probabilities()
@@ -162,15 +376,19 @@ class CervicalModel:
         # ----- Additional Intervention States
         self.screening_state = Empty("screening")
         self.screening_state.values = self.initiate_array(count=num_agents, state=ScreeningState.ROUTINE, dtype=np.int8)
+        compliance_rng = self.streams.stream("compliance")
         self.compliant_routine_state = Empty("compliant_routine")
         self.compliant_routine_state.values = np.array(
-            self.rng.rand(num_agents) >= self.params.screening.compliance.never
+            agent_random(compliance_rng, np.arange(num_agents)) >= self.params.screening.compliance.never
         )
         self.compliant_surveillance_state = Empty("compliant_surveillance")
         self.compliant_surveillance_state.values = np.array(
-            self.rng.rand(num_agents) >= self.params.screening.compliance.never_surveillance
+            agent_random(compliance_rng, np.arange(num_agents)) >= self.params.screening.compliance.never_surveillance
         )
 
+        # ----- The agents each state steps over
+        self.active_sets = ActiveSets(model=self)
+
     def initiate_array(self, count: int, state: Enum, dtype: type = np.int8) -> np.array:
         array = np.zeros(count, dtype=dtype)
         array.fill(state.value)
@@ -179,72 +397,160 @@ class CervicalModel:
     def yearly_update(self):
         if self.time != 0:
             self.age += 1
+        if self.params.compact_agents:
+            self.compact_agents()
         # ----- Life, HIV, and HPV probabilities are based on age
         self.life.update_probabilities()
         self.hiv.update_probabilities()
-        for strain in self.hpv_strains:
-            self.hpv_strains[strain].update_probabilities()
+        self.hpv.update_probabilities()
+        # ----- Probability classes and waiting times
+        for state in self.event_states():
+            state.update_sampling()
         # ------ Apply screening and vaccination protocols
         self.screening_protocol.apply()
         self.vaccination_protocol.apply()
 
+    def agent_arrays(self) -> list:
+        """ Return (owner, attribute) pairs for every array that holds one value per agent
+        """
+        arrays = [
+            (self, "unique_ids"),
+            (self.max_hpv_state, "values"),
+            (self.screening_state, "values"),
+            (self.compliant_routine_state, "values"),
+            (self.compliant_surveillance_state, "values"),
+        ]
+        for state in [self.life, self.hiv, self.cancer_detection, self.cancer]:
+            arrays.append((state, "values"))
+            if state.packed_lookup is None and state.probabilities is not None:
+                arrays.append((state, "probabilities"))
+        for state in self.event_states():
+            if state.class_codes is not None:
+                arrays.append((state, "class_codes"))
+        arrays.extend([(self.agent_store, name) for name in self.agent_store.array_names()])
+        # --- HPV matrices hold one column per agent. The strains' views are re-linked after compacting.
+        arrays.extend([(self.hpv, "values"), (self.hpv, "hpv_immunity")])
+        if self.hpv.probabilities is not None:
+            arrays.append((self.hpv, "probabilities"))
+        return arrays
+
+    def compact_agents(self):
+        """ Remove dead agents from every agent array. Living agents keep their order, and `self.unique_ids` maps each
+        position back to the agent's original id. Recorded events always use the original ids.
+        """
+        keep = self.active_sets.alive
+        if len(keep) == len(self.unique_ids):
+            return
+        if self.snapshots is not None:
+            self.snapshots.remove(np.setdiff1d(np.arange(len(self.unique_ids)), keep))
+        for owner, name in self.agent_arrays():
+            setattr(owner, name, getattr(owner, name)[..., keep])
+        self.hpv.link()
+        self.active_sets.rebuild()
+        self.screening_calendar.compact(keep)
+        # Scheduled transitions refer to the old positions. The yearly update reschedules every agent.
+        for state in self.event_states():
+            if state.waiting_times is not None:
+                state.waiting_times.reset(len(keep))
+
     # ------ Additional Functions --------------------------------------------------------------------------------------
-    def vaccinate(self, unique_id: int):
-        self.events.record_event((self.time, unique_id, Event.VACCINATION.value, self.params.vaccination.cost))
-        self.hpv_vaccinations.add(unique_id)
-        for item in self.hpv_strains:
-            if HpvStrain(item).name != HpvStrain.LOW_RISK.name:
-                strain = self.hpv_strains[item]
-                strain.hpv_immunity[unique_id] = HpvImmunity.VACCINE.value
-                # Update transition probability
-                key = (
-                    self.age,
-                    item,
-                    strain.hpv_immunity[unique_id],
-                    strain.values[unique_id],
-                    self.hiv.values[unique_id],
-                )
-                strain.probabilities[unique_id] = strain.transition_probability_dict[key]
-
-    def treat_cin(self, unique_id: int):
-        if unique_id not in self.dicts.cin_treatment_methods:
-            self.dicts.cin_treatment_methods[unique_id] = self.cin_treatment_method_factory.get_method()
-
-        method = self.cin_treatment_method_factory.methods[self.dicts.cin_treatment_methods[unique_id]]
+    def vaccinate(self, agent: int):
+        self.vaccinate_many(np.atleast_1d(agent))
+
+    def vaccinate_many(self, agents: np.array):
+        """ Vaccinate the agents at the given positions: record one vaccination event per agent and give vaccine
+        immunity to every strain except LOW_RISK
+        """
+        self.events.record_events(
+            self.time, self.unique_ids[agents], Event.VACCINATION.value, self.params.vaccination.cost
+        )
+        if isinstance(self.state_changes, FirstPassageStorage):
+            self.state_changes.record_first(self.time, self.unique_ids[agents], "vaccinated")
+        self.agent_store.hpv_vaccinated[agents] = True
+        rows = np.array([strain - 1 for strain in HpvStrain if strain != HpvStrain.LOW_RISK])
+        self.hpv.hpv_immunity[np.ix_(rows, agents)] = HpvImmunity.VACCINE.value
+        # Update transition probabilities
+        self.hpv.refresh_probabilities(np.repeat(rows, len(agents)), np.tile(agents, len(rows)))
+
+    def treat_cin(self, agent: int):
+        self.treat_cin_many(np.atleast_1d(agent))
+
+    def treat_cin_many(self, agents: np.array):
+        """ Treat CIN for the women at the given positions. Women treated for the first time are assigned a treatment
+        method, which is used for all of their treatments. If treatment is effective, all strains return to normal.
+        """
+        agents = np.asarray(agents)
+        factory = self.cin_treatment_method_factory
+        methods = self.agent_store.cin_treatment_method
+        untreated = agents[methods[agents] == NEVER]
+        methods[untreated] = factory.get_methods(len(untreated), untreated)
 
         events = {
             "leep": Event.TREATMENT_LEEP,
             "cryo": Event.TREATMENT_CRYO,
         }
 
-        self.events.record_event((self.time, unique_id, events[method.name].value, method.params.cost))
+        effective = np.zeros(len(agents), dtype=bool)
+        for index, method in enumerate(factory.methods):
+            treated = methods[agents] == index
+            self.events.record_events(
+                self.time, self.unique_ids[agents[treated]], events[method.name].value, method.params.cost
+            )
+            effective[treated] = method.effective(treated.sum(), agents[treated])
+
         # ----- If treatment is effective, all strains return to normal
-        if method.is_effective():
-            for strain in self.hpv_strains:
-                if self.hpv_strains[strain].values[unique_id] != HpvState.NORMAL:
-                    self.state_changes.record_event(
-                        (
-                            self.time,
-                            unique_id,
-                            HpvStrain(strain).int,
-                            self.hpv_strains[strain].values[unique_id],
-                            HpvState.NORMAL,
-                        )
-                    )
-                    self.hpv_strains[strain].values[unique_id] = HpvState.NORMAL.value
-
-    def detect_cancer(self, unique_id: int):
+        cured = agents[effective]
+        rows, columns = np.nonzero(self.hpv.values[:, cured] != HpvState.NORMAL)
+        strain_agents = cured[columns]
+        self.record_state_changes(
+            strain_agents, self.hpv.strain_ints[rows], self.hpv.values[rows, strain_agents], HpvState.NORMAL.value,
+        )
+        self.hpv.values[rows, strain_agents] = HpvState.NORMAL.value
+        self.hpv.refresh_probabilities(rows, strain_agents)
+        self.hpv.update_max_state(cured)
+
+    def detect_cancer(self, unique_id):
         """ During a screening, an agents cancer was detected. Record this and update the agents value.
+        Accepts a single agent or an array of agents.
         """
         state_int = CancerDetectionState.int
         # Record state change
-        self.state_changes.record_event(
-            (self.time, unique_id, state_int, self.cancer_detection.values[unique_id], CancerDetectionState.DETECTED)
+        self.record_state_changes(
+            unique_id,
+            state_int,
+            self.cancer_detection.values[unique_id],
+            CancerDetectionState.DETECTED.value,
         )
         # Update value
         self.cancer_detection.values[unique_id] = CancerDetectionState.DETECTED.value
+        self.active_sets.remove_detected(unique_id)
 
     def compute_years_since(self, time: int) -> float:
         """ Return the number of years since the given time step. Partial years are represented by floats.
         """
         return (self.time - time) / self.params.steps_per_year
+
+
+OUTPUT_LEVELS = ["none", "summary", "first_passage", "full"]
+# Events whose first time is kept along with the first passage states
+FIRST_PASSAGE_EVENTS = ["vaccinated"]
+
+
+def first_passage_states() -> dict:
+    """ Map the name of each state whose first entry time is kept to its (State_ID, To) pair
+    """
+    states = {"dead": (LifeState.int, LifeState.DEAD.value), "hiv": (HivState.int, HivState.HIV.value)}
+    for strain in HpvStrain:
+        for state in [HpvState.HPV, HpvState.CIN_1, HpvState.CIN_2_3, HpvState.CANCER]:
+            states[f"{strain.name.lower()}_{state.name.lower()}"] = (strain.int, state.value)
+    for state in [CancerState.LOCAL, CancerState.REGIONAL, CancerState.DISTANT, CancerState.DEAD]:
+        states[f"cancer_{state.name.lower()}"] = (CancerState.int, state.value)
+    states["cancer_detected"] = (CancerDetectionState.int, CancerDetectionState.DETECTED.value)
+    return states
+
+
+def format_state_changes(df: pd.DataFrame) -> pd.DataFrame:
+    """ Replace the State_ID column of the state changes with the name of each state
+    """
+    df["State"] = df["State_ID"].map(int_map)
+    return df.drop("State_ID", axis=1)
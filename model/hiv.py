@@ -1,22 +1,24 @@
-import pickle
-
 import numpy as np
 
+from model.random_streams import agent_random
 from model.state import EventState, HivState
+from model.transition_table import load_transition_table
 
 
 class Hiv(EventState):
+    age_axis = 0
+
     def __init__(self, model):
-        with (open(model.transition_dir.joinpath("hiv_dictionary.pickle"), "rb")) as openfile:
-            hiv_dict = pickle.load(openfile)
-        super().__init__(enum=HivState, transition_dict=hiv_dict)
+        hiv_table = load_transition_table(model.transition_dir, "hiv")
+        super().__init__(enum=HivState, transition_dict=hiv_table)
         """ HIV Status Tracker
             - Probability of HIV transition is based solely on age.
             - Probabilities should update yearly when the model changes a women's age
         """
         self.model = model
+        self.rng = model.streams.stream("hiv")
         # No one has HIV
-        self.initiate(count=self.model.params.num_agents, state=HivState.NORMAL, dtype=np.int8)
+        self.initiate(count=self.model.num_agents, state=HivState.NORMAL, dtype=np.int8)
 
     def step(self):
         """ Simulate HIV Transitions
@@ -25,34 +27,34 @@ class Hiv(EventState):
             - Determine if HIV is detected
         """
         if self.model.params.include_hiv:
-            use_agents = self.model.unique_ids[self.model.life.living & (self.values == HivState.NORMAL)]
-            probabilities = self.probabilities[use_agents]
-            selected_agents = probabilities > self.model.rng.rand(len(probabilities))
-            for unique_id in self.model.unique_ids[use_agents][selected_agents]:
-                self.model.state_changes.record_event(
-                    (self.model.time, unique_id, HivState.int, HivState.NORMAL.value, HivState.HIV.value)
-                )
-                self.values[unique_id] = HivState.HIV.value
-                # --- HIV Detection
-                if self.model.rng.rand() < self.model.params.hiv_detection_rate:
-                    self.model.hiv_detected.add(unique_id)
-
-                # ----- Update the agents HPV transition probabilities
-                for strain in self.model.hpv_strains.values():
-                    key = (
-                        self.model.age,
-                        strain.strain,
-                        strain.hpv_immunity[unique_id],
-                        strain.values[unique_id],
-                        self.model.hiv.values[unique_id],
-                    )
-                    strain.probabilities[unique_id] = strain.transition_probability_dict[key]
-
-                # ----- Update the agents life probability
-                hiv = HivState.HIV.value
-                canc = self.model.cancer.values[unique_id]
-                self.model.life.probabilities[unique_id] = self.model.life.transition_dict[(self.model.age, hiv, canc)]
+            selected_agents = self.select_agents(self.eligible_agents())
+            if len(selected_agents) == 0:
+                return
+
+            self.model.record_state_changes(selected_agents, HivState.int, HivState.NORMAL.value, HivState.HIV.value,)
+            self.values[selected_agents] = HivState.HIV.value
+            self.model.active_sets.remove_hiv(selected_agents)
+            # --- HIV Detection
+            detected = agent_random(self.rng, selected_agents) < self.model.params.hiv_detection_rate
+            self.model.hiv_detected[selected_agents[detected]] = True
+            # Women with detected HIV may have a shorter screening interval
+            self.model.screening_calendar.schedule(selected_agents[detected])
+
+            # ----- Update the agents HPV transition probabilities
+            for strain in self.model.hpv_strains.values():
+                strain.refresh_probabilities(selected_agents)
+
+            # ----- Update the agents life probability
+            self.model.life.refresh_probabilities(selected_agents)
+
+    def eligible_agents(self) -> np.array:
+        if not self.model.params.include_hiv:
+            return self.model.active_sets.hiv_negative[:0]
+        return self.model.active_sets.hiv_negative
+
+    def probability_key(self, unique_ids) -> tuple:
+        return (self.model.age,)
 
     def update_probabilities(self):
-        if self.model.params.include_hiv:
-            self.probabilities = self.find_probabilities(keys=[(self.model.age,)] * len(self.model.unique_ids))
+        if self.model.params.include_hiv and self.packed_lookup is None:
+            self.probabilities = np.full(len(self.model.unique_ids), self.transition_dict[(self.model.age,)])
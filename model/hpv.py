@@ -1,129 +1,234 @@
-import pickle
-from collections import defaultdict
-from copy import copy
-
 import numpy as np
 
-from model.misc_functions import filter_hpv_dict, normalize, random_selection
+from model.misc_functions import random_selections
+from model.random_streams import agent_random
 from model.state import CancerState, EventState, HpvImmunity, HpvState, HpvStrain
+from model.transition_table import load_transition_table
+
+# The order the strains stepped in when each strain stepped on its own
+STEP_ORDER = [HpvStrain.LOW_RISK, HpvStrain.HIGH_RISK, HpvStrain.SIXTEEN, HpvStrain.EIGHTEEN]
+
+
+class HpvStrains:
+    def __init__(self, model):
+        """ The HPV states of every strain, stored as (strain, agent) matrices so that all strains step together
+            - Row `strain - 1` of `self.values`, `self.hpv_immunity`, and `self.probabilities` holds one strain. Each
+              strain's `Hpv` state holds views of its rows, so per-strain code can keep using `model.hpv_strains`.
+            - `model.max_hpv_state` is updated for the agents whose states change, instead of being recomputed
+            - As when each strain stepped on its own (in `STEP_ORDER`), an agent who gets cancer from one strain is not
+              stepped by the strains after it
+        """
+        self.model = model
+        # The stream for picking new states. Each strain's `Hpv` state has its own stream for selecting agents.
+        self.rng = model.streams.stream("hpv")
+        self.strains = np.array([item.value for item in HpvStrain])
+        self.strain_ints = np.array([HpvStrain(strain).int for strain in self.strains])
+        # The position of each strain row in STEP_ORDER
+        self.step_rank = np.array([STEP_ORDER.index(HpvStrain(strain)) for strain in self.strains])
+        self.transition_dict = load_transition_table(model.transition_dir, "hpv")
+        self.probability_table = self.transition_dict.leave_probabilities(state_axis=3)
+        self.transition_cdf = self.transition_dict.conditional_cdf(state_axis=3)
+        self.integers = [item.value for item in HpvState]
+        # --- numpy arrays: one row per strain
+        self.values = None
+        self.hpv_immunity = None
+        self.probabilities = None
+
+    def states(self) -> list:
+        return [self.model.hpv_strains[strain] for strain in self.strains]
+
+    def initiate(self, count: int):
+        shape = (len(self.strains), count)
+        self.values = np.full(shape, HpvState.NORMAL.value, dtype=np.int8)
+        self.hpv_immunity = np.full(shape, HpvImmunity.NORMAL.value, dtype=np.int8)
+        if self.model.params.probability_lookup == "cached":
+            self.probabilities = np.zeros(shape)
+        self.model.max_hpv_state.values = np.full(count, HpvState.NORMAL.value, dtype=np.int8)
+        self.link()
+
+    def link(self):
+        """ Point each strain's arrays at its rows. Required whenever the matrices are replaced.
+        """
+        for row, state in enumerate(self.states()):
+            state.values = self.values[row]
+            state.hpv_immunity = self.hpv_immunity[row]
+            if self.probabilities is not None:
+                state.probabilities = self.probabilities[row]
+
+    @property
+    def stacked(self) -> bool:
+        """ True if every strain uses cached probabilities and Bernoulli sampling. All strains can then be selected and
+        have their probabilities refreshed at once. Otherwise each strain selects its own agents.
+        """
+        return self.probabilities is not None and all(
+            state.packed_lookup is None and state.waiting_times is None and state.class_lookup is None
+            for state in self.states()
+        )
+
+    def probability_key(self, rows, unique_ids) -> tuple:
+        return (
+            self.model.age,
+            self.strains[rows],
+            self.hpv_immunity[rows, unique_ids],
+            self.values[rows, unique_ids],
+            self.model.hiv.values[unique_ids],
+        )
+
+    def update_probabilities(self):
+        """ Look up every agent's transition probability for every strain
+        """
+        if self.probabilities is not None:
+            self.probabilities[:] = self.probability_table.gather(
+                self.model.age, self.strains[:, None], self.hpv_immunity, self.values, self.model.hiv.values
+            )
+        else:
+            for state in self.states():
+                state.update_probabilities()
+
+    def refresh_probabilities(self, rows: np.array, unique_ids: np.array):
+        """ Look up the probabilities of (strain row, agent) pairs whose state has changed
+        """
+        if self.stacked:
+            probabilities = self.probability_table.gather(*self.probability_key(rows, unique_ids))
+            self.probabilities[rows, unique_ids] = probabilities
+            return
+        for row, state in enumerate(self.states()):
+            if (rows == row).any():
+                state.refresh_probabilities(unique_ids[rows == row])
+
+    def select_agents(self, rows: np.array) -> tuple:
+        """ Return the (strain row, agent) pairs that transition at this step, for the strains in the given rows
+        """
+        eligible = self.model.active_sets.cancer_free
+        if self.stacked:
+            states = self.states()
+            probabilities = self.probabilities[rows[:, None], eligible]
+            randoms = np.vstack([agent_random(states[row].rng, eligible) for row in rows])
+            selected_rows, columns = np.nonzero(probabilities > randoms)
+            return rows[selected_rows], eligible[columns]
+        states = self.states()
+        selected = [states[row].select_agents(eligible) for row in rows]
+        selected_rows = np.repeat(rows, [len(item) for item in selected])
+        return selected_rows, np.concatenate(selected)
+
+    def step(self, strains: list = None):
+        """ Simulate HPV transitions for each strain (all strains by default): Must be alive and cannot have cancer.
+        The agents are selected from those that were cancer free at the start of the step, and the transitions of
+        agents who get cancer from a strain earlier in `STEP_ORDER` are dropped.
+        """
+        strains = self.strains if strains is None else np.asarray(strains)
+        rows, selected_agents = self.select_agents(strains - 1)
+        if len(selected_agents) == 0:
+            return
+
+        # ----- Force a transition: pick each agent's new state from the precomputed conditional cdfs
+        current_states = self.values[rows, selected_agents]
+        hiv_status = self.model.hiv.values[selected_agents]
+        cdfs = self.transition_cdf.gather(
+            self.model.age, self.strains[rows], self.hpv_immunity[rows, selected_agents], current_states, hiv_status
+        )
+        randoms = agent_random(self.rng, selected_agents)
+        new = random_selections(randoms, cdfs, self.integers).astype(self.values.dtype)
+        keep = self.before_cancer(rows, selected_agents, new)
+        if not keep.all():
+            rows, selected_agents = rows[keep], selected_agents[keep]
+            current_states, new = current_states[keep], new[keep]
+
+        self.model.record_state_changes(selected_agents, self.strain_ints[rows], current_states, new)
+        self.values[rows, selected_agents] = new
+
+        # ----- Returning to normal builds some immunity to HPV
+        normal = new == HpvState.NORMAL
+        to_normal = (rows[normal], selected_agents[normal])
+        self.hpv_immunity[to_normal] = np.maximum(self.hpv_immunity[to_normal], HpvImmunity.NATURAL.value)
+
+        # --- Cancer: record state change and update probability
+        cancer = new == HpvState.CANCER
+        # Only move to cancer if agent does not already have cancer
+        cancer[cancer] = self.model.cancer.values[selected_agents[cancer]] == CancerState.NORMAL
+        if cancer.any():
+            to_cancer = np.unique(selected_agents[cancer])
+            self.model.active_sets.add_cancer(to_cancer)
+            # state change
+            self.model.record_state_changes(
+                to_cancer, CancerState.int, CancerState.NORMAL.value, CancerState.LOCAL.value,
+            )
+            # cancer status change, cancer progression probability, and death probability
+            self.model.cancer.values[to_cancer] = CancerState.LOCAL.value
+            self.model.cancer.refresh_probabilities(to_cancer)
+            self.model.life.refresh_probabilities(to_cancer)
+
+        # ----- Update the transition probabilities and the max HPV state
+        self.refresh_probabilities(rows, selected_agents)
+        self.update_max_state(np.unique(selected_agents))
+
+    def before_cancer(self, rows: np.array, unique_ids: np.array, new: np.array) -> np.array:
+        """ Return a boolean array that is True for each (strain row, agent) pair that is stepped no later than the
+        strain the agent gets cancer from (if any) in `STEP_ORDER`
+        """
+        cancer = new == HpvState.CANCER
+        if not cancer.any():
+            return np.ones(len(rows), dtype=bool)
+        rank = self.step_rank[rows]
+        onset = np.full(self.values.shape[1], len(STEP_ORDER))
+        np.minimum.at(onset, unique_ids[cancer], rank[cancer])
+        return rank <= onset[unique_ids]
+
+    def update_max_state(self, unique_ids=slice(None)):
+        """ Update the highest HPV state across strains of the given agents (all agents by default)
+        """
+        self.model.max_hpv_state.values[unique_ids] = self.values[:, unique_ids].max(axis=0)
 
 
 class Hpv(EventState):
+    age_axis = 0
+
     def __init__(self, model, strain):
-        with (open(model.transition_dir.joinpath("hpv_dictionary.pickle"), "rb")) as openfile:
-            hpv_dict = pickle.load(openfile)
-            strain_dict = filter_hpv_dict(hpv_dict, strain)
-        super().__init__(enum=HpvState, transition_dict=strain_dict)
+        super().__init__(enum=HpvState, transition_dict=model.hpv.transition_dict.select(axis=1, value=strain))
         """ HPV State Tracker
             - Probability of HPV transition is based on: age, strain, immunity, current strain status, and hiv status
             - Probability should update:
                 - Yearly (when the model changes the womens ages)
                 - When a women's current strain status changes (occurs within this class)
                 - When a women's HIV status changes (occurs within the HIV class)
+            - The arrays of this strain are views of its row in `model.hpv`, which steps all strains together
         """
         self.model = model
         self.strain = strain
+        self.rng = model.streams.stream(f"hpv_{HpvStrain(strain).name.lower()}")
         self.transition_probability_dict = self.make_transition_probabilities()
+        self.probability_table = self.transition_probability_dict
         self.probabilities = np.zeros(1)
-        self.agents_with_cancer = set()
 
     def step(self):
-        """ Simulate HPV transitions for each strain: Must be alive and cannot have cancer
-        Those who do not have cancer are subject to transition.
+        """ Simulate HPV transitions for this strain only
         """
-        normal_status = self.model.cancer.values == CancerState.NORMAL
-        unique_ids = self.model.unique_ids[self.model.life.living & normal_status]
-        probabilities = self.probabilities[unique_ids]
-        selected_agents = unique_ids[probabilities > self.model.rng.rand(len(probabilities))]
-
-        # ----- Force a transition
-        for unique_id in selected_agents:
-            # --- Find the current status and make a change
-            current_state = self.values[unique_id]
-            hiv_status = self.model.hiv.values[unique_id]
-            key = (
-                self.model.age,
-                self.strain,
-                self.hpv_immunity[unique_id],
-                self.values[unique_id],
-                hiv_status,
-            )
-            probs_list = copy(self.transition_dict[key])
-            # --- Remove their current states probability
-            probs_list[current_state - 1] = 0
-            cdf = normalize(probs_list, return_cdf=True)
-
-            new = random_selection(random=self.model.rng.rand(), cdf=cdf, options=self.integers)
-
-            self.model.state_changes.record_event(
-                (self.model.time, unique_id, HpvStrain(self.strain).int, self.values[unique_id], HpvState(new).value)
-            )
-            self.values[unique_id] = HpvState(new).value
-
-            # ----- Returning to normal builds some immunity to HPV
-            if new == HpvState.NORMAL:
-                self.hpv_immunity[unique_id] = max(self.hpv_immunity[unique_id], HpvImmunity.NATURAL.value)
-            # --- Cancer: record state change and update probability
-            elif new == HpvState.CANCER:
-                # Only move to cancer if agent does not already have cancer
-                if unique_id not in self.agents_with_cancer:
-                    self.agents_with_cancer.add(unique_id)
-                    # state change
-                    self.model.state_changes.record_event(
-                        (self.model.time, unique_id, CancerState.int, CancerState.NORMAL.value, CancerState.LOCAL.value)
-                    )
-                    # cancer progression probability
-                    key = (self.model.cancer_detection.values[unique_id], CancerState.LOCAL.value)
-                    self.model.cancer.probabilities[unique_id] = self.model.cancer.transition_probability_dict[key]
-                    # cancer status change
-                    self.model.cancer.values[unique_id] = CancerState.LOCAL.value
-                    hiv = self.model.hiv.values[unique_id]
-                    self.model.life.probabilities[unique_id] = self.model.life.transition_dict[
-                        (self.model.age, hiv, CancerState.LOCAL.value)
-                    ]
-
-            # ----- Update the transition_probabilities
-            key = (
-                self.model.age,
-                self.strain,
-                self.hpv_immunity[unique_id],
-                self.values[unique_id],
-                hiv_status,
-            )
-            self.probabilities[unique_id] = self.transition_probability_dict[key]
+        self.model.hpv.step(strains=[self.strain])
 
     def make_transition_probabilities(self):
-        """ Create a dictionary of probabilities to transition (excluding the current state)
+        """ Create a table of probabilities to transition (excluding the current state)
         """
-        probs = dict()
-        for k, v in self.transition_dict.items():
-            state = k[3]
-            probability_to_transition = 1 - v[state - 1]
-            probs[k] = probability_to_transition
-        return probs
+        return self.transition_dict.leave_probabilities(state_axis=3)
 
-    def update_probabilities(self):
-        """ Loop up each agents transition probability. Occurs once a year
-        """
-        keys = list(
-            zip(
-                [self.model.age] * len(self.model.unique_ids),
-                [self.strain] * len(self.model.unique_ids),
-                self.hpv_immunity.astype(int),
-                self.values.astype(int),
-                self.model.hiv.values.astype(int),
-            )
-        )
-        self.probabilities = np.zeros(len(self.model.unique_ids))
+    def eligible_agents(self) -> np.array:
+        return self.model.active_sets.cancer_free
 
-        locs = defaultdict(list)
-        for i, key in enumerate(keys):
-            locs[key].append(i)
+    def probability_key(self, unique_ids) -> tuple:
+        return (
+            self.model.age,
+            self.strain,
+            self.hpv_immunity[unique_ids],
+            self.values[unique_ids],
+            self.model.hiv.values[unique_ids],
+        )
 
-        for key, value in locs.items():
-            self.probabilities[value] = self.transition_probability_dict[key]
+    def update_probabilities(self):
+        """ Write into this strain's row of the stacked probabilities, so the view is kept
+        """
+        if self.packed_lookup is None:
+            self.probabilities[:] = self.find_probabilities(*self.probability_key(slice(None)))
 
     def update_hpv_state(self):
-        self.model.max_hpv_state.values = np.vstack([[self.model.hpv_strains[s.value].values] for s in HpvStrain]).max(
-            axis=0
-        )
+        """ Recompute the max HPV state of every agent. Only required if the state arrays are changed directly.
+        """
+        self.model.hpv.update_max_state()
@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+
+from model.analysis import Analysis
+from model.state import CancerDetectionState, CancerState, HivState, HpvStrain, LifeState
+
+METRIC_KINDS = ["prevalence", "incidence"]
+
+
+class Metric:
+    def __init__(self, kind: str, field: str, states, filter_dict: dict = None, alive_only: bool = True):
+        """ A prevalence or incidence rate by age, defined as in `Analysis.prevalence` and `Analysis.incidence`
+            - `field` is the ID of a state (such as `HivState.id`) or the name of an HPV strain (such as "HIGH_RISK")
+            - `states` and the values of `filter_dict` are one state value or a tuple of them
+        """
+        if kind not in METRIC_KINDS:
+            raise ValueError(f"Unknown metric kind: {kind}. Must be one of {', '.join(METRIC_KINDS)}.")
+        self.kind = kind
+        self.field = field
+        self.states = state_values(states)
+        self.filter_dict = {key: state_values(value) for key, value in (filter_dict or dict()).items()}
+        self.alive_only = alive_only
+
+
+class MetricsCollector:
+    def __init__(self, model, metrics: dict):
+        """ Count the numerators and denominators of prevalence and incidence rates by age while the model runs
+            - `metrics` maps each metric's name to a `Metric`, or to a dictionary of its arguments
+            - As in `Analysis`, a time step belongs to age `initial_age + round(time / steps_per_year)`. The counts of
+              an age are taken after its last step. Incidence counts the state changes of that age's steps.
+            - Each replication is counted separately
+        """
+        self.model = model
+        params = model.params
+        self.metrics = dict()
+        for name, metric in metrics.items():
+            self.metrics[name] = metric if isinstance(metric, Metric) else Metric(**metric)
+        self.fields = state_fields(model)
+        for name, metric in self.metrics.items():
+            for field in [metric.field, *metric.filter_dict]:
+                if field not in self.fields:
+                    raise ValueError(f"Unknown field in metric {name}: {field}.")
+            if not metric.alive_only and params.compact_agents:
+                raise ValueError(f"Metric {name} counts dead agents, which compact_agents removes.")
+
+        ages = int(params.num_steps / params.steps_per_year + 1)
+        self.age_index = pd.Index(range(params.initial_age, params.initial_age + ages))
+        shape = (model.replications, ages)
+        self.numerators = {name: np.zeros(shape, dtype=np.int64) for name in self.metrics}
+        self.denominators = {name: np.zeros(shape, dtype=np.int64) for name in self.metrics}
+        # --- The number of qualifying state changes of each agent (by unique id) during the current age
+        self.new = {
+            name: np.zeros(model.num_agents, dtype=np.int64)
+            for name, metric in self.metrics.items()
+            if metric.kind == "incidence"
+        }
+        self.counted = np.zeros(ages, dtype=bool)
+
+    def record_state_changes(self, unique_ids: np.array, state_ids, to_states):
+        """ Count the state changes that enter the states of each incidence metric
+        """
+        unique_ids, state_ids, to_states = np.broadcast_arrays(unique_ids, state_ids, to_states)
+        for name, new in self.new.items():
+            metric = self.metrics[name]
+            entered = (state_ids == self.fields[metric.field][0]) & np.isin(to_states, metric.states)
+            np.add.at(new, unique_ids[entered], 1)
+
+    def update(self):
+        """ Called after each step. Once the last step of an age is done, take that age's counts.
+        """
+        position = last_step_of_age(self.model)
+        if position is not None and position < len(self.counted):
+            self.count(position)
+
+    def count(self, position: int):
+        model = self.model
+        replications = model.unique_ids // model.params.num_agents
+        alive = model.life.values == LifeState.ALIVE
+        for name, metric in self.metrics.items():
+            selected = alive.copy() if metric.alive_only else np.ones(len(alive), dtype=bool)
+            for field, states in metric.filter_dict.items():
+                selected &= np.isin(self.fields[field][1](), states)
+            self.denominators[name][:, position] = np.bincount(
+                replications[selected & alive], minlength=model.replications
+            )
+            if metric.kind == "prevalence":
+                inside = selected & np.isin(self.fields[metric.field][1](), metric.states)
+                self.numerators[name][:, position] = np.bincount(replications[inside], minlength=model.replications)
+            else:
+                new = self.new[name]
+                self.numerators[name][:, position] = np.bincount(
+                    replications[selected], weights=new[model.unique_ids[selected]], minlength=model.replications
+                )
+                new.fill(0)
+        self.counted[position] = True
+
+    def rate(self, name: str, replication: int = 0) -> pd.Series:
+        """ Return the metric's rate at each age, as `Analysis.prevalence` or `Analysis.incidence` would
+        """
+        # Ages that were not reached keep the counts of the last age that was (the agents keep their states)
+        positions = np.arange(len(self.counted))
+        filled = np.maximum.accumulate(np.where(self.counted, positions, 0))
+        denominator = pd.Series(self.denominators[name][replication, filled], index=self.age_index)
+        if self.metrics[name].kind == "prevalence":
+            numerator = pd.Series(self.numerators[name][replication, filled], index=self.age_index)
+            return numerator / denominator
+        numerator = pd.Series(self.numerators[name][replication], index=self.age_index)
+        return numerator / fix_alive_count(denominator)
+
+    def make_rates(self, replication: int = 0) -> pd.DataFrame:
+        """ Return one row per age, with one column per metric """
+        df = pd.DataFrame({name: self.rate(name, replication) for name in self.metrics})
+        df.index.name = "Age"
+        return df.reset_index()
+
+    def save(self, directories: list):
+        """ Write each replication's rates to metrics.parquet in its output directory """
+        for replication, directory in enumerate(directories):
+            self.make_rates(replication).to_parquet(Path(directory).joinpath("metrics.parquet"), index=False)
+
+
+def load_rates(scenario_dir: Path, iteration: int, metrics: dict) -> pd.DataFrame:
+    """ Return the rate of each metric (a `Metric`, or a dictionary of its arguments) at each age, indexed by age.
+    The rates are read from the iteration's metrics.parquet when the run counted all of them, and computed with
+    `Analysis` otherwise.
+    """
+    path = Path(scenario_dir).joinpath(f"iteration_{iteration}", "metrics.parquet")
+    if path.exists():
+        rates = pd.read_parquet(path).set_index("Age")
+        if set(metrics).issubset(rates.columns):
+            return rates[list(metrics)]
+
+    analysis = Analysis(scenario_dir, iteration)
+    rates = dict()
+    for name, metric in metrics.items():
+        metric = metric if isinstance(metric, Metric) else Metric(**metric)
+        rate = analysis.prevalence if metric.kind == "prevalence" else analysis.incidence
+        rates[name] = rate(metric.field, metric.states, dict(metric.filter_dict), metric.alive_only)
+    df = pd.DataFrame(rates)
+    df.index.name = "Age"
+    return df
+
+
+def state_fields(model) -> dict:
+    """ Map each field of `Analysis` to its State_ID and a function returning the agents' current values
+    """
+    fields = {
+        HivState.id: (HivState.int, lambda: model.hiv.values),
+        CancerState.id: (CancerState.int, lambda: model.cancer.values),
+        CancerDetectionState.id: (CancerDetectionState.int, lambda: model.cancer_detection.values),
+        LifeState.id: (LifeState.int, lambda: model.life.values),
+    }
+    for strain in HpvStrain:
+        fields[strain.name] = (strain.int, lambda strain=strain: model.hpv_strains[strain].values)
+    return fields
+
+
+def age_position(time: int, steps_per_year: int) -> int:
+    """ The position of a time step's age, counted from the initial age. As in `Analysis`, this is the number of
+    years rounded half to even.
+    """
+    return int(np.round(time / steps_per_year))
+
+
+def last_step_of_age(model):
+    """ Called after each step. If the step was the last of its age, return the position of that age. """
+    steps_per_year = model.params.steps_per_year
+    position = age_position(model.time - 1, steps_per_year)
+    if model.time == model.params.num_steps or age_position(model.time, steps_per_year) != position:
+        return position
+    return None
+
+
+def state_values(states) -> tuple:
+    states = states if isinstance(states, (tuple, list)) else (states,)
+    return tuple(int(state) for state in states)
+
+
+def fix_alive_count(count_alive: pd.Series) -> pd.Series:
+    """ The average number alive at the start and end of each age, as in `Analysis.fix_alive_count` """
+    alive_count = count_alive.rolling(2).mean()
+    alive_count.iloc[0] = count_alive.iloc[0]
+    return alive_count
@@ -1,5 +1,7 @@
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from bisect import bisect
 
 
@@ -44,63 +46,111 @@ def random_selection(random: float, cdf: list, options: list) -> object:
     return options[bisect(cdf, random)]
 
 
-def filter_hpv_dict(hpv_dict, strain):
-    new_dict = dict()
-    for k, v in hpv_dict.items():
-        if k[1] == strain:
-            new_dict[k] = v
-    return new_dict
+def random_selections(randoms: np.ndarray, cdfs: np.ndarray, options: list) -> np.ndarray:
+    """ Vectorized version of `random_selection`: make one selection for each row of `cdfs`
 
-
-class Dynamic2DArray:
+    Parameters
+    ----------
+    randoms: an array of random numbers between 0 and 1, one per selection
+    cdfs : a 2-D array where each row contains cumulative distribution values
+    options : a list containing the options that can be selected
     """
-    Expandable numpy array designed to be faster than np.append.
-    Based on: https://stackoverflow.com/a/7134033
-    Slightly slower than using Python lists but way more memory efficient.
+    return np.asarray(options)[(cdfs <= randoms[:, np.newaxis]).sum(axis=1)]
+
+
+def sample_without_replacement(rng: np.random.Generator, population: int, size: int) -> np.ndarray:
+    """ Select `size` unique integers in [0, population) uniformly at random
+
+    Parameters
+    ----------
+    rng : the random number generator
+    population : the number of integers to choose from
+    size : the number of integers to choose
     """
+    if size * 4 > population:
+        return np.sort(rng.permutation(population)[:size])
+    # Draw with replacement and top up any duplicates. Every subset is equally likely by symmetry.
+    chosen = np.unique(rng.integers(0, population, size))
+    while len(chosen) < size:
+        chosen = np.unique(np.concatenate([chosen, rng.integers(0, population, size - len(chosen))]))
+    return chosen
 
-    def __init__(self, num_columns: int, dtype=np.uint32):
-        self.num_columns = num_columns
-        self.capacity = 100
-        self.size = 0
-        self.data = np.zeros((self.capacity, self.num_columns), dtype=dtype)
 
-    def add_row(self, row: np.ndarray):
-        if self.size == self.capacity:
-            self.capacity *= 2
-            newdata = np.zeros((self.capacity, self.num_columns))
-            newdata[: self.size] = self.data
-            self.data = newdata
+def binomial_selections(rng: np.random.Generator, codes: np.ndarray, probabilities: np.ndarray) -> np.ndarray:
+    """ Select agents by probability class: draw how many agents in each class are selected, and then which ones.
+    Returns the sorted positions of the selected agents.
 
-        self.data[self.size] = row
-        self.size += 1
+    Parameters
+    ----------
+    rng : the random number generator
+    codes : an array of integer class codes, one per agent
+    probabilities : the selection probability of each class code
+    """
+    counts = np.bincount(codes, minlength=len(probabilities))
+    probabilities = np.clip(np.nan_to_num(probabilities[: len(counts)]), 0, 1)
+    draws = rng.binomial(counts, np.where(counts > 0, probabilities, 0))
+    classes = np.flatnonzero(draws)
+    if len(classes) == 0:
+        return np.zeros(0, dtype=np.intp)
 
-    def finalize(self):
-        return self.data[: self.size]
+    # ----- Classes where few members are selected: draw random positions and keep those in the class
+    sparse = draws[classes] * 64 < counts[classes]
+    selected = [sample_class(rng, codes, code, counts[code], draws[code]) for code in classes[sparse]]
 
-    def __getitem__(self, *args, **kwargs):
-        return self.data.__getitem__(*args, **kwargs)
+    # ----- All other classes: find their members in a single pass, and select from each class
+    pooled = classes[~sparse]
+    if len(pooled) > 0:
+        in_pool = np.zeros(len(counts), dtype=bool)
+        in_pool[pooled] = True
+        members = np.flatnonzero(in_pool[codes])
+        members = members[np.argsort(codes[members], kind="stable")]
+        starts = np.concatenate([[0], np.cumsum(counts[pooled])])
+        for i, code in enumerate(pooled):
+            group = members[starts[i] : starts[i + 1]]
+            selected.append(group[sample_without_replacement(rng, counts[code], draws[code])])
+    return np.sort(np.concatenate(selected))
 
-    def __setitem__(self, *args, **kwargs):
-        """
-        Note: allowing access to this might allow users to do something unexpected
-        if they set rows that don't "exist" yet but are part of the capacity.
-        """
-        return self.data.__setitem__(*args, **kwargs)
+
+def sample_class(rng: np.random.Generator, codes: np.ndarray, code: int, count: int, size: int) -> np.ndarray:
+    """ Select `size` positions uniformly at random from the `count` positions where `codes` equals `code`. Each
+    randomly drawn position that is in the class is equally likely to be any member of the class.
+    """
+    chosen = np.zeros(0, dtype=np.intp)
+    while len(chosen) < size:
+        candidates = rng.integers(0, len(codes), int((size - len(chosen)) * len(codes) / count * 1.2) + 1)
+        chosen = np.unique(np.concatenate([chosen, candidates[codes[candidates] == code]]))
+    if len(chosen) > size:
+        chosen = chosen[sample_without_replacement(rng, len(chosen), size)]
+    return chosen
 
 
 class EventStorage:
-    def __init__(self, column_names: list, store_events: bool = True):
-        """EventStorage is used to record changes to state variables or to record events in a model
+    def __init__(
+        self, column_names: list, store_events: bool = True, dtypes: list = None, chunk_size: int = 2 ** 16,
+    ):
+        """EventStorage is used to record changes to state variables or to record events in a model. Each column has a
+        fixed dtype, and rows are stored in preallocated chunks of `chunk_size` rows.
 
         Args:
             column_names (list): A list of the column names
             store_events (bool, optional): Should events be stored. Defaults to True. This parameter can be used to
                 turn off storing of events to save time and memory.
+            dtypes (list, optional): The dtype of each column. Defaults to int64 for every column.
+            chunk_size (int, optional): The number of rows in each chunk. Defaults to 65536.
         """
         self.store_events = store_events
         self.column_names = column_names
-        self.data = []
+        self.dtypes = [np.dtype(dtype) for dtype in (dtypes or [np.int64] * len(column_names))]
+        self.chunk_size = chunk_size
+        # Full chunks that are held in memory, and the chunk being filled
+        self.chunks = []
+        self.chunk = self.new_chunk()
+        self.size = 0
+        # If set, full chunks are written to the sink (see `ParquetSink`) instead of being held in memory
+        self.sink = None
+
+    def new_chunk(self) -> list:
+        return [np.empty(self.chunk_size, dtype=dtype) for dtype in self.dtypes]
 
     def record_event(self, row: tuple):
         """Record a change to a state variable
@@ -109,8 +159,194 @@ class EventStorage:
             row (tuple): A tuple of values to be recorded. Must match the length of `self.column_names`
         """
         if self.store_events:
-            self.data.append(row)
+            for column, value in zip(self.chunk, row):
+                column[self.size] = value
+            self.size += 1
+            if self.size == self.chunk_size:
+                self.finish_chunk()
+
+    def record_events(self, *columns):
+        """Record many changes at once
+
+        Args:
+            columns: One argument per column, in the order of `self.column_names`. Each is either an array holding one
+                value per event or a scalar shared by all events.
+        """
+        if not self.store_events:
+            return
+        columns = np.broadcast_arrays(*[np.asarray(column) for column in columns])
+        count = columns[0].size
+        start = 0
+        while start < count:
+            rows = min(count - start, self.chunk_size - self.size)
+            for chunk_column, column in zip(self.chunk, columns):
+                chunk_column[self.size : self.size + rows] = column[start : start + rows]
+            self.size += rows
+            start += rows
+            if self.size == self.chunk_size:
+                self.finish_chunk()
+
+    def finish_chunk(self):
+        if self.sink is not None:
+            self.sink.write(self.make_frame([self.chunk], self.size))
+        else:
+            self.chunks.append(self.chunk)
+        self.chunk = self.new_chunk()
+        self.size = 0
+
+    def flush(self):
+        """ Write every row held in memory to the sink
+        """
+        self.sink.write(self.make_events())
+        self.chunks = []
+        self.size = 0
+
+    def make_frame(self, chunks: list, size: int) -> pd.DataFrame:
+        """ Convert full chunks, followed by the first `size` rows of the chunk being filled, to a DataFrame """
+        data = {}
+        for i, name in enumerate(self.column_names):
+            data[name] = np.concatenate([chunk[i] for chunk in chunks[:-1]] + [chunks[-1][i][:size]])
+        return pd.DataFrame(data)
+
+    def make_events(self) -> pd.DataFrame:
+        """ Convert the rows held in memory to a DataFrame """
+        return self.make_frame(self.chunks + [self.chunk], self.size)
+
+    @property
+    def arr(self) -> np.ndarray:
+        """ The rows held in memory as one 2-D array (one column per field) """
+        return self.make_events().to_numpy()
+
+
+class ParquetSink:
+    def __init__(self, paths: list, prepare=None, split=None):
+        """ Write DataFrames of events to Parquet files, one row group per DataFrame
+
+        Args:
+            paths (list): The files to write to
+            prepare (callable, optional): Converts each DataFrame to the output format before it is written
+            split (callable, optional): Given a DataFrame and a file's position in `paths`, returns the rows written to
+                that file. Required if there is more than one file.
+        """
+        self.paths = paths
+        self.prepare = prepare
+        self.split = split
+        self.writers = [None] * len(paths)
+        self.empty = None
+
+    def write(self, df: pd.DataFrame):
+        if self.prepare is not None:
+            df = self.prepare(df)
+        if self.empty is None:
+            self.empty = df.iloc[:0]
+        for i, path in enumerate(self.paths):
+            part = df if self.split is None else self.split(df, i)
+            if len(part) == 0:
+                continue
+            table = pa.Table.from_pandas(part, preserve_index=False)
+            if self.writers[i] is None:
+                self.writers[i] = pq.ParquetWriter(path, table.schema)
+            self.writers[i].write_table(table)
+
+    def close(self):
+        """ Finish every file. Files that were never written to hold no rows. """
+        for path, writer in zip(self.paths, self.writers):
+            if writer is not None:
+                writer.close()
+            elif self.empty is not None:
+                self.empty.to_parquet(path, index=False)
+        self.writers = [None] * len(self.paths)
+
+
+class SummaryStorage:
+    def __init__(self, column_names: list, names: list, shape: tuple, key, offsets: list = None, sum_column=None):
+        """SummaryStorage counts recorded events by group, instead of storing them. It has the same `record_events`
+        method as `EventStorage`.
+
+        Args:
+            column_names (list): The names of the recorded columns
+            names (list): The name of each group field
+            shape (tuple): The number of values of each group field
+            key (callable): Given a dictionary of recorded columns, returns the position of each event on every group
+                field (one array per field)
+            offsets (list, optional): The value of position 0 of each group field. Defaults to 0 for every field.
+            sum_column (str, optional): A recorded column to sum within each group
+        """
+        self.column_names = column_names
+        self.names = names
+        self.shape = tuple(shape)
+        self.key = key
+        self.offsets = offsets or [0] * len(names)
+        self.sum_column = sum_column
+        self.counts = np.zeros(int(np.prod(self.shape)), dtype=np.int64)
+        self.sums = np.zeros(len(self.counts)) if sum_column else None
+
+    def record_event(self, row: tuple):
+        self.record_events(*row)
+
+    def record_events(self, *columns):
+        columns = np.broadcast_arrays(*[np.asarray(column) for column in columns])
+        if columns[0].size == 0:
+            return
+        columns = dict(zip(self.column_names, [column.ravel() for column in columns]))
+        flat = np.ravel_multi_index(self.key(columns), self.shape)
+        self.counts += np.bincount(flat, minlength=len(self.counts))
+        if self.sums is not None:
+            self.sums += np.bincount(flat, weights=columns[self.sum_column], minlength=len(self.sums))
+
+    def make_events(self) -> pd.DataFrame:
+        """ Return one row for each group with at least one event """
+        groups = np.flatnonzero(self.counts)
+        positions = np.unravel_index(groups, self.shape)
+        data = {name: position + offset for name, position, offset in zip(self.names, positions, self.offsets)}
+        data["Count"] = self.counts[groups]
+        if self.sums is not None:
+            data[self.sum_column] = self.sums[groups]
+        return pd.DataFrame(data)
+
+
+class FirstPassageStorage:
+    def __init__(self, column_names: list, count: int, tracked: dict, others: list = (), dtype=np.int16):
+        """FirstPassageStorage keeps the time each agent first enters each tracked state, instead of storing every
+        state change. It has the same `record_events` method as `EventStorage`.
+
+        Args:
+            column_names (list): The names of the recorded columns: Time, Unique_ID, State_ID, From, and To
+            count (int): The number of agents
+            tracked (dict): Maps the name of each tracked state to its (State_ID, To) pair
+            others (list, optional): The names of other tracked entries (such as events), recorded with `record_first`
+            dtype (optional): The dtype of the times. Agents that never enter a state have a time of -1.
+        """
+        self.column_names = column_names
+        self.names = list(tracked) + list(others)
+        pairs = np.array(list(tracked.values()))
+        self.columns = np.full(pairs.max(axis=0) + 1, -1, dtype=np.intp)
+        self.columns[pairs[:, 0], pairs[:, 1]] = np.arange(len(pairs))
+        self.times = np.full((count, len(self.names)), -1, dtype=dtype)
+
+    def record_event(self, row: tuple):
+        self.record_events(*row)
+
+    def record_events(self, *columns):
+        time, unique_ids, state_ids, _, to_states = np.broadcast_arrays(*[np.asarray(column) for column in columns])
+        within = (state_ids < self.columns.shape[0]) & (to_states < self.columns.shape[1])
+        columns = np.full(state_ids.shape, -1, dtype=np.intp)
+        columns[within] = self.columns[state_ids[within], to_states[within]]
+        tracked = columns >= 0
+        self.record_times(time[tracked], unique_ids[tracked], columns[tracked])
+
+    def record_first(self, time: int, unique_ids: np.array, name: str):
+        """ Record an entry that is not a state change, such as vaccination """
+        self.record_times(time, unique_ids, self.names.index(name))
+
+    def record_times(self, time, unique_ids: np.array, columns):
+        time, unique_ids, columns = np.broadcast_arrays(time, unique_ids, columns)
+        # Times only increase, so an agent's first entry is the first one recorded
+        first = self.times[unique_ids, columns] < 0
+        self.times[unique_ids[first], columns[first]] = time[first]
 
     def make_events(self) -> pd.DataFrame:
-        """ Convert the array to a DataFrame """
-        return pd.DataFrame(self.data, columns=self.column_names)
+        """ Return one row per agent, with one column per tracked state """
+        df = pd.DataFrame(self.times, columns=self.names)
+        df.insert(0, "Unique_ID", np.arange(len(df)))
+        return df
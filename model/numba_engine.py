@@ -0,0 +1,338 @@
+import numba
+import numpy as np
+
+from model.random_streams import ReplicatedStream
+from model.state import CancerDetectionState, CancerState, HivState, HpvImmunity, HpvState, LifeState
+from model.transition_table import TransitionTable
+
+# ----- State values as plain integers, which the kernel treats as constants
+HPV_NORMAL = HpvState.NORMAL.value
+HPV_CANCER = HpvState.CANCER.value
+IMMUNITY_NATURAL = HpvImmunity.NATURAL.value
+HIV_NORMAL = HivState.NORMAL.value
+HIV = HivState.HIV.value
+HIV_ID = HivState.int
+CANCER_NORMAL = CancerState.NORMAL.value
+CANCER_LOCAL = CancerState.LOCAL.value
+CANCER_REGIONAL = CancerState.REGIONAL.value
+CANCER_DEAD = CancerState.DEAD.value
+CANCER_ID = CancerState.int
+UNDETECTED = CancerDetectionState.UNDETECTED.value
+DETECTED = CancerDetectionState.DETECTED.value
+DETECTION_ID = CancerDetectionState.int
+ALIVE = LifeState.ALIVE.value
+DEAD = LifeState.DEAD.value
+LIFE_ID = LifeState.int
+
+# The most state changes one agent can make in a step: one per HPV strain, cancer onset, HIV, cancer progression,
+# death from cancer, cancer detection, and death
+MAX_EVENTS_PER_AGENT = 10
+
+
+class EventBuffer:
+    def __init__(self, capacity: int):
+        """ Preallocated columns that the step kernel writes state changes into. Agents are stored by position.
+        """
+        self.positions = np.zeros(capacity, dtype=np.int64)
+        self.state_ids = np.zeros(capacity, dtype=np.int8)
+        self.from_states = np.zeros(capacity, dtype=np.int8)
+        self.to_states = np.zeros(capacity, dtype=np.int8)
+
+
+class NumbaEngine:
+    def __init__(self, model):
+        """ Step the model with a compiled per-agent kernel instead of the Python state classes
+            - The kernel runs the stages of `CervicalModel.step` in order (HPV, HIV, cancer progression, cancer
+              detection, and life). Each stage loops over the living agents, so the model's semantics are unchanged.
+            - State changes are written to an `EventBuffer` and recorded once per step. Work outside the monthly
+              transitions (cancer treatment costs, screening schedules, and the active sets) stays in Python.
+            - Requires cached probabilities and Bernoulli sampling. Each stage draws from its state's random stream,
+              so results match the Python engine in distribution but not draw for draw.
+        """
+        self.model = model
+        params = model.params
+        if params.probability_lookup != "cached" or params.sampling != "bernoulli":
+            raise ValueError("The numba engine requires probability_lookup: cached and sampling: bernoulli.")
+        self.buffer = EventBuffer(capacity=MAX_EVENTS_PER_AGENT * model.num_agents)
+        # --- Tables indexed directly by the key values
+        self.hpv_leave = by_value(model.hpv.probability_table)
+        self.hpv_cdf = by_value(model.hpv.transition_cdf)
+        self.cancer_leave = by_value(model.cancer.probability_table)
+        self.cancer_cdf = by_value(model.cancer.transition_cdf)
+        self.detection_table = by_value(model.cancer_detection.probability_table)
+        self.life_table = by_value(model.life.probability_table)
+
+    def step(self):
+        """ Run the kernel over the living agents. With replications, the kernel runs once for each replication's
+        agents, drawing from that replication's streams.
+        """
+        model = self.model
+        alive = model.active_sets.alive
+        if model.replications == 1:
+            self.record(self.step_agents(alive, 0, 0))
+            return
+        replications = model.replication_of(alive)
+        count = 0
+        for replication in range(model.replications):
+            count = self.step_agents(alive[replications == replication], replication, count)
+        self.record(count)
+
+    def step_agents(self, alive: np.array, replication: int, start: int) -> int:
+        """ Run the kernel over the given agents of one replication, writing their state changes to the buffer after
+        the first `start`. Return the number of state changes in the buffer.
+        """
+        model = self.model
+        hiv_probabilities = model.hiv.probabilities
+        if hiv_probabilities is None:
+            hiv_probabilities = np.zeros(len(model.unique_ids))
+        buffer = self.buffer
+        return start + step_kernel(
+            alive,
+            model.age,
+            model.params.include_hiv,
+            model.params.hiv_detection_rate,
+            model.hpv.values,
+            model.hpv.hpv_immunity,
+            model.hpv.probabilities,
+            model.max_hpv_state.values,
+            model.hpv.strain_ints.astype(np.int8),
+            model.hpv.step_rank,
+            self.hpv_leave,
+            self.hpv_cdf,
+            model.hiv.values,
+            hiv_probabilities,
+            model.hiv_detected,
+            model.cancer.values,
+            model.cancer.probabilities,
+            self.cancer_leave,
+            self.cancer_cdf,
+            model.cancer_detection.values,
+            model.cancer_detection.probabilities,
+            self.detection_table,
+            model.life.values,
+            model.life.probabilities,
+            self.life_table,
+            tuple(generator(state.rng, replication) for state in model.hpv.states()),
+            generator(model.hpv.rng, replication),
+            generator(model.hiv.rng, replication),
+            generator(model.cancer.rng, replication),
+            generator(model.cancer_detection.rng, replication),
+            generator(model.life.rng, replication),
+            buffer.positions[start:],
+            buffer.state_ids[start:],
+            buffer.from_states[start:],
+            buffer.to_states[start:],
+        )
+
+    def record(self, count: int):
+        """ Record the state changes written by the kernel, and apply the work that stays in Python
+        """
+        model = self.model
+        positions = self.buffer.positions[:count]
+        state_ids = self.buffer.state_ids[:count]
+        from_states = self.buffer.from_states[:count]
+        model.record_state_changes(positions, state_ids, from_states, self.buffer.to_states[:count])
+
+        onset = positions[(state_ids == CancerState.int) & (from_states == CancerState.NORMAL)]
+        model.active_sets.add_cancer(onset)
+        # --- HIV: agents whose HIV was detected may have a shorter screening interval
+        infected = positions[state_ids == HivState.int]
+        model.active_sets.remove_hiv(infected)
+        model.screening_calendar.schedule(infected[model.hiv_detected[infected]])
+        # --- Cancer detection: treat cancer and update the detection times
+        detected = positions[state_ids == CancerDetectionState.int]
+        model.active_sets.remove_detected(detected)
+        model.cancer_detection.treat_detected(detected)
+        model.cancer.update_time_since_detection()
+        model.active_sets.remove_dead(positions[state_ids == LifeState.int])
+
+
+def by_value(table: TransitionTable) -> np.ndarray:
+    """ Return the table's data padded with NaN so that each key field is indexed by its value instead of its position
+    """
+    padding = [(offset, 0) for offset in table.offsets] + [(0, 0)] * (table.data.ndim - len(table.offsets))
+    return np.ascontiguousarray(np.pad(table.data, padding, constant_values=np.nan))
+
+
+def generator(rng, replication: int = 0) -> np.random.Generator:
+    """ Return the generator behind a stream, or behind one replication's stream. Buffered streams are drawn from
+    directly.
+    """
+    if isinstance(rng, ReplicatedStream):
+        rng = rng.streams[replication]
+    return getattr(rng, "rng", rng)
+
+
+@numba.njit(cache=True)
+def pick_state(cdf: np.ndarray, random: float) -> int:
+    """ Pick a new state (states start at 1) from a row of cumulative probabilities, as `random_selection` does
+    """
+    state = 1
+    for value in cdf:
+        if value <= random:
+            state += 1
+    return state
+
+
+@numba.njit(cache=True)
+def step_kernel(
+    alive,
+    age,
+    include_hiv,
+    hiv_detection_rate,
+    hpv_values,
+    hpv_immunity,
+    hpv_probabilities,
+    max_hpv_state,
+    strain_ints,
+    step_rank,
+    hpv_leave,
+    hpv_cdf,
+    hiv_values,
+    hiv_probabilities,
+    hiv_detected,
+    cancer_values,
+    cancer_probabilities,
+    cancer_leave,
+    cancer_cdf,
+    detection_values,
+    detection_probabilities,
+    detection_table,
+    life_values,
+    life_probabilities,
+    life_table,
+    strain_rngs,
+    hpv_rng,
+    hiv_rng,
+    cancer_rng,
+    detection_rng,
+    life_rng,
+    positions,
+    state_ids,
+    from_states,
+    to_states,
+):
+    """ Simulate one step for the living agents and return the number of state changes written to the buffer
+    """
+    num_strains = hpv_values.shape[0]
+    count = 0
+    selected = np.zeros(num_strains, dtype=np.bool_)
+    new = np.zeros(num_strains, dtype=np.int8)
+
+    # ----- HPV: Must be alive and cannot have cancer. Strains after the one an agent gets cancer from are dropped.
+    for i in alive:
+        if cancer_values[i] != CANCER_NORMAL:
+            continue
+        onset = num_strains
+        for row in range(num_strains):
+            selected[row] = hpv_probabilities[row, i] > strain_rngs[row].random()
+        for row in range(num_strains):
+            if selected[row]:
+                cdf = hpv_cdf[age, row + 1, hpv_immunity[row, i], hpv_values[row, i], hiv_values[i]]
+                new[row] = pick_state(cdf, hpv_rng.random())
+                if new[row] == HPV_CANCER:
+                    onset = min(onset, step_rank[row])
+        changed = False
+        for row in range(num_strains):
+            if not selected[row] or step_rank[row] > onset:
+                continue
+            positions[count] = i
+            state_ids[count] = strain_ints[row]
+            from_states[count] = hpv_values[row, i]
+            to_states[count] = new[row]
+            count += 1
+            hpv_values[row, i] = new[row]
+            changed = True
+            # Returning to normal builds some immunity to HPV
+            if new[row] == HPV_NORMAL:
+                hpv_immunity[row, i] = max(hpv_immunity[row, i], IMMUNITY_NATURAL)
+            # Only move to cancer if agent does not already have cancer
+            if new[row] == HPV_CANCER and cancer_values[i] == CANCER_NORMAL:
+                positions[count] = i
+                state_ids[count] = CANCER_ID
+                from_states[count] = CANCER_NORMAL
+                to_states[count] = CANCER_LOCAL
+                count += 1
+                cancer_values[i] = CANCER_LOCAL
+                cancer_probabilities[i] = cancer_leave[detection_values[i], cancer_values[i]]
+                life_probabilities[i] = life_table[age, hiv_values[i], cancer_values[i]]
+        if changed:
+            highest = HPV_NORMAL
+            for row in range(num_strains):
+                if selected[row] and step_rank[row] <= onset:
+                    hpv_probabilities[row, i] = hpv_leave[
+                        age, row + 1, hpv_immunity[row, i], hpv_values[row, i], hiv_values[i]
+                    ]
+                highest = max(highest, hpv_values[row, i])
+            max_hpv_state[i] = highest
+
+    # ----- HIV: Must be alive and not HIV infected
+    if include_hiv:
+        for i in alive:
+            if hiv_values[i] != HIV_NORMAL or not hiv_probabilities[i] > hiv_rng.random():
+                continue
+            positions[count] = i
+            state_ids[count] = HIV_ID
+            from_states[count] = HIV_NORMAL
+            to_states[count] = HIV
+            count += 1
+            hiv_values[i] = HIV
+            if hiv_rng.random() < hiv_detection_rate:
+                hiv_detected[i] = True
+            for row in range(num_strains):
+                hpv_probabilities[row, i] = hpv_leave[age, row + 1, hpv_immunity[row, i], hpv_values[row, i], HIV]
+            life_probabilities[i] = life_table[age, HIV, cancer_values[i]]
+
+    # ----- Cancer progression: Must be living, be LOCAL or REGIONAL, and not be detected
+    for i in alive:
+        state = cancer_values[i]
+        if detection_values[i] != UNDETECTED:
+            continue
+        if state != CANCER_LOCAL and state != CANCER_REGIONAL:
+            continue
+        if not cancer_probabilities[i] > cancer_rng.random():
+            continue
+        new_state = pick_state(cancer_cdf[detection_values[i], state], cancer_rng.random())
+        positions[count] = i
+        state_ids[count] = CANCER_ID
+        from_states[count] = state
+        to_states[count] = new_state
+        count += 1
+        cancer_values[i] = new_state
+        detection_probabilities[i] = detection_table[new_state]
+        cancer_probabilities[i] = cancer_leave[detection_values[i], new_state]
+        life_probabilities[i] = life_table[age, hiv_values[i], new_state]
+        if new_state == CANCER_DEAD:
+            positions[count] = i
+            state_ids[count] = LIFE_ID
+            from_states[count] = ALIVE
+            to_states[count] = DEAD
+            count += 1
+            life_values[i] = DEAD
+
+    # ----- Cancer detection: Must be alive, undetected, and have cancer
+    for i in alive:
+        if life_values[i] != ALIVE or cancer_values[i] == CANCER_NORMAL:
+            continue
+        if detection_values[i] != UNDETECTED:
+            continue
+        if not detection_probabilities[i] > detection_rng.random():
+            continue
+        positions[count] = i
+        state_ids[count] = DETECTION_ID
+        from_states[count] = UNDETECTED
+        to_states[count] = DETECTED
+        count += 1
+        detection_values[i] = DETECTED
+
+    # ----- Life: every living agent
+    for i in alive:
+        if life_values[i] != ALIVE or not life_probabilities[i] > life_rng.random():
+            continue
+        positions[count] = i
+        state_ids[count] = LIFE_ID
+        from_states[count] = ALIVE
+        to_states[count] = DEAD
+        count += 1
+        life_values[i] = DEAD
+    return count
@@ -75,12 +75,43 @@ class Parameters(ParameterContainer):
         self.add_param("seed", 1111)
         self.add_param("hiv_detection_rate", 1)
         self.add_param("include_hiv", True)
-
+        # How transition probabilities are found: "cached" (one probability per agent, updated on every state change)
+        # or "packed" (looked up from each agent's current states when needed)
+        self.add_param("probability_lookup", "cached")
+        # How agents are selected to transition: "bernoulli" (a random draw for each agent at every step),
+        # "waiting_time" (a geometric waiting time, drawn when an agent's probability changes), or "binomial" (a
+        # binomial draw of the number selected from each group of agents that share a probability)
+        self.add_param("sampling", "bernoulli")
+        # How the monthly transitions are simulated: "python" (the state classes) or "numba" (a compiled per-agent
+        # kernel, see `model/numba_engine.py`. Requires numba, cached probabilities, and Bernoulli sampling.)
+        self.add_param("engine", "python")
+        # Hand out uniform random numbers from pre-drawn blocks of this size (0 draws directly from each stream)
+        self.add_param("random_buffer_size", 0)
+        # Remove dead agents from the state arrays at each yearly update
+        self.add_param("compact_agents", False)
+
+        # Prevalence and incidence rates counted during the run (see `model/metrics.py`), by name. Each is a dictionary
+        # with kind ("prevalence" or "incidence"), field, states, and optionally filter_dict and alive_only.
+        self.add_param("metrics", dict())
+
+        self.add_param("output", OutputParameters())
         self.add_param("vaccination", VaccinationParameters())
         self.add_param("screening", ScreeningParameters())
         self.add_param("treatment", TreatmentParameters())
 
 
+class OutputParameters(ParameterContainer):
+    def __init__(self):
+        super().__init__()
+        # What the model records and writes: "none", "summary" (state changes and events counted by age),
+        # "first_passage" (the time each agent first enters each state, with summarized events), or "full" (every
+        # state change and event)
+        self.add_param("level", "full")
+        # Save every agent's states at each age as int8 panels (see `model/snapshots.py`), which `Analysis` loads
+        # instead of rebuilding the agents' timelines from the state changes
+        self.add_param("snapshots", False)
+
+
 class ScreeningParameters(ParameterContainer):
     def __init__(self):
         super().__init__()
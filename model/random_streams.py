@@ -0,0 +1,151 @@
+import zlib
+
+import numpy as np
+
+
+class RandomStreams:
+    def __init__(self, seed: int, key: tuple = (), buffer_size: int = 0):
+        """ Independent random number generators for the components of a model run
+            - The seed of each component's stream is derived from (seed, *key, component) with `np.random.SeedSequence`.
+              A component's random numbers therefore don't depend on how many numbers other components draw, or on
+              the order or process in which runs are executed.
+            - `key` identifies the run, for example (scenario, iteration)
+            - Streams use the PCG64 bit generator through `np.random.Generator`
+            - If `buffer_size` is positive, each stream is a `RandomBuffer` of that size
+        """
+        self.seed = seed
+        self.key = tuple(stream_key(item) for item in key)
+        self.buffer_size = buffer_size
+        self.streams = dict()
+
+    def stream(self, component: str) -> np.random.Generator:
+        """ Return the generator of the given component. Asking for the same component returns the same generator.
+        """
+        if component not in self.streams:
+            sequence = np.random.SeedSequence(self.seed, spawn_key=self.key + (stream_key(component),))
+            rng = np.random.Generator(np.random.PCG64(sequence))
+            if self.buffer_size > 0:
+                rng = RandomBuffer(rng, size=self.buffer_size)
+            self.streams[component] = rng
+        return self.streams[component]
+
+
+class ReplicatedStreams:
+    def __init__(self, streams: list, replication_of):
+        """ The random streams of a model that simulates several replications together. Replication r has its own
+        `RandomStreams`, keyed on its own iteration, so it draws the numbers it would draw if run on its own.
+            - `replication_of` returns the replication of the agents at the given positions
+            - Each component's stream is a `ReplicatedStream`. Draws for agents go through `agent_random` or
+              `by_replication`, which split them among the replications' streams.
+        """
+        self.replications = streams
+        self.replication_of = replication_of
+        self.streams = dict()
+
+    def stream(self, component: str):
+        if component not in self.streams:
+            streams = [replication.stream(component) for replication in self.replications]
+            self.streams[component] = ReplicatedStream(streams, self.replication_of)
+        return self.streams[component]
+
+
+class ReplicatedStream:
+    def __init__(self, streams: list, replication_of):
+        """ One component's stream in each replication
+        """
+        self.streams = streams
+        self.replication_of = replication_of
+
+    def random(self, size=None):
+        raise ValueError("Draws from a replicated stream must say which agents they are for. Use agent_random.")
+
+
+class RandomBuffer:
+    def __init__(self, rng: np.random.Generator, size: int = 65536):
+        """ Hand out uniform random numbers from blocks drawn `size` at a time. A scalar draw is an array index instead
+        of a call into the generator.
+            - The numbers depend only on the generator's seed, `size`, and the sizes of the draws
+            - Draws of `size` numbers or more bypass the buffer
+            - Any other method (such as `binomial` or `integers`) is passed to the generator
+        """
+        self.rng = rng
+        self.size = size
+        self.block = np.zeros(0)
+        self.cursor = 0
+
+    def __getattr__(self, name):
+        if name == "rng":
+            # Not yet set (for example while unpickling)
+            raise AttributeError(name)
+        return getattr(self.rng, name)
+
+    def refill(self):
+        # A new block is created (instead of overwriting), so arrays handed out earlier keep their values
+        self.block = self.rng.random(self.size)
+        self.cursor = 0
+
+    def random(self, size=None):
+        """ Return a uniform random number in [0, 1), or an array of them if `size` is given
+        """
+        if size is None:
+            if self.cursor == len(self.block):
+                self.refill()
+            self.cursor += 1
+            return float(self.block[self.cursor - 1])
+        count = int(np.prod(size))
+        if count >= self.size:
+            return self.rng.random(size)
+        remaining = len(self.block) - self.cursor
+        if count <= remaining:
+            randoms = self.block[self.cursor : self.cursor + count]
+            self.cursor += count
+        else:
+            head = self.block[self.cursor :]
+            self.refill()
+            randoms = np.concatenate([head, self.block[: count - remaining]])
+            self.cursor = count - remaining
+        return randoms.reshape(size)
+
+
+def stream_key(item) -> int:
+    """ Convert a name to a stable integer. Python's `hash` of a string changes between processes.
+    """
+    if isinstance(item, str):
+        return zlib.crc32(item.encode())
+    return int(item)
+
+
+def agent_random(rng, agents: np.array) -> np.ndarray:
+    """ Draw a uniform random number for each of the agents at the given positions. With replications, each agent's
+    number comes from its replication's stream, in the order of that replication's agents.
+    """
+    agents = np.asarray(agents)
+    if not isinstance(rng, ReplicatedStream):
+        return rng.random(len(agents))
+    replications = rng.replication_of(agents)
+    randoms = np.empty(len(agents))
+    for replication, stream in enumerate(rng.streams):
+        selected = replications == replication
+        randoms[selected] = stream.random(np.count_nonzero(selected))
+    return randoms
+
+
+def by_replication(rng, agents: np.array, draw) -> np.ndarray:
+    """ Return `draw(rng, agents)`. With replications, `draw` is called for each replication's agents with that
+    replication's stream, and the results are concatenated. The agents must be sorted by position.
+    """
+    if not isinstance(rng, ReplicatedStream):
+        return draw(rng, agents)
+    replications = rng.replication_of(agents)
+    return np.concatenate(
+        [draw(stream, agents[replications == replication]) for replication, stream in enumerate(rng.streams)]
+    )
+
+
+def draw_randoms(rng, count: int, agents: np.array = None) -> np.ndarray:
+    """ Draw `count` uniform random numbers, one for each of the agents at the given positions if they are known.
+    The positions are required with replications.
+    """
+    if agents is None:
+        return rng.random(count)
+    return agent_random(rng, agents)
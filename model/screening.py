@@ -1,8 +1,12 @@
 from enum import IntEnum, unique
 from typing import Dict
 
+import numpy as np
+
+from model.agent_store import NEVER
 from model.event import Event
 from model.parameters import ScreeningParameters
+from model.random_streams import draw_randoms
 from model.state import CancerState
 from model.state import CancerDetectionState
 from model.state import HpvState
@@ -27,6 +31,7 @@ class ViaScreeningTest:
     def __init__(self, model):
         self.model = model
         self.params = model.params.screening.via
+        self.rng = model.streams.stream("via_test")
 
     def get_result(self, true_hpv_state: HpvState, true_cancer_state: CancerState) -> ScreeningTestResult:
         """ Return the screening test result given a woman's most advanced HPV state and her cancer state.
@@ -44,34 +49,40 @@ class ViaScreeningTest:
         Raise a ValueError if true_cancer_state is DEAD. Also raise a ValueError
         if true_hpv_state is CANCER and true_cancer_state is NORMAL.
         """
+        return ScreeningTestResult(self.get_results([true_hpv_state], [true_cancer_state])[0])
 
-        if true_cancer_state == CancerState.DEAD:
-            raise ValueError()
-        elif true_hpv_state == HpvState.CANCER and true_cancer_state == CancerState.NORMAL:
-            raise ValueError()
-        elif true_hpv_state in [HpvState.NORMAL, HpvState.HPV, HpvState.CIN_1]:
-            if self.model.rng.random() > self.params.specificity:
-                return ScreeningTestResult.POSITIVE
-            else:
-                return ScreeningTestResult.NEGATIVE
-        elif true_hpv_state == HpvState.CIN_2_3:
-            if self.model.rng.random() < self.params.sensitivity:
-                return ScreeningTestResult.POSITIVE
-            else:
-                return ScreeningTestResult.NEGATIVE
-        elif true_cancer_state == CancerState.LOCAL:
-            if self.model.rng.random() < self.params.sensitivity:
-                return ScreeningTestResult.CANCER
-            else:
-                return ScreeningTestResult.NEGATIVE
-        else:
-            return ScreeningTestResult.CANCER
+    def get_results(self, hpv_states: np.array, cancer_states: np.array, unique_ids: np.array = None) -> np.array:
+        """ Return the screening test result of many women at once, given each woman's most advanced HPV state and her
+        cancer state. See `get_result` for the properties of the test. The women's positions (`unique_ids`) are required
+        when simulating replications.
+        """
+        hpv_states = np.asarray(hpv_states)
+        cancer_states = np.asarray(cancer_states)
+        if (cancer_states == CancerState.DEAD).any():
+            raise ValueError("Cannot screen a woman who has died of cancer.")
+        hpv_cancer = hpv_states == HpvState.CANCER
+        if (hpv_cancer & (cancer_states == CancerState.NORMAL)).any():
+            raise ValueError("A woman with an HPV state of CANCER must have cancer.")
+
+        randoms = draw_randoms(self.rng, len(hpv_states), unique_ids)
+        results = np.full(len(hpv_states), ScreeningTestResult.NEGATIVE, dtype=np.int8)
+        low = np.isin(hpv_states, [HpvState.NORMAL, HpvState.HPV, HpvState.CIN_1])
+        results[low & (randoms > self.params.specificity)] = ScreeningTestResult.POSITIVE
+        results[(hpv_states == HpvState.CIN_2_3) & (randoms < self.params.sensitivity)] = ScreeningTestResult.POSITIVE
+        local = hpv_cancer & (cancer_states == CancerState.LOCAL)
+        results[local & (randoms < self.params.sensitivity)] = ScreeningTestResult.CANCER
+        results[hpv_cancer & ~local] = ScreeningTestResult.CANCER
+        return results
 
 
 class DnaScreeningTest:
+    # The columns of the detectable strains in a (woman, strain) matrix
+    detectable = [strain - 1 for strain in [HpvStrain.SIXTEEN, HpvStrain.EIGHTEEN, HpvStrain.HIGH_RISK]]
+
     def __init__(self, model):
         self.model = model
         self.params = model.params.screening.dna
+        self.rng = model.streams.stream("dna_test")
 
     def get_result(self, true_hpv_states: Dict[HpvStrain, HpvState]) -> Dict[HpvStrain, ScreeningTestResult]:
         """ Return the screening test result given a woman's true HPV state for each
@@ -92,50 +103,34 @@ class DnaScreeningTest:
           specific, then return POSITIVE for the HIGH_RISK strain and NEGATIVE for
           other strains.
         """
+        results = self.get_results([[true_hpv_states[strain] for strain in HpvStrain]])[0]
+        return {strain: ScreeningTestResult(result) for strain, result in zip(HpvStrain, results)}
 
-        detectable = [
-            HpvStrain.SIXTEEN,
-            HpvStrain.EIGHTEEN,
-            HpvStrain.HIGH_RISK,
-        ]
+    def get_results(self, hpv_states: np.array, unique_ids: np.array = None) -> np.array:
+        """ Return the screening test results of many women at once. `hpv_states` is a (woman, strain) matrix with one
+        column per strain in `HpvStrain` order, and the results are a matrix of the same shape. See `get_result` for
+        the properties of the test. The women's positions (`unique_ids`) are required when simulating replications.
+        """
+        has_strain = np.asarray(hpv_states).reshape(-1, len(HpvStrain)) != HpvState.NORMAL
+        has_detectable = has_strain[:, self.detectable].any(axis=1)
 
         # Step 1: Compute an overall positive/negative result using the test sensitivity and specificity.
-
-        false_positive = False
-
-        if all(true_hpv_states[strain] == HpvState.NORMAL for strain in detectable):
-            if self.model.rng.random() > self.params.specificity:
-                overall_result = ScreeningTestResult.POSITIVE
-                false_positive = True
-            else:
-                overall_result = ScreeningTestResult.NEGATIVE
-        else:
-            if self.model.rng.random() < self.params.sensitivity:
-                overall_result = ScreeningTestResult.POSITIVE
-            else:
-                overall_result = ScreeningTestResult.NEGATIVE
-
-        if overall_result == ScreeningTestResult.NEGATIVE:
-            return {strain: ScreeningTestResult.NEGATIVE for strain in HpvStrain}
+        randoms = draw_randoms(self.rng, len(has_strain), unique_ids)
+        positive = np.where(has_detectable, randoms < self.params.sensitivity, randoms > self.params.specificity)
 
         # Step 2: Compute strain-specific results using deterministic rules.
-
-        result = {strain: ScreeningTestResult.NEGATIVE for strain in HpvStrain}
-
-        for strain in detectable:
-            if true_hpv_states[strain] != HpvState.NORMAL:
-                result[strain] = ScreeningTestResult.POSITIVE
-
-        if false_positive:
-            result[HpvStrain.HIGH_RISK] = ScreeningTestResult.POSITIVE
-
-        return result
+        results = np.full(has_strain.shape, ScreeningTestResult.NEGATIVE, dtype=np.int8)
+        results[:, self.detectable] = has_strain[:, self.detectable] & positive[:, None]
+        false_positive = positive & ~has_detectable
+        results[false_positive, HpvStrain.HIGH_RISK - 1] = ScreeningTestResult.POSITIVE
+        return results
 
 
 class CancerInspectionScreeningTest:
     def __init__(self, model):
         self.model = model
         self.params = model.params.screening.cancer_inspection
+        self.rng = model.streams.stream("cancer_inspection_test")
 
     def get_result(self, true_cancer_state: CancerState) -> ScreeningTestResult:
         """ Return the screening test result given a woman's true cancer state.
@@ -149,24 +144,25 @@ class CancerInspectionScreeningTest:
 
         Raise a ValueError if true_cancer_state is DEAD.
         """
+        return ScreeningTestResult(self.get_results([true_cancer_state])[0])
 
-        if true_cancer_state == CancerState.DEAD:
-            raise ValueError()
-        elif true_cancer_state in [CancerState.NORMAL, CancerState.LOCAL]:
-            if self.model.rng.random() > self.params.specificity:
-                return ScreeningTestResult.CANCER
-            else:
-                return ScreeningTestResult.NEGATIVE
-        else:
-            if self.model.rng.random() < self.params.sensitivity:
-                return ScreeningTestResult.CANCER
-            else:
-                return ScreeningTestResult.NEGATIVE
+    def get_results(self, cancer_states: np.array, unique_ids: np.array = None) -> np.array:
+        """ Return the screening test result of many women at once, given each woman's cancer state. See `get_result`
+        for the properties of the test. The women's positions (`unique_ids`) are required when simulating replications.
+        """
+        cancer_states = np.asarray(cancer_states)
+        if (cancer_states == CancerState.DEAD).any():
+            raise ValueError("Cannot screen a woman who has died of cancer.")
 
+        randoms = draw_randoms(self.rng, len(cancer_states), unique_ids)
+        detectable = np.isin(cancer_states, [CancerState.REGIONAL, CancerState.DISTANT])
+        cancer = np.where(detectable, randoms < self.params.sensitivity, randoms > self.params.specificity)
+        return np.where(cancer, ScreeningTestResult.CANCER, ScreeningTestResult.NEGATIVE).astype(np.int8)
 
-def is_due_for_screening(model, unique_id):
-    """ Return True if the woman is due for a screening test based on her current screening state,
-        her screening history, and the screening interval guidelines.
+
+def due_for_screening(model, unique_ids: np.array) -> np.array:
+    """ Return a boolean array that is True for each woman that is due for a screening test based on her current
+        screening state, her screening history, and the screening interval guidelines.
 
     Requirements:
     - Women who have been diagnosed with cancer are no longer screened.
@@ -176,39 +172,89 @@ def is_due_for_screening(model, unique_id):
     - Women with HIV have a different screening interval.
         This interval will be used in place of her state-based interval if the HIV-specific interval is shorter.
     """
+    params = model.params.screening
+    states = model.screening_state.values[unique_ids]
+    intervals = screening_intervals(model, unique_ids)
 
-    if model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED:
-        return False
+    # Women who have never been screened are due
+    last_screen_ages = last_screen_age(model, unique_ids)
+    due = np.isnan(last_screen_ages) | (model.age - last_screen_ages >= intervals)
+
+    outside_ages = model.age < params.age_routine_start or model.age > params.age_routine_end
+    if outside_ages:
+        due &= states != ScreeningState.ROUTINE
+    due &= model.cancer_detection.values[unique_ids] != CancerDetectionState.DETECTED
+    return due
+
+
+def next_screening_age(model, unique_ids: np.array, earliest_age: int) -> np.array:
+    """ Return the age at which each woman will next be due for a screening test (and compliant with it), if nothing
+    about her changes. Women who will not be screened have an age of infinity. Ages are never before `earliest_age`.
+    See `due_for_screening` for the requirements.
+    """
+    params = model.params.screening
+    states = model.screening_state.values[unique_ids]
+    last_screen_ages = last_screen_age(model, unique_ids)
+    due_ages = np.ceil(last_screen_ages + screening_intervals(model, unique_ids))
+    due_ages[np.isnan(last_screen_ages)] = earliest_age
+    due_ages = np.maximum(due_ages, earliest_age)
+
+    routine = states == ScreeningState.ROUTINE
+    due_ages[routine] = np.maximum(due_ages[routine], params.age_routine_start)
+    due_ages[routine & (due_ages > params.age_routine_end)] = np.inf
+    due_ages[model.cancer_detection.values[unique_ids] == CancerDetectionState.DETECTED] = np.inf
+    due_ages[~compliant_with_screening(model, unique_ids)] = np.inf
+    return due_ages
+
+
+def screening_intervals(model, unique_ids: np.array) -> np.array:
+    """ Return the number of years between screenings for each woman, based on her screening state and whether her
+    HIV has been detected
+    """
+    params = model.params.screening
+    states = model.screening_state.values[unique_ids]
+    if not np.isin(states, list(ScreeningState)).all():
+        unexpected = states[~np.isin(states, list(ScreeningState))][0]
+        raise NotImplementedError(f"Unexpected screening state: {unexpected}")
+
+    intervals = np.zeros(max(ScreeningState) + 1)
+    intervals[ScreeningState.ROUTINE] = params.interval_routine
+    intervals[ScreeningState.RE_TEST] = params.interval_re_test
+    intervals[ScreeningState.SURVEILLANCE] = params.interval_surveillance
+    intervals = intervals[states]
+    hiv_detected = model.hiv_detected[unique_ids]
+    intervals[hiv_detected] = np.minimum(intervals[hiv_detected], params.interval_hiv)
+    return intervals
+
+
+def compliant_with_screening(model, unique_ids: np.array) -> np.array:
+    """ Return a boolean array that is True for each woman that is compliant with her current screening state
+    """
+    states = model.screening_state.values[unique_ids]
+    compliant = np.ones(len(states), dtype=bool)
+    routine = states == ScreeningState.ROUTINE
+    compliant[routine] = model.compliant_routine_state.values[unique_ids][routine]
+    surveillance = states == ScreeningState.SURVEILLANCE
+    compliant[surveillance] = model.compliant_surveillance_state.values[unique_ids][surveillance]
+    return compliant
 
-    t1 = model.age < model.params.screening.age_routine_start
-    t2 = model.age > model.params.screening.age_routine_end
-    if model.screening_state.values[unique_id] == ScreeningState.ROUTINE and (t1 or t2):
-        return False
 
-    if model.screening_state.values[unique_id] == ScreeningState.ROUTINE:
-        interval = model.params.screening.interval_routine
-    elif model.screening_state.values[unique_id] == ScreeningState.RE_TEST:
-        interval = model.params.screening.interval_re_test
-    elif model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-        interval = model.params.screening.interval_surveillance
-    else:
-        raise NotImplementedError(f"Unexpected screening state: {model.screening_state.values[unique_id]}")
+def last_screen_age(model, unique_ids: np.array) -> np.array:
+    """ Return the age of each woman's last screening, or NaN if she has never been screened
+    """
+    ages = model.agent_store.last_screen_age[unique_ids].astype(float)
+    ages[ages == NEVER] = np.nan
+    return ages
+
 
-    if unique_id in model.hiv_detected:
-        interval = min(interval, model.params.screening.interval_hiv)
-    if unique_id not in model.dicts.last_screen_age:
-        return True
-    if model.age - model.dicts.last_screen_age.get(unique_id, 0) >= interval:
-        return True
-    return False
+def is_due_for_screening(model, unique_id):
+    """ Return True if the woman is due for a screening test. See `due_for_screening`.
+    """
+    return bool(due_for_screening(model, np.array([unique_id]))[0])
 
 
 def is_compliant_with_screening(model, unique_id):
-    if model.screening_state.values[unique_id] == ScreeningState.ROUTINE:
-        return model.compliant_routine_state.values[unique_id]
-    elif model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-        return model.compliant_surveillance_state.values[unique_id]
-    return True
+    return bool(compliant_with_screening(model, np.array([unique_id]))[0])
 
 
 class ScreeningProtocol:
@@ -220,15 +266,108 @@ class ScreeningProtocol:
         dna_screening_test: DnaScreeningTest,
         cancer_inspection_screening_test: CancerInspectionScreeningTest,
     ):
+        """ A screening protocol screens every woman that is due and compliant at each yearly update. Each step of a
+        protocol is applied to all women that reach it at once, using boolean masks to route women through the
+        protocol's branches.
+        """
         self.params = params
         self.dna_screening_test = dna_screening_test
         self.via_screening_test = via_screening_test
         self.cancer_inspection_screening_test = cancer_inspection_screening_test
         self.model = model
 
-    def apply(self):
+    def apply(self, unique_id=None):
+        """ Screen the women who are due (or the given woman, if she is due), and schedule their next screening
+        """
+        unique_ids = self.screened_agents(unique_id)
+        self.screen(unique_ids)
+        self.model.screening_calendar.schedule(unique_ids)
+
+    def screen(self, unique_ids: np.array):
         raise NotImplementedError("Must implement this method in a subclass")
 
+    def screened_agents(self, unique_id=None) -> np.array:
+        """ Return the women who are due and compliant, and record their screening age. By default, only the women
+        scheduled for this year in the screening calendar are checked.
+        """
+        if unique_id is None:
+            unique_ids = self.model.screening_calendar.due()
+        else:
+            unique_ids = np.atleast_1d(unique_id)
+        unique_ids = unique_ids[due_for_screening(self.model, unique_ids)]
+        unique_ids = unique_ids[compliant_with_screening(self.model, unique_ids)]
+        self.model.agent_store.last_screen_age[unique_ids] = self.model.age
+        return unique_ids
+
+    def record_tests(self, unique_ids: np.array, screening_event: Event, surveillance_event: Event, cost: float):
+        """ Record a test for each woman. Women in the SURVEILLANCE state have a surveillance test.
+        """
+        surveillance = self.model.screening_state.values[unique_ids] == ScreeningState.SURVEILLANCE
+        events = np.where(surveillance, surveillance_event.value, screening_event.value)
+        self.model.events.record_events(self.model.time, self.model.unique_ids[unique_ids], events, cost)
+
+    def treat_and_detect(self, to_treat: np.array, to_detect: np.array):
+        """ Treat CIN or detect cancer. Both groups of women move to the SURVEILLANCE state.
+        """
+        self.model.treat_cin_many(to_treat)
+        self.model.detect_cancer(to_detect)
+        self.model.screening_state.values[to_treat] = ScreeningState.SURVEILLANCE
+        self.model.screening_state.values[to_detect] = ScreeningState.SURVEILLANCE
+
+    def apply_via(self, unique_ids: np.array, negative_state: ScreeningState):
+        """ Give each woman a VIA test. Negative results move to `negative_state`, positive results are treated, and
+        cancer results are detected.
+        """
+        self.record_tests(unique_ids, Event.SCREENING_VIA, Event.SURVEILLANCE_VIA, self.params.via.cost)
+        results = self.get_via_results(unique_ids)
+        check_results(results, [ScreeningTestResult.NEGATIVE, ScreeningTestResult.POSITIVE, ScreeningTestResult.CANCER])
+
+        self.model.screening_state.values[unique_ids[results == ScreeningTestResult.NEGATIVE]] = negative_state
+        self.treat_and_detect(
+            unique_ids[results == ScreeningTestResult.POSITIVE], unique_ids[results == ScreeningTestResult.CANCER]
+        )
+
+    def apply_cancer_inspection(self, unique_ids: np.array):
+        """ Give each woman a cancer inspection. Negative results are treated, and cancer results are detected.
+        """
+        self.record_tests(
+            unique_ids,
+            Event.SCREENING_CANCER_INSPECTION,
+            Event.SURVEILLANCE_CANCER_INSPECTION,
+            self.params.cancer_inspection.cost,
+        )
+        results = self.get_cancer_inspection_results(unique_ids)
+        check_results(results, [ScreeningTestResult.NEGATIVE, ScreeningTestResult.CANCER])
+
+        self.treat_and_detect(
+            unique_ids[results == ScreeningTestResult.NEGATIVE], unique_ids[results == ScreeningTestResult.CANCER]
+        )
+
+    def apply_dna(self, unique_ids: np.array) -> tuple:
+        """ Give each woman a DNA test. Women with negative results for every strain return to the ROUTINE state.
+        Return the women with a positive result, and whether each was positive for strain 16 or 18.
+        """
+        self.record_tests(unique_ids, Event.SCREENING_DNA, Event.SURVEILLANCE_DNA, self.params.dna.cost)
+        results = self.get_dna_results(unique_ids)
+
+        negative = (results == ScreeningTestResult.NEGATIVE).all(axis=1)
+        self.model.screening_state.values[unique_ids[negative]] = ScreeningState.ROUTINE
+        positive_16_18 = results[:, [HpvStrain.SIXTEEN - 1, HpvStrain.EIGHTEEN - 1]] == ScreeningTestResult.POSITIVE
+        return unique_ids[~negative], positive_16_18[~negative].any(axis=1)
+
+    def get_via_results(self, unique_ids: np.array) -> np.array:
+        return self.via_screening_test.get_results(
+            self.model.max_hpv_state.values[unique_ids], self.model.cancer.values[unique_ids], unique_ids
+        )
+
+    def get_dna_results(self, unique_ids: np.array) -> np.array:
+        """ Return a (women, strain) matrix of results, with one column per strain in `HpvStrain` order
+        """
+        return self.dna_screening_test.get_results(self.model.hpv.values[:, unique_ids].T, unique_ids)
+
+    def get_cancer_inspection_results(self, unique_ids: np.array) -> np.array:
+        return self.cancer_inspection_screening_test.get_results(self.model.cancer.values[unique_ids], unique_ids)
+
     def get_via_result(self, unique_id):
         return self.via_screening_test.get_result(
             true_hpv_state=self.model.max_hpv_state.values[unique_id],
@@ -244,6 +383,12 @@ class ScreeningProtocol:
         return self.cancer_inspection_screening_test.get_result(true_cancer_state=self.model.cancer.values[unique_id],)
 
 
+def check_results(results: np.array, expected: list):
+    unexpected = ~np.isin(results, expected)
+    if unexpected.any():
+        raise NotImplementedError(f"Unexpected screening test result: {ScreeningTestResult(results[unexpected][0])}")
+
+
 class NoScreeningProtocol(ScreeningProtocol):
     def __init__(self, *args, **kwargs):
         pass
@@ -256,195 +401,30 @@ class NoScreeningProtocol(ScreeningProtocol):
 
 
 class ViaScreeningProtocol(ScreeningProtocol):
-    def apply(self, unique_id=None):
-        unique_ids = [unique_id]
-        if unique_id is None:
-            unique_ids = self.model.unique_ids[self.model.life.living]
-        for unique_id in unique_ids:
-            if not is_due_for_screening(self.model, unique_id):
-                continue
-            if not is_compliant_with_screening(self.model, unique_id):
-                continue
-            self.model.dicts.last_screen_age[unique_id] = self.model.age
-
-            if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                event = Event.SURVEILLANCE_VIA
-            else:
-                event = Event.SCREENING_VIA
-
-            self.model.events.record_event((self.model.time, unique_id, event.value, self.params.via.cost))
-
-            result = self.get_via_result(unique_id)
-
-            if result == ScreeningTestResult.NEGATIVE:
-                self.model.screening_state.values[unique_id] = ScreeningState.ROUTINE
-            elif result == ScreeningTestResult.POSITIVE:
-                self.model.treat_cin(unique_id)
-                self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-            elif result == ScreeningTestResult.CANCER:
-                self.model.detect_cancer(unique_id)
-                self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-            else:
-                raise NotImplementedError(f"Unexpected screening test result: {result}")
+    def screen(self, unique_ids: np.array):
+        self.apply_via(unique_ids, negative_state=ScreeningState.ROUTINE)
 
 
 class DnaThenTreatmentScreeningProtocol(ScreeningProtocol):
-    def apply(self, unique_id=None):
-        unique_ids = [unique_id]
-        if unique_id is None:
-            unique_ids = self.model.unique_ids[self.model.life.living]
-        for unique_id in unique_ids:
-            if not is_due_for_screening(self.model, unique_id):
-                continue
-            if not is_compliant_with_screening(self.model, unique_id):
-                continue
-
-            self.model.dicts.last_screen_age[unique_id] = self.model.age
-
-            if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                event = Event.SURVEILLANCE_DNA
-            else:
-                event = Event.SCREENING_DNA
-            self.model.events.record_event((self.model.time, unique_id, event.value, self.params.dna.cost))
-
-            result = self.get_dna_result(unique_id)
-
-            if all(result[strain] == ScreeningTestResult.NEGATIVE for strain in HpvStrain):
-                self.model.screening_state.values[unique_id] = ScreeningState.ROUTINE
-            else:
-                if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                    event2 = Event.SURVEILLANCE_CANCER_INSPECTION
-                else:
-                    event2 = Event.SCREENING_CANCER_INSPECTION
-
-                self.model.events.record_event(
-                    (self.model.time, unique_id, event2.value, self.params.cancer_inspection.cost)
-                )
-
-                result = self.get_cancer_inspection_result(unique_id)
-
-                if result == ScreeningTestResult.NEGATIVE:
-                    self.model.treat_cin(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                elif result == ScreeningTestResult.CANCER:
-                    self.model.detect_cancer(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                else:
-                    raise NotImplementedError(f"Unexpected screening test result: {result}")
+    def screen(self, unique_ids: np.array):
+        positive, _ = self.apply_dna(unique_ids)
+        self.apply_cancer_inspection(positive)
 
 
 class DnaThenViaScreeningProtocol(ScreeningProtocol):
-    def apply(self, unique_id=None):
-        unique_ids = [unique_id]
-        if unique_id is None:
-            unique_ids = self.model.unique_ids[self.model.life.living]
-
-        for unique_id in unique_ids:
-            if not is_due_for_screening(self.model, unique_id):
-                continue
-            if not is_compliant_with_screening(self.model, unique_id):
-                continue
-
-            self.model.dicts.last_screen_age[unique_id] = self.model.age
-
-            if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                event = Event.SURVEILLANCE_DNA
-            else:
-                event = Event.SCREENING_DNA
-
-            self.model.events.record_event((self.model.time, unique_id, event.value, self.params.dna.cost))
-            result = self.get_dna_result(unique_id)
-
-            stp_pos = ScreeningTestResult.POSITIVE
-            if all(result[strain] == ScreeningTestResult.NEGATIVE for strain in HpvStrain):
-                self.model.screening_state.values[unique_id] = ScreeningState.ROUTINE
-            elif (result[HpvStrain.SIXTEEN] == stp_pos) or (result[HpvStrain.EIGHTEEN] == stp_pos):
-
-                if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                    event2 = Event.SURVEILLANCE_CANCER_INSPECTION
-                else:
-                    event2 = Event.SCREENING_CANCER_INSPECTION
-
-                self.model.events.record_event(
-                    (self.model.time, unique_id, event2.value, self.params.cancer_inspection.cost)
-                )
-                result = self.get_cancer_inspection_result(unique_id)
-
-                if result == ScreeningTestResult.NEGATIVE:
-                    self.model.treat_cin(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                elif result == ScreeningTestResult.CANCER:
-                    self.model.detect_cancer(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                else:
-                    raise NotImplementedError(f"Unexpected screening test result: {result}")
-            else:
-                if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                    event2 = Event.SURVEILLANCE_VIA
-                else:
-                    event2 = Event.SCREENING_VIA
-
-                self.model.events.record_event((self.model.time, unique_id, event2.value, self.params.via.cost))
-                result = self.get_via_result(unique_id)
-
-                if result == ScreeningTestResult.NEGATIVE:
-                    self.model.screening_state.values[unique_id] = ScreeningState.RE_TEST
-                elif result == ScreeningTestResult.POSITIVE:
-                    self.model.treat_cin(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                elif result == ScreeningTestResult.CANCER:
-                    self.model.detect_cancer(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                else:
-                    raise NotImplementedError(f"Unexpected screening test result: {result}")
+    def screen(self, unique_ids: np.array):
+        positive, positive_16_18 = self.apply_dna(unique_ids)
+        # ----- Strains 16 and 18 are inspected for cancer. Other strains are triaged with VIA.
+        self.apply_cancer_inspection(positive[positive_16_18])
+        self.apply_via(positive[~positive_16_18], negative_state=ScreeningState.RE_TEST)
 
 
 class DnaThenTriageScreeningProtocol(ScreeningProtocol):
-    def apply(self, unique_id=None):
-        unique_ids = [unique_id]
-        if unique_id is None:
-            unique_ids = self.model.unique_ids[self.model.life.living]
-
-        for unique_id in unique_ids:
-            if not is_due_for_screening(self.model, unique_id):
-                continue
-            if not is_compliant_with_screening(self.model, unique_id):
-                continue
-
-            self.model.dicts.last_screen_age[unique_id] = self.model.age
-
-            if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                event = Event.SURVEILLANCE_DNA
-            else:
-                event = Event.SCREENING_DNA
-
-            self.model.events.record_event((self.model.time, unique_id, event.value, self.params.dna.cost))
-            result = self.get_dna_result(unique_id)
-
-            stp_pos = ScreeningTestResult.POSITIVE
-            if all(result[strain] == ScreeningTestResult.NEGATIVE for strain in HpvStrain):
-                self.model.screening_state.values[unique_id] = ScreeningState.ROUTINE
-            elif (result[HpvStrain.SIXTEEN] == stp_pos) or (result[HpvStrain.EIGHTEEN] == stp_pos):
-
-                if self.model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE:
-                    event2 = Event.SURVEILLANCE_CANCER_INSPECTION
-                else:
-                    event2 = Event.SCREENING_CANCER_INSPECTION
-                self.model.events.record_event(
-                    (self.model.time, unique_id, event2.value, self.params.cancer_inspection.cost)
-                )
-                result = self.get_cancer_inspection_result(unique_id)
-
-                if result == ScreeningTestResult.NEGATIVE:
-                    self.model.treat_cin(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                elif result == ScreeningTestResult.CANCER:
-                    self.model.detect_cancer(unique_id)
-                    self.model.screening_state.values[unique_id] = ScreeningState.SURVEILLANCE
-                else:
-                    raise NotImplementedError(f"Unexpected screening test result: {result}")
-            else:
-                self.model.screening_state.values[unique_id] = ScreeningState.RE_TEST
+    def screen(self, unique_ids: np.array):
+        positive, positive_16_18 = self.apply_dna(unique_ids)
+        # ----- Strains 16 and 18 are inspected for cancer. Other strains are re-tested.
+        self.apply_cancer_inspection(positive[positive_16_18])
+        self.model.screening_state.values[positive[~positive_16_18]] = ScreeningState.RE_TEST
 
 
 protocols = {
@@ -0,0 +1,87 @@
+import numpy as np
+
+from model.screening import due_for_screening, next_screening_age
+from model.state import LifeState
+
+
+class ScreeningCalendar:
+    def __init__(self, model):
+        """ Keep each woman's next screening age in a calendar, so that each yearly update only visits the women who are
+        due that year, instead of checking every living woman.
+            - `self.calendar` maps an age to the arrays of women due to be screened at that age
+            - `self.due_age` holds each woman's scheduled age (-1 if she is not scheduled). Entries in the calendar that
+              no longer match `self.due_age` were rescheduled and are skipped.
+            - Women must be rescheduled when they are screened, when their screening state changes, and when their HIV
+              is detected. Women who are not compliant with their screening state are not scheduled.
+            - The calendar is built from the whole population at the first screening. It must be reset if the agent
+              arrays or the screening parameters are changed directly. Compaction moves it with `compact`.
+        """
+        self.model = model
+        self.calendar = dict()
+        self.due_age = None
+        # The first age whose women have not yet been screened
+        self.start = None
+
+    def reset(self):
+        """ Forget every scheduled screening. The calendar is rebuilt at the next screening.
+        """
+        self.calendar = dict()
+        self.due_age = None
+        self.start = None
+
+    def compact(self, keep: np.array):
+        """ Called when the agent arrays keep only the agents at the positions `keep`. Scheduled women are moved to
+        their new positions, and the women who were removed are dropped.
+        """
+        if self.due_age is None:
+            return
+        positions = np.full(len(self.due_age), -1, dtype=np.int64)
+        positions[keep] = np.arange(len(keep))
+        self.due_age = self.due_age[keep]
+        for age, bucket in self.calendar.items():
+            groups = [positions[group] for group in bucket]
+            self.calendar[age] = [group[group >= 0] for group in groups]
+
+    def build(self):
+        self.calendar = dict()
+        self.due_age = np.full(len(self.model.unique_ids), -1, dtype=np.int16)
+        self.start = self.model.age
+        self.schedule(self.model.active_sets.alive)
+
+    def schedule(self, unique_ids: np.array):
+        """ Find the age of each woman's next screening, starting from the next age that has not been screened
+        """
+        if self.due_age is None:
+            return
+        unique_ids = np.atleast_1d(unique_ids)
+        self.due_age[unique_ids] = -1
+        if len(unique_ids) == 0:
+            return
+
+        due = next_screening_age(self.model, unique_ids, earliest_age=self.start)
+        scheduled = np.isfinite(due)
+        unique_ids = unique_ids[scheduled]
+        due = due[scheduled].astype(np.int16)
+        self.due_age[unique_ids] = due
+
+        order = np.argsort(due, kind="stable")
+        ages, starts = np.unique(due[order], return_index=True)
+        for age, group in zip(ages, np.split(unique_ids[order], starts[1:])):
+            self.calendar.setdefault(int(age), []).append(group)
+
+    def due(self) -> np.array:
+        """ Return the living women that are due to be screened at the current age
+        """
+        if self.due_age is None:
+            self.build()
+        age = self.model.age
+        self.start = age + 1
+        bucket = self.calendar.pop(age, [])
+        if len(bucket) == 0:
+            return self.model.active_sets.alive[:0]
+        unique_ids = np.unique(np.concatenate(bucket))
+        unique_ids = unique_ids[self.due_age[unique_ids] == age]
+        self.due_age[unique_ids] = -1
+        # Women who have died or whose cancer was detected since being scheduled are no longer due
+        unique_ids = unique_ids[self.model.life.values[unique_ids] == LifeState.ALIVE]
+        return unique_ids[due_for_screening(self.model, unique_ids)]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from pathlib import Path
+
+from model.metrics import last_step_of_age, state_fields
+
+
+class StateSnapshots:
+    def __init__(self, model):
+        """ Keep every agent's state at each age as one int8 panel of shape (ages, agents) per field
+            - The fields are those of `Analysis`: HIV, cancer, cancer detection, life, and each HPV strain
+            - As in `Analysis`, an age's row holds the states after the last time step of that age
+            - Each replication's panels are saved as `snapshots/<field>.npy` in its output directory, and can be
+              loaded with `np.load(path, mmap_mode="r")`
+        """
+        self.model = model
+        params = model.params
+        self.fields = state_fields(model)
+        ages = int(params.num_steps / params.steps_per_year + 1)
+        self.panels = {field: np.zeros((ages, model.num_agents), dtype=np.int8) for field in self.fields}
+        # --- The last known states of every agent (by unique id), including those removed by compaction
+        self.latest = {field: np.zeros(model.num_agents, dtype=np.int8) for field in self.fields}
+        self.taken = np.zeros(ages, dtype=bool)
+
+    def update(self):
+        """ Called after each step. Once the last step of an age is done, take that age's snapshot.
+        """
+        position = last_step_of_age(self.model)
+        if position is not None and position < len(self.taken):
+            self.take(position)
+
+    def take(self, position: int):
+        unique_ids = self.model.unique_ids
+        for field, (_, values) in self.fields.items():
+            self.latest[field][unique_ids] = values()
+            self.panels[field][position] = self.latest[field]
+        self.taken[position] = True
+
+    def remove(self, positions: np.array):
+        """ Called before compaction removes the agents at the given positions. Dead agents keep their last states.
+        """
+        unique_ids = self.model.unique_ids[positions]
+        for field, (_, values) in self.fields.items():
+            self.latest[field][unique_ids] = values()[positions]
+
+    def save(self, directories: list, num_agents: int):
+        """ Write each replication's panels. Ages that were not reached keep the states of the last age that was.
+        """
+        positions = np.arange(len(self.taken))
+        filled = np.maximum.accumulate(np.where(self.taken, positions, 0))
+        for replication, directory in enumerate(directories):
+            snapshot_dir = Path(directory).joinpath("snapshots")
+            snapshot_dir.mkdir(exist_ok=True)
+            agents = slice(replication * num_agents, (replication + 1) * num_agents)
+            for field, panel in self.panels.items():
+                np.save(snapshot_dir.joinpath(f"{field}.npy"), panel[filled, agents])
@@ -1,16 +1,32 @@
 import numpy as np
 
-from typing import List
 from enum import IntEnum, Enum, unique, auto
 
+from model.misc_functions import binomial_selections
+from model.random_streams import agent_random, by_replication
+from model.transition_table import PackedLookup, TransitionTable
+
 
 class EventState:
+    # The key field of the probability table that holds age (None if the probabilities don't depend on age)
+    age_axis = None
+
     def __init__(
-        self, enum: IntEnum, transition_dict: dict,
+        self, enum: IntEnum, transition_dict: TransitionTable,
     ):
         # --- inputs
         self.enum = enum
         self.transition_dict = transition_dict
+        # The table holding each agent's probability of a transition. Subclasses may replace this.
+        self.probability_table = transition_dict
+        self.packed_lookup = None
+        # The random stream of this state. Subclasses set this from `model.streams`.
+        self.rng = None
+        # Set when transitions are sampled with waiting times
+        self.waiting_times = None
+        # Set when transitions are sampled by probability class
+        self.class_lookup = None
+        self.class_codes = None
         # --- numpy arrays
         self.values = None
         self.probabilities = None
@@ -22,15 +38,81 @@ class EventState:
         self.values = np.zeros(count, dtype=dtype)
         self.values.fill(state.value)
 
-    def find_probabilities(self, keys: List[tuple]) -> np.array:
-        """ Given a set of keys, create a list of probabilities
+    def find_probabilities(self, *fields) -> np.array:
+        """ Given the key fields (scalars or one array per field), look up the probabilities
+        """
+        return self.probability_table.gather(*fields)
+
+    def probability_key(self, unique_ids) -> tuple:
+        """ Return the key fields of `self.probability_table` for the given agents
+        """
+        raise NotImplementedError("Must implement this method in a subclass")
+
+    def eligible_agents(self) -> np.array:
+        """ Return the sorted indices of agents that can make a transition
+        """
+        raise NotImplementedError("Must implement this method in a subclass")
+
+    def select_agents(self, unique_ids) -> np.array:
+        """ Given the agents eligible to transition, return those who transition at this step
+            - Bernoulli: draw a random number for each agent
+            - Waiting time: return the agents whose scheduled transition is at this step
+            - Binomial: group agents by probability class and draw the number selected from each class
+        """
+        if self.waiting_times is not None:
+            return self.waiting_times.due(unique_ids)
+        if self.class_lookup is not None:
+            probabilities = self.class_lookup.age_values(self.model.age)
+            return by_replication(
+                self.rng, unique_ids, lambda rng, ids: ids[binomial_selections(rng, self.class_codes[ids], probabilities)]
+            )
+        probabilities = self.current_probabilities(unique_ids)
+        return unique_ids[probabilities > agent_random(self.rng, unique_ids)]
+
+    def update_sampling(self):
+        """ Prepare for sampling at the start of a year: find every agent's probability class, and schedule the
+        next transition of every eligible agent
         """
+        if self.class_lookup is not None:
+            codes = self.class_lookup.classes(*self.probability_key(slice(None)))[0]
+            self.class_codes = np.broadcast_to(codes, self.values.shape).astype(self.class_lookup.dtype)
+        self.schedule(self.eligible_agents())
 
-        # Return the probabilities
-        probabilities = np.zeros(len(keys))
-        for i in range(len(keys)):
-            probabilities[i] = self.transition_dict[keys[i]]
-        return probabilities
+    def schedule(self, unique_ids):
+        """ Draw the next transition time of the given agents. Only required when sampling with waiting times.
+        """
+        if self.waiting_times is not None and np.size(unique_ids) > 0:
+            self.waiting_times.schedule(unique_ids, self.current_probabilities(unique_ids))
+
+    def make_packed_lookup(self) -> PackedLookup:
+        return PackedLookup(self.probability_table, age_axis=self.age_axis)
+
+    def current_probabilities(self, unique_ids) -> np.array:
+        """ Return the transition probabilities of the given agents.
+            - Cached: read the agents' entries in `self.probabilities`
+            - Packed: pack the agents' current states and look them up in the per-age table
+        """
+        if self.packed_lookup is not None:
+            probabilities = self.packed_lookup.lookup(*self.probability_key(unique_ids))
+            return np.broadcast_to(probabilities, np.shape(unique_ids))
+        return self.probabilities[unique_ids]
+
+    def update_probabilities(self):
+        """ Look up every agent's transition probability. Not required when using a packed lookup.
+        """
+        if self.packed_lookup is None:
+            self.probabilities = self.find_probabilities(*self.probability_key(slice(None)))
+
+    def refresh_probabilities(self, unique_ids):
+        """ Look up the transition probabilities of agents whose state has changed, and reschedule their next
+        transition. Looking up is not required when using a packed lookup, as probabilities are always found from the
+        agents' current states.
+        """
+        if self.packed_lookup is None:
+            self.probabilities[unique_ids] = self.find_probabilities(*self.probability_key(unique_ids))
+        if self.class_lookup is not None:
+            self.class_codes[unique_ids] = self.class_lookup.classes(*self.probability_key(unique_ids))[0]
+        self.schedule(unique_ids)
 
 
 class GenericState(IntEnum):
@@ -1,5 +1,7 @@
+import shutil
 from pathlib import Path
 import pytest
+import yaml
 
 from model.logger import LoggerFactory
 from model.cervical_model import CervicalModel
@@ -25,3 +27,38 @@ def model_vaccination():
     model = CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger())
     model_vaccination = model
     return model_vaccination
+
+
+@pytest.fixture(scope="function")
+def scenario_copy(tmp_path):
+    """ Return a function that copies a Zambia scenario into the test's temporary directory, so that its output is
+    not written to the experiments. See `copy_scenario`.
+    """
+
+    def scenario_copy(name: str, **params) -> Path:
+        return copy_scenario(tmp_path, name, **params)
+
+    return scenario_copy
+
+
+def copy_scenario(directory: Path, name: str, **params) -> Path:
+    """ Copy a Zambia scenario's transition dictionaries and parameters into `directory`, overriding the given
+    parameters. A dictionary updates the section of the parameters it names instead of replacing it.
+    """
+    source = Path("experiments/zambia").joinpath(name)
+    scenario_dir = Path(directory).joinpath(name)
+    shutil.copytree(source.joinpath("transition_dictionaries"), scenario_dir.joinpath("transition_dictionaries"))
+    with source.joinpath("parameters.yml").open() as f:
+        values = yaml.safe_load(f) or dict()
+    update_parameters(values, params)
+    with scenario_dir.joinpath("parameters.yml").open("w") as f:
+        yaml.dump(values, f)
+    return scenario_dir
+
+
+def update_parameters(values: dict, params: dict):
+    for key, value in params.items():
+        if isinstance(value, dict) and isinstance(values.get(key), dict):
+            update_parameters(values[key], value)
+        else:
+            values[key] = value
@@ -0,0 +1,27 @@
+import numpy as np
+
+from model.active_sets import add_indices, remove_indices
+from model.tests.fixtures import model_screening
+
+
+def test_add_and_remove_indices():
+    array = np.array([1, 3, 5, 7])
+    assert np.array_equal(remove_indices(array, np.array([3, 4, 7])), [1, 5])
+    assert np.array_equal(add_indices(array, np.array([0, 5, 6])), [0, 1, 3, 5, 6, 7])
+
+
+def test_incremental_sets(model_screening):
+    # ----- Sets updated from transitions should match sets rebuilt from the state arrays
+    model_screening.age = 50
+    for _ in range(36):
+        model_screening.step()
+    active_sets = model_screening.active_sets
+    assert len(active_sets.alive) < len(model_screening.unique_ids)
+    names = ["alive", "cancer_free", "undetected_cancer", "hiv_negative"]
+    incremental = {name: getattr(active_sets, name) for name in names}
+    active_sets.rebuild()
+    for name in names:
+        assert np.array_equal(incremental[name], getattr(active_sets, name))
+
+
+__all__ = ["model_screening"]
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from model.cervical_model import CervicalModel
+from model.event import Event
+from model.logger import LoggerFactory
+from model.tests.fixtures import copy_scenario
+from src.analyze import analyze
+
+
+def run_scenario(directory: Path, level: str) -> Path:
+    """ Run a small copy of the vaccination scenario with the given output level, and analyze it """
+    scenario_dir = copy_scenario(
+        directory,
+        "scenario_vaccination",
+        num_agents=3000,
+        num_steps=45 * 12,
+        initial_age=15,
+        output={"level": level},
+        vaccination={"schedule": {15: 0.8, 20: 0.3}},
+    )
+    CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger()).run()
+    analyze(scenario_dir, 0)
+    return scenario_dir.joinpath("iteration_0")
+
+
+def test_analyze_first_passage(tmp_path):
+    # ----- Analyzing the first passage times gives the results of analyzing every state change and event
+    full = run_scenario(tmp_path.joinpath("full"), "full")
+    first_passage = run_scenario(tmp_path.joinpath("first_passage"), "first_passage")
+    results = pd.read_csv(full.joinpath("results.csv"))
+    results_first_passage = pd.read_csv(first_passage.joinpath("results.csv"))
+    assert results["cost_vaccination"].iloc[0] > 0
+    pd.testing.assert_frame_equal(results_first_passage, results)
+
+    # ----- Vaccination is kept with the states
+    times = pd.read_parquet(first_passage.joinpath("first_passage.parquet"))
+    events = pd.read_parquet(full.joinpath("events.parquet"))
+    vaccinations = events[events["Event"] == Event.VACCINATION.value].groupby("Unique_ID")["Time"].min()
+    assert (times["vaccinated"] >= 0).sum() == len(vaccinations)
+    assert np.array_equal(times.loc[vaccinations.index, "vaccinated"], vaccinations)
@@ -0,0 +1,38 @@
+import numpy as np
+
+from model.tests.fixtures import model_screening
+from model.state import CancerState, TimeSinceCancerDetectionState
+
+
+def test_cancer_step(model_screening):
+    cancer = model_screening.cancer
+    table = cancer.transition_dict.data.copy()
+
+    # ----- LOCAL cancer can only progress to REGIONAL
+    cancer.values.fill(CancerState.LOCAL)
+    model_screening.active_sets.rebuild()
+    cancer.probabilities.fill(1)
+    cancer.step()
+    assert all(cancer.values == CancerState.REGIONAL)
+    # --- Linked probabilities should be updated
+    detection = model_screening.cancer_detection
+    assert all(detection.probabilities == detection.transition_dict[CancerState.REGIONAL])
+
+    # ----- The shared transition table should not be changed by a step
+    assert np.array_equal(cancer.transition_dict.data, table)
+
+
+def test_time_since_detection(model_screening):
+    store = model_screening.agent_store
+    model_screening.time = 6 * model_screening.params.steps_per_year
+    store.detection_time[:2] = [0, model_screening.time - 1]
+    store.time_since_detection[:2] = TimeSinceCancerDetectionState.WITHIN_5_YEARS
+
+    # ----- Only agents detected more than five years ago move to BEYOND_5_YEARS
+    model_screening.cancer.step()
+    assert store.time_since_detection[0] == TimeSinceCancerDetectionState.BEYOND_5_YEARS
+    assert store.time_since_detection[1] == TimeSinceCancerDetectionState.WITHIN_5_YEARS
+    assert store.time_since_detection[2] == TimeSinceCancerDetectionState.UNDETECTED
+
+
+__all__ = ["model_screening"]
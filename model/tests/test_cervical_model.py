@@ -0,0 +1,201 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from model.cervical_model import CervicalModel
+from model.logger import LoggerFactory
+from model.state import HpvImmunity, HpvState, HpvStrain, LifeState
+from model.tests.fixtures import model_screening, scenario_copy
+from model.treatment import CinTreatmentMethodFactory
+
+
+def run_model(compact_agents: bool) -> CervicalModel:
+    model = CervicalModel(Path("experiments/zambia/scenario_screening/"), 0, logger=LoggerFactory().create_logger())
+    model.params.compact_agents = compact_agents
+    model.age = 70
+    for _ in range(3 * model.params.steps_per_year + 1):
+        model.step()
+    return model
+
+
+def test_compact_agents():
+    # ----- Compaction removes dead agents but should not change the simulation
+    model = run_model(compact_agents=False)
+    compacted = run_model(compact_agents=True)
+    assert len(compacted.unique_ids) < len(model.unique_ids)
+    assert np.array_equal(compacted.cancer.values, model.cancer.values[compacted.unique_ids])
+    assert compacted.state_changes.make_events().equals(model.state_changes.make_events())
+    assert compacted.events.make_events().equals(model.events.make_events())
+    for name in compacted.agent_store.array_names():
+        original = getattr(model.agent_store, name)[..., compacted.unique_ids]
+        assert np.array_equal(getattr(compacted.agent_store, name), original)
+
+
+def test_vaccinate_many(model_screening):
+    # ----- Vaccinating many agents at once matches vaccinating each agent
+    model = model_screening
+    model.age = 12
+    model.hpv.update_probabilities()
+    unique_ids = np.arange(0, 1000, 3)
+    model.vaccinate_many(unique_ids)
+    for strain in HpvStrain:
+        immunity = model.hpv_strains[strain].hpv_immunity
+        expected = HpvImmunity.NORMAL if strain == HpvStrain.LOW_RISK else HpvImmunity.VACCINE
+        assert (immunity[unique_ids] == expected).all()
+        assert (immunity[unique_ids + 1] == HpvImmunity.NORMAL).all()
+    cached = model.hpv.probabilities.copy()
+    model.hpv.update_probabilities()
+    assert np.array_equal(model.hpv.probabilities, cached)
+    assert model.agent_store.hpv_vaccinated.sum() == len(unique_ids)
+    assert len(model.events.make_events()) == len(unique_ids)
+
+
+def test_treat_cin_many(model_screening):
+    # ----- Effective treatment returns every strain to normal, and each woman keeps her treatment method
+    model = model_screening
+    for method in model.cin_treatment_method_factory.methods:
+        method.params.effectiveness = 1
+    unique_ids = np.arange(0, 20_000, 2)
+    model.hpv.values[:, :20_000] = HpvState.CIN_1
+    model.hpv.update_max_state()
+    model.hpv.update_probabilities()
+    cached = model.hpv.probabilities.copy()
+    model.treat_cin_many(unique_ids)
+    assert (model.hpv.values[:, unique_ids] == HpvState.NORMAL).all()
+    assert (model.max_hpv_state.values[unique_ids] == HpvState.NORMAL).all()
+    assert (model.max_hpv_state.values[unique_ids + 1] == HpvState.CIN_1).all()
+    assert len(model.state_changes.make_events()) == len(unique_ids) * len(HpvStrain)
+
+    # ----- The cured strains' probabilities are refreshed, and the untreated women keep theirs
+    refreshed = model.hpv.probabilities.copy()
+    model.hpv.update_probabilities()
+    assert np.array_equal(refreshed, model.hpv.probabilities)
+    assert np.array_equal(refreshed[:, unique_ids + 1], cached[:, unique_ids + 1])
+    assert not np.array_equal(refreshed[:, unique_ids], cached[:, unique_ids])
+
+    methods = model.agent_store.cin_treatment_method[unique_ids].copy()
+    leep = model.cin_treatment_method_factory.methods[0].params.proportion
+    assert np.isclose((methods == 0).mean(), leep, atol=0.02)
+    model.treat_cin_many(unique_ids)
+    assert np.array_equal(model.agent_store.cin_treatment_method[unique_ids], methods)
+    assert len(model.events.make_events()) == 2 * len(unique_ids)
+
+
+def test_treatment_proportions(model_screening):
+    # ----- Treatment method proportions that don't sum to 1 are rejected instead of renormalised
+    model_screening.params.treatment.cryo.proportion = 0.5
+    with pytest.raises(ValueError):
+        CinTreatmentMethodFactory(model=model_screening)
+
+
+def test_probability_lookup_modes():
+    # ----- Cached and packed probabilities give the same simulation, including treated women
+    changes = {}
+    for lookup in ["cached", "packed"]:
+        model = CervicalModel(Path("experiments/zambia/scenario_screening/"), 0, logger=LoggerFactory().create_logger())
+        model.params.probability_lookup = lookup
+        model.setup_probability_lookup()
+        model.age = 30
+        for _ in range(3 * model.params.steps_per_year + 1):
+            model.step()
+        changes[lookup] = model.state_changes.make_events()
+    assert (changes["cached"]["State_ID"] == HpvStrain.HIGH_RISK.int).any()
+    assert changes["packed"].equals(changes["cached"])
+
+
+def run_replications(scenario_dir: Path, iteration: int, replications: int, sampling: str) -> CervicalModel:
+    model = CervicalModel(scenario_dir, iteration, logger=LoggerFactory().create_logger(), replications=replications)
+    model.params.sampling = sampling
+    model.setup_sampling()
+    model.age = 70
+    for _ in range(model.params.steps_per_year + 1):
+        model.step()
+    return model
+
+
+def test_replications(scenario_copy):
+    scenario_dir = scenario_copy("scenario_screening")
+    model = run_replications(scenario_dir, 0, 2, "bernoulli")
+    num_agents = model.params.num_agents
+    assert len(model.unique_ids) == 2 * num_agents
+    changes = model.state_changes.make_events()
+    model.save_output()
+
+    # ----- Each replication is written as its own iteration, with agents numbered from 0
+    for replication in range(2):
+        iteration_dir = scenario_dir.joinpath(f"iteration_{replication}")
+        df = pd.read_parquet(iteration_dir.joinpath("state_changes.parquet"))
+        assert len(df) == (changes["Unique_ID"] // num_agents == replication).sum()
+        assert df["Unique_ID"].between(0, num_agents - 1).all()
+
+
+@pytest.mark.parametrize("sampling", ["bernoulli", "waiting_time", "binomial"])
+def test_replications_match_iterations(scenario_copy, sampling):
+    # ----- Replication r of a batched run draws the numbers of iteration r run on its own
+    scenario_dir = scenario_copy("scenario_screening")
+    model = run_replications(scenario_dir, 3, 2, sampling)
+    for replication in range(2):
+        alone = run_replications(scenario_dir, 3 + replication, 1, sampling)
+        changes = model.select_replication(model.state_changes.make_events(), replication)
+        assert changes.equals(alone.state_changes.make_events())
+        events = model.select_replication(model.events.make_events(), replication)
+        assert events.equals(alone.events.make_events())
+
+
+def test_output_levels():
+    models = {}
+    for level in ["full", "summary", "first_passage", "none"]:
+        model = CervicalModel(Path("experiments/zambia/scenario_screening/"), 0, logger=LoggerFactory().create_logger())
+        model.params.output.level = level
+        model.setup_storage()
+        model.age = 60
+        for _ in range(2 * model.params.steps_per_year + 1):
+            model.step()
+        models[level] = model
+    changes = models["full"].state_changes.make_events()
+
+    # ----- Summaries count the state changes by age
+    summary = models["summary"].state_changes.make_events()
+    assert summary["Count"].sum() == len(changes)
+    counts = changes.groupby(["State_ID", "To"]).size()
+    assert summary.groupby(["State_ID", "To"])["Count"].sum().equals(counts)
+    assert set(summary["Age"]) == {9, 10, 11}
+
+    # ----- First passage times are the first time each agent entered each state
+    first_passage = models["first_passage"].state_changes.make_events()
+    deaths = changes[changes["State_ID"] == LifeState.int].set_index("Unique_ID")["Time"]
+    assert (first_passage["dead"] >= 0).sum() == len(deaths)
+    assert (first_passage.loc[deaths.index, "dead"] == deaths).all()
+    cin = changes[(changes["State_ID"] == HpvStrain.HIGH_RISK.int) & (changes["To"] == HpvState.CIN_1)]
+    first_cin = cin.groupby("Unique_ID")["Time"].min()
+    assert np.array_equal(first_passage.loc[first_cin.index, "high_risk_cin_1"], first_cin)
+
+    assert models["none"].state_changes.make_events().empty
+
+
+def test_run_writes_chunks(scenario_copy):
+    # ----- A run writes full chunks during the run, and the output matches writing every row at the end
+    scenario_dir = scenario_copy(
+        "scenario_screening", num_agents=10000, num_steps=25 * 12, initial_age=25, compact_agents=True
+    )
+    model = CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger(), replications=2)
+    model.run()
+    assert model.state_changes.chunks == []
+    iteration_dirs = model.replication_dirs()
+    files = ["state_changes.parquet", "events.parquet"]
+    written = [[pd.read_parquet(directory.joinpath(name)) for name in files] for directory in iteration_dirs]
+    assert pq.ParquetFile(iteration_dirs[0].joinpath(files[0])).num_row_groups > 1
+
+    model = CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger(), replications=2)
+    for _ in range(model.params.num_steps):
+        model.step()
+    model.save_output()
+    for directory, frames in zip(iteration_dirs, written):
+        for name, frame in zip(files, frames):
+            pd.testing.assert_frame_equal(pd.read_parquet(directory.joinpath(name)), frame)
+
+
+__all__ = ["model_screening", "scenario_copy"]
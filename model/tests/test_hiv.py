@@ -1,5 +1,7 @@
+import numpy as np
+
 from model.tests.fixtures import model_base
-from model.state import HivState
+from model.state import HivState, HpvStrain
 
 
 def test_hiv(model_base):
@@ -18,5 +20,15 @@ def test_hiv(model_base):
     assert model_base.hiv.values.mean() > 1.2
     assert model_base.hiv.values.mean() < 1.3
 
+    # ----- Infected agents are detected and have HIV specific probabilities
+    infected = model_base.unique_ids[model_base.hiv.values == HivState.HIV]
+    assert model_base.params.hiv_detection_rate == 1
+    assert model_base.hiv_detected[infected].all()
+    strain = model_base.hpv_strains[HpvStrain.SIXTEEN]
+    expected = strain.transition_probability_dict.gather(
+        model_base.age, strain.strain, strain.hpv_immunity[infected], strain.values[infected], HivState.HIV
+    )
+    assert np.array_equal(strain.probabilities[infected], expected)
+
 
 __all__ = ["model_base"]
@@ -1,5 +1,8 @@
-from model.tests.fixtures import model_base
-from model.state import HpvState, CancerState
+import numpy as np
+
+from model.hpv import STEP_ORDER
+from model.tests.fixtures import model_base, model_screening
+from model.state import HpvState, HpvImmunity, HivState, CancerState
 
 
 def test_hpv_initiation(model_base):
@@ -35,4 +38,50 @@ def test_hpv_updates(model_base):
         assert model_base.cancer.probabilities[unique_id] > 0
 
 
-__all__ = ["model_base"]
+def test_packed_probabilities(model_screening):
+    # ----- Packed lookups should give the same probabilities as the cached probabilities
+    model = model_screening
+    model.age = 30
+    model.hiv.values[:] = model.rng.choice(HivState, len(model.unique_ids))
+    for strain in model.hpv_strains.values():
+        strain.values[:] = model.rng.choice(HpvState, len(model.unique_ids))
+        strain.hpv_immunity[:] = model.rng.choice(HpvImmunity, len(model.unique_ids))
+        strain.update_probabilities()
+        cached = strain.current_probabilities(model.unique_ids)
+        strain.packed_lookup = strain.make_packed_lookup()
+        assert np.array_equal(strain.current_probabilities(model.unique_ids), cached)
+
+
+def test_stacked_strains(model_screening):
+    # ----- Each strain's arrays are views of its row in the stacked matrices
+    model = model_screening
+    for row, strain in enumerate(model.hpv.strains):
+        assert np.shares_memory(model.hpv_strains[strain].values, model.hpv.values[row])
+        assert np.shares_memory(model.hpv_strains[strain].hpv_immunity, model.hpv.hpv_immunity[row])
+
+    # ----- The max HPV state is kept up to date by each step
+    model.age = 30
+    model.hpv.probabilities.fill(0.5)
+    for _ in range(5):
+        model.step_hpv()
+    assert model.hpv.values.max() > HpvState.NORMAL
+    assert np.array_equal(model.max_hpv_state.values, model.hpv.values.max(axis=0))
+
+
+def test_cancer_onset_order(model_screening):
+    # ----- An agent who gets cancer from a strain is not stepped by the strains after it in STEP_ORDER
+    model = model_screening
+    model.age = 40
+    model.hpv.values.fill(HpvState.CIN_2_3)
+    model.hpv.probabilities.fill(1)
+    model.hpv.step()
+    values = model.hpv.values[[strain - 1 for strain in STEP_ORDER]]
+    cancer = values == HpvState.CANCER
+    assert cancer.any()
+    assert cancer.sum(axis=0).max() == 1
+    onset = np.where(cancer.any(axis=0), cancer.argmax(axis=0), len(STEP_ORDER))
+    stepped = values != HpvState.CIN_2_3
+    assert np.array_equal(stepped, np.arange(len(STEP_ORDER))[:, None] <= onset)
+
+
+__all__ = ["model_base", "model_screening"]
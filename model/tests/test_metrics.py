@@ -0,0 +1,108 @@
+import importlib
+
+import pandas as pd
+import pytest
+
+from experiments.zambia.src.make_targets import TARGET_METRICS, run_analysis
+from model.analysis import Analysis
+from model.cervical_model import CervicalModel
+from model.logger import LoggerFactory
+from model.metrics import Metric
+from model.parameters import Parameters
+from model.state import CancerState, HivState, HpvState, HpvStrain
+from model.tests.fixtures import copy_scenario, model_screening
+
+METRICS = {
+    "hpv_high_risk": dict(kind="prevalence", field=HpvStrain.HIGH_RISK.name, states=HpvState.HPV),
+    "hpv_cin_1_hiv": dict(
+        kind="prevalence",
+        field=HpvStrain.HIGH_RISK.name,
+        states=(HpvState.HPV, HpvState.CIN_1),
+        filter_dict={HivState.id: HivState.HIV},
+    ),
+    "cancer": dict(kind="incidence", field=CancerState.id, states=CancerState.LOCAL),
+    "hpv_low_risk_hiv_negative": dict(
+        kind="incidence",
+        field=HpvStrain.LOW_RISK.name,
+        states=HpvState.HPV,
+        filter_dict={HivState.id: HivState.NORMAL},
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def scenario_dir(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("metrics")
+    return copy_scenario(directory, "scenario_screening", num_agents=5000, num_steps=5 * 12 + 6, initial_age=40)
+
+
+def test_metrics_match_analysis(scenario_dir):
+    # ----- The rates counted during the run are those Analysis computes from the state changes
+    model = CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger())
+    model.setup_metrics(METRICS)
+    model.run()
+    analysis = Analysis(scenario_dir, 0)
+    for name, metric in model.metrics.metrics.items():
+        if metric.kind == "prevalence":
+            expected = analysis.prevalence(metric.field, metric.states, dict(metric.filter_dict))
+        else:
+            expected = analysis.incidence(metric.field, metric.states, dict(metric.filter_dict))
+        assert expected.notnull().all() and expected.sum() > 0
+        pd.testing.assert_series_equal(model.metrics.rate(name), expected, check_dtype=False, check_names=False)
+
+    rates = pd.read_parquet(scenario_dir.joinpath("iteration_0", "metrics.parquet"))
+    assert list(rates.columns) == ["Age"] + list(METRICS)
+    assert list(rates["Age"]) == list(range(40, 46))
+
+
+def test_metric_validation(model_screening):
+    with pytest.raises(ValueError):
+        Metric(kind="mean", field=CancerState.id, states=CancerState.LOCAL)
+    with pytest.raises(ValueError):
+        model_screening.setup_metrics({"hpv": dict(kind="prevalence", field="hpv", states=HpvState.HPV)})
+
+
+def test_targets_from_metrics(tmp_path):
+    # ----- The targets made from the rates counted during the run are those made from the state changes
+    scenario_dir = copy_scenario(tmp_path, "scenario_screening", num_agents=2000, metrics=TARGET_METRICS)
+    CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger()).run()
+    iteration_dir = scenario_dir.joinpath("iteration_0")
+    run_analysis(scenario_dir, 0)
+    targets = pd.read_csv(iteration_dir.joinpath("analysis_values.csv"))
+    iteration_dir.joinpath("metrics.parquet").unlink()
+    run_analysis(scenario_dir, 0)
+    pd.testing.assert_frame_equal(targets, pd.read_csv(iteration_dir.joinpath("analysis_values.csv")))
+    assert len(targets) == 12 * 8 + 7 + 3 + 2
+
+
+@pytest.mark.parametrize("level", ["summary", "first_passage"])
+def test_targets_without_state_changes(tmp_path, level):
+    # ----- Runs that don't save every state change make the same targets
+    targets = dict()
+    for output_level in ["full", level]:
+        scenario_dir = copy_scenario(
+            tmp_path.joinpath(output_level),
+            "scenario_screening",
+            num_agents=2000,
+            metrics=TARGET_METRICS,
+            output={"level": output_level},
+        )
+        CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger()).run()
+        run_analysis(scenario_dir, 0)
+        targets[output_level] = pd.read_csv(scenario_dir.joinpath("iteration_0", "analysis_values.csv"))
+    assert not scenario_dir.joinpath("iteration_0", "state_changes.parquet").exists()
+    pd.testing.assert_frame_equal(targets[level], targets["full"])
+
+
+@pytest.mark.parametrize("country", ["india", "japan", "usa", "zambia"])
+def test_target_metrics_declared(country):
+    # ----- Each experiment's runs count the rates of its targets
+    params = Parameters()
+    params.update_from_file(f"experiments/{country}/base_documents/parameters.yml")
+    target_metrics = importlib.import_module(f"experiments.{country}.src.make_targets").TARGET_METRICS
+    assert list(params.metrics) == list(target_metrics)
+    for name, metric in target_metrics.items():
+        assert vars(Metric(**params.metrics[name])) == vars(Metric(**metric))
+
+
+__all__ = ["model_screening"]
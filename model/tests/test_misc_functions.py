@@ -0,0 +1,49 @@
+import numpy as np
+import pyarrow.parquet as pq
+
+from model.misc_functions import EventStorage, ParquetSink, binomial_selections, sample_without_replacement
+
+
+def test_sample_without_replacement():
+    rng = np.random.default_rng(0)
+    for population, size in [(10, 10), (100, 5), (100_000, 50)]:
+        chosen = sample_without_replacement(rng, population, size)
+        assert len(np.unique(chosen)) == size
+        assert chosen.min() >= 0 and chosen.max() < population
+
+
+def test_binomial_selections():
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, 4, 200_000).astype(np.int16)
+    probabilities = np.array([0, 1, 0.3, 0.001])
+    selected = binomial_selections(rng, codes, probabilities)
+
+    # ----- Each agent is selected at most once, and each class is selected with its probability
+    assert np.array_equal(selected, np.unique(selected))
+    counts = np.bincount(codes[selected], minlength=4) / np.bincount(codes)
+    assert counts[0] == 0
+    assert counts[1] == 1
+    assert np.isclose(counts[2], 0.3, atol=0.01)
+    assert np.isclose(counts[3], 0.001, atol=0.001)
+
+
+def test_event_storage(tmp_path):
+    storage = EventStorage(column_names=["Time", "Cost"], dtypes=[np.uint16, np.float64], chunk_size=4)
+    storage.record_event((0, 1.5))
+    storage.record_events(np.arange(1, 10), 2.5)
+    events = storage.make_events()
+    assert list(events["Time"]) == list(range(10))
+    assert events["Time"].dtype == np.uint16
+    assert storage.arr.shape == (10, 2)
+
+    # ----- With a sink, full chunks are written as row groups during the run and are no longer held in memory
+    storage = EventStorage(column_names=["Time", "Cost"], dtypes=[np.uint16, np.float64], chunk_size=4)
+    storage.sink = ParquetSink(paths=[tmp_path.joinpath("events.parquet")])
+    storage.record_events(np.arange(10), 2.5)
+    assert len(storage.make_events()) == 2
+    storage.flush()
+    storage.sink.close()
+    assert storage.arr.size == 0
+    written = pq.ParquetFile(tmp_path.joinpath("events.parquet"))
+    assert written.metadata.num_row_groups == 3
+    assert list(written.read().to_pandas()["Time"]) == list(range(10))
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from model.cervical_model import CervicalModel
+from model.logger import LoggerFactory
+from model.tests.fixtures import model_screening, scenario_copy
+
+pytest.importorskip("numba")
+
+
+def test_numba_engine():
+    model = CervicalModel(Path("experiments/zambia/scenario_screening/"), 0, logger=LoggerFactory().create_logger())
+    model.params.engine = "numba"
+    model.setup_engine()
+    model.age = 60
+    for _ in range(3 * model.params.steps_per_year + 1):
+        model.step()
+    events = model.state_changes.make_events()
+    assert len(events) > 0
+
+    # ----- The kernel keeps the cached probabilities, max HPV state, and active sets up to date
+    alive = model.active_sets.alive
+    assert np.array_equal(model.max_hpv_state.values, model.hpv.values.max(axis=0))
+    for state in [model.life, model.cancer]:
+        expected = state.find_probabilities(*state.probability_key(alive))
+        assert np.allclose(state.probabilities[alive], expected)
+    cached = model.hpv.probabilities.copy()
+    model.hpv.update_probabilities()
+    assert np.allclose(cached[:, alive], model.hpv.probabilities[:, alive])
+    names = ["alive", "cancer_free", "undetected_cancer", "hiv_negative"]
+    sets = [getattr(model.active_sets, name) for name in names]
+    model.active_sets.rebuild()
+    for name, before in zip(names, sets):
+        assert np.array_equal(before, getattr(model.active_sets, name))
+
+
+def test_numba_engine_replications(scenario_copy):
+    # ----- The kernel runs each replication with its own streams, so replications match iterations run on their own
+    scenario_dir = scenario_copy("scenario_screening")
+    models = []
+    for iteration, replications in [(0, 2), (0, 1), (1, 1)]:
+        model = CervicalModel(scenario_dir, iteration, logger=LoggerFactory().create_logger(), replications=replications)
+        model.params.engine = "numba"
+        model.setup_engine()
+        model.age = 60
+        for _ in range(model.params.steps_per_year + 1):
+            model.step()
+        models.append(model)
+    batched = models[0]
+    for replication, alone in enumerate(models[1:]):
+        changes = batched.select_replication(batched.state_changes.make_events(), replication)
+        assert len(changes) > 0
+        assert changes.equals(alone.state_changes.make_events())
+
+
+def test_numba_engine_requires_bernoulli(model_screening):
+    model_screening.params.engine = "numba"
+    model_screening.params.sampling = "binomial"
+    with pytest.raises(ValueError):
+        model_screening.setup_engine()
+
+
+__all__ = ["model_screening", "scenario_copy"]
@@ -0,0 +1,44 @@
+import numpy as np
+
+from model.random_streams import RandomBuffer, RandomStreams, ReplicatedStreams, agent_random
+
+
+def test_streams_are_independent():
+    streams = RandomStreams(1111, key=("scenario_base", 0))
+    first = streams.stream("life").random(5)
+
+    # ----- Drawing from other components, in any order, does not change a component's numbers
+    other = RandomStreams(1111, key=("scenario_base", 0))
+    other.stream("hiv").random(1000)
+    assert np.array_equal(other.stream("life").random(5), first)
+    assert streams.stream("life") is streams.stream("life")
+
+    # ----- Each component, run, and seed has its own numbers
+    assert not np.array_equal(RandomStreams(1111, key=("scenario_base", 0)).stream("hiv").random(5), first)
+    assert not np.array_equal(RandomStreams(1111, key=("scenario_base", 1)).stream("life").random(5), first)
+    assert not np.array_equal(RandomStreams(1112, key=("scenario_base", 0)).stream("life").random(5), first)
+
+
+def test_random_buffer():
+    buffered = RandomStreams(1111, buffer_size=8).stream("life")
+    assert isinstance(buffered, RandomBuffer)
+    direct = RandomStreams(1111).stream("life")
+
+    # ----- Scalars and arrays are handed out in order, across blocks
+    randoms = [buffered.random() for _ in range(3)]
+    randoms.extend(buffered.random(4))
+    randoms.extend(buffered.random((2, 2)).ravel())
+    assert np.array_equal(randoms, direct.random(11))
+    # ----- Large draws bypass the buffer, and other methods use the generator
+    assert buffered.random(8).shape == (8,)
+    assert buffered.integers(0, 5, 3).max() < 5
+
+
+def test_replicated_streams():
+    # ----- Each agent draws from its replication's stream, in the order of that replication's agents
+    replications = [RandomStreams(1111, key=("scenario_base", iteration)) for iteration in range(2)]
+    streams = ReplicatedStreams(replications, replication_of=lambda agents: agents // 4)
+    agents = np.array([0, 2, 4, 5, 6])
+    randoms = agent_random(streams.stream("life"), agents)
+    assert np.array_equal(randoms[:2], RandomStreams(1111, key=("scenario_base", 0)).stream("life").random(2))
+    assert np.array_equal(randoms[2:], RandomStreams(1111, key=("scenario_base", 1)).stream("life").random(3))
@@ -0,0 +1,50 @@
+import numpy as np
+
+from model.screening import ScreeningState, due_for_screening
+from model.state import CancerDetectionState
+from model.tests.fixtures import model_screening
+
+
+def test_schedule(model_screening):
+    model = model_screening
+    model.age = 30
+    model.params.screening.interval_routine = 3
+    model.params.screening.interval_surveillance = 1
+    model.params.screening.interval_hiv = 2
+    model.compliant_routine_state.values[:] = True
+    model.compliant_surveillance_state.values[:] = True
+    # ----- 0: never screened, 1: screened recently, 2: surveillance, 3: noncompliant, 4: detected cancer, 5: hiv
+    model.agent_store.last_screen_age[[1, 2, 5]] = 29
+    model.screening_state.values[2] = ScreeningState.SURVEILLANCE
+    model.compliant_routine_state.values[3] = False
+    model.cancer_detection.values[4] = CancerDetectionState.DETECTED
+    calendar = model.screening_calendar
+    calendar.build()
+    assert list(calendar.due_age[:6]) == [30, 32, 30, -1, -1, 32]
+
+    # ----- Only women who are due are visited, and those detected with HIV are rescheduled
+    model.hiv_detected[5] = True
+    calendar.schedule(np.array([5]))
+    due = calendar.due()
+    assert list(due[:2]) == [0, 2]
+    assert all(due_for_screening(model, due))
+    assert calendar.due_age[5] == 31
+
+
+def test_compact(model_screening):
+    # ----- Compaction moves the scheduled women to their new positions and drops the removed women
+    model = model_screening
+    model.age = 30
+    model.compliant_routine_state.values[:] = True
+    calendar = model.screening_calendar
+    calendar.build()
+    due_age = calendar.due_age.copy()
+    keep = np.arange(1, len(due_age), 2)
+    calendar.compact(keep)
+    assert np.array_equal(calendar.due_age, due_age[keep])
+    scheduled = np.concatenate(calendar.calendar[30])
+    assert len(scheduled) > 0
+    assert np.array_equal(np.sort(scheduled), np.flatnonzero(due_age[keep] == 30))
+
+
+__all__ = ["model_screening"]
@@ -1,4 +1,6 @@
+import numpy as np
 import pytest
+from model.agent_store import NEVER
 from model.event import Event
 from model.screening import (
     DnaThenTreatmentScreeningProtocol,
@@ -52,16 +54,15 @@ def default_model(
     model.params.screening.interval_routine = 10
     model.age = age
     model.screening_state.values[unique_id] = screening_state
-    model.dicts.last_screen_age.pop(unique_id, None)
+    model.agent_store.last_screen_age[unique_id] = NEVER
     if last_screen_age:
-        model.dicts.last_screen_age[unique_id] = last_screen_age
+        model.agent_store.last_screen_age[unique_id] = last_screen_age
     model.compliant_routine_state.values[unique_id] = compliant_routine
     model.compliant_surveillance_state.values[unique_id] = compliant_surveillance
     model.cancer_detection.values[unique_id] = cancer_detection
     model.cancer.values[unique_id] = cancer_state
     model.hiv.values[unique_id] = hiv_state
-    if hiv_detected:
-        model.hiv_detected.add(unique_id)
+    model.hiv_detected[unique_id] = hiv_detected
 
     for strain in model.hpv_strains:
         model.hpv_strains[strain].values[unique_id] = hpv_state
@@ -104,6 +105,12 @@ class MockScreeningTest:
     def get_result(self, *args, **kwargs):
         return self.result
 
+    def get_results(self, states, *args):
+        if isinstance(self.result, dict):
+            row = [self.result[strain] for strain in HpvStrain]
+            return np.array([row] * len(states), dtype=np.int8).reshape(-1, len(HpvStrain))
+        return np.full(np.shape(states), self.result, dtype=np.int8)
+
 
 class TestIsDue:
     # Check if women is due for screening
@@ -252,7 +259,7 @@ class TestNoScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == screening_state
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 0
+        assert model.agent_store.last_screen_age[unique_id] == NEVER
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         assert model.events.arr.size == 0
 
@@ -284,7 +291,7 @@ class TestProtocolNoncompliant:
         protocol.apply(unique_id)
 
         assert model_screening.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model_screening.dicts.last_screen_age.get(unique_id, 0) == 0
+        assert model_screening.agent_store.last_screen_age[unique_id] == NEVER
         assert model_screening.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         assert model_screening.events.arr.size == 0
 
@@ -311,7 +318,7 @@ class TestProtocolNoncompliant:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         assert model.events.arr.size == 0
 
@@ -334,7 +341,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 0
+        assert model.agent_store.last_screen_age[unique_id] == NEVER
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         assert model.events.arr.size == 0
 
@@ -354,7 +361,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -377,7 +384,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -401,7 +408,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -425,7 +432,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == age
+        assert model.agent_store.last_screen_age[unique_id] == age
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -448,7 +455,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -471,7 +478,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -495,7 +502,7 @@ class TestViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -522,7 +529,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 0
+        assert model.agent_store.last_screen_age[unique_id] == NEVER
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         assert model.events.make_events().shape[0] == 0
 
@@ -543,7 +550,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -568,7 +575,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -595,7 +602,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -622,7 +629,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == age
+        assert model.agent_store.last_screen_age[unique_id] == age
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -646,7 +653,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -671,7 +678,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -698,7 +705,7 @@ class TestDnaThenTreatmentScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -728,7 +735,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 0
+        assert model.agent_store.last_screen_age[unique_id] == NEVER
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         assert len(model.events.make_events()) == 0
 
@@ -750,7 +757,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == age
+        assert model.agent_store.last_screen_age[unique_id] == age
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -775,7 +782,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -803,7 +810,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -833,7 +840,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -861,7 +868,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.RE_TEST
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -886,7 +893,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == age
+        assert model.agent_store.last_screen_age[unique_id] == age
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -910,7 +917,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -936,7 +943,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -963,7 +970,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -990,7 +997,7 @@ class TestDnaThenTriageScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.RE_TEST
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -1017,7 +1024,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 0
+        assert model.agent_store.last_screen_age[unique_id] == NEVER
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         assert len(model.events.make_events()) == 0
 
@@ -1039,7 +1046,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == age
+        assert model.agent_store.last_screen_age[unique_id] == age
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -1064,7 +1071,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -1092,7 +1099,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -1122,7 +1129,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -1152,7 +1159,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.RE_TEST
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -1182,7 +1189,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -1212,7 +1219,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 20
+        assert model.agent_store.last_screen_age[unique_id] == 20
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -1239,7 +1246,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == age
+        assert model.agent_store.last_screen_age[unique_id] == age
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -1263,7 +1270,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.ROUTINE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 1
@@ -1288,7 +1295,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -1315,7 +1322,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -1341,7 +1348,7 @@ class TestDnaThenViaScreeningProtocol:
         )
         protocol.apply(unique_id)
         assert model.screening_state.values[unique_id] == ScreeningState.RE_TEST
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         print(events)
@@ -1369,7 +1376,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.UNDETECTED
         events = model.events.make_events()
         assert events.shape[0] == 3
@@ -1396,7 +1403,7 @@ class TestDnaThenViaScreeningProtocol:
         protocol.apply(unique_id)
 
         assert model.screening_state.values[unique_id] == ScreeningState.SURVEILLANCE
-        assert model.dicts.last_screen_age.get(unique_id, 0) == 40
+        assert model.agent_store.last_screen_age[unique_id] == 40
         assert model.cancer_detection.values[unique_id] == CancerDetectionState.DETECTED
         events = model.events.make_events()
         assert events.shape[0] == 2
@@ -1406,4 +1413,37 @@ class TestDnaThenViaScreeningProtocol:
         assert events.Cost.values[1] == model.params.screening.via.cost
 
 
+def test_population_screening(model_screening):
+    """
+    Protocols screen every woman that is due and compliant in a single pass, and route each through its branches.
+    """
+    model = model_screening
+    model.age = 30
+    model.agent_store.last_screen_age[:] = NEVER
+    model.screening_state.values[:] = ScreeningState.ROUTINE
+    model.screening_state.values[:10] = ScreeningState.SURVEILLANCE
+    # ----- Women screened 2 years ago are not due
+    model.agent_store.last_screen_age[10:20] = 28
+
+    protocol = DnaThenTriageScreeningProtocol(
+        model=model,
+        params=model.params.screening,
+        via_screening_test=MockScreeningTest(),
+        dna_screening_test=MockScreeningTest(result={strain: ScreeningTestResult.POSITIVE for strain in HpvStrain}),
+        cancer_inspection_screening_test=MockScreeningTest(result=ScreeningTestResult.CANCER),
+    )
+    protocol.apply()
+
+    compliant = model.compliant_routine_state.values.copy()
+    compliant[:10] = model.compliant_surveillance_state.values[:10]
+    compliant[10:20] = False
+    screened = compliant.nonzero()[0]
+    assert (model.cancer_detection.values[screened] == CancerDetectionState.DETECTED).all()
+    assert (model.cancer_detection.values[~compliant] == CancerDetectionState.UNDETECTED).all()
+    assert (model.agent_store.last_screen_age[screened] == 30).all()
+    events = model.events.make_events()
+    assert (events.Event == Event.SCREENING_DNA.value).sum() == len(screened[screened >= 10])
+    assert (events.Event == Event.SURVEILLANCE_CANCER_INSPECTION.value).sum() == len(screened[screened < 10])
+
+
 __all__ = ["model_screening"]
@@ -118,6 +118,19 @@ class TestCancerInspectionScreeningTest:
 
         assert expected[0] <= observed and observed <= expected[1]
 
+    def test_get_results(self, model_screening):
+        """
+        Batched results should match the expected result of each case.
+        """
+        cases = [case for case in TestCancerInspectionScreeningTest.create_cases() if case.exception is None]
+        for sensitive, specific in itertools.product((True, False), (True, False)):
+            model_screening.params.screening.cancer_inspection.sensitivity = 1 if sensitive else 0
+            model_screening.params.screening.cancer_inspection.specificity = 1 if specific else 0
+            batch = [case for case in cases if case.sensitive == sensitive and case.specific == specific]
+
+            results = CancerInspectionScreeningTest(model_screening).get_results([case.truth for case in batch])
+            assert list(results) == [case.expected for case in batch]
+
 
 class TestCancerInspectionScreeningTestHelpers:
     """
@@ -277,6 +290,21 @@ class TestDnaScreeningTest:
 
         assert expected[0] <= observed and observed <= expected[1]
 
+    def test_get_results(self, model_screening):
+        """
+        Batched results should be a (woman, strain) matrix matching the expected result of each case.
+        """
+        cases = TestDnaScreeningTest.create_cases()
+        for sensitive, specific in itertools.product((True, False), (True, False)):
+            model_screening.params.screening.dna.sensitivity = 1 if sensitive else 0
+            model_screening.params.screening.dna.specificity = 1 if specific else 0
+            batch = [case for case in cases if case.sensitive == sensitive and case.specific == specific]
+
+            truths = [[case.truth[strain] for strain in HpvStrain] for case in batch]
+            results = DnaScreeningTest(model_screening).get_results(truths)
+            assert results.shape == (len(batch), len(HpvStrain))
+            assert results.tolist() == [[case.expected[strain] for strain in HpvStrain] for case in batch]
+
 
 class TestDnaScreeningTestHelpers:
     """
@@ -473,6 +501,21 @@ class TestViaScreeningTest:
 
         assert expected[0] <= observed and observed <= expected[1]
 
+    def test_get_results(self, model_screening):
+        """
+        Batched results should match the expected result of each case.
+        """
+        cases = [case for case in TestViaScreeningTest.create_cases() if case.exception is None]
+        for sensitive, specific in itertools.product((True, False), (True, False)):
+            model_screening.params.screening.via.sensitivity = 1 if sensitive else 0
+            model_screening.params.screening.via.specificity = 1 if specific else 0
+            batch = [case for case in cases if case.sensitive == sensitive and case.specific == specific]
+
+            results = ViaScreeningTest(model_screening).get_results(
+                [case.truth["true_hpv_state"] for case in batch], [case.truth["true_cancer_state"] for case in batch]
+            )
+            assert list(results) == [case.expected for case in batch]
+
 
 class TestViaScreeningTestHelpers:
     """
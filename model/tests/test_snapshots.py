@@ -0,0 +1,62 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from model.analysis import Analysis
+from model.cervical_model import CervicalModel
+from model.logger import LoggerFactory
+from model.state import CancerState, HivState, HpvState, HpvStrain, LifeState
+from model.tests.fixtures import copy_scenario
+
+
+def run_with_snapshots(directory: Path, level: str) -> Path:
+    scenario_dir = copy_scenario(
+        directory,
+        "scenario_screening",
+        num_agents=3000,
+        num_steps=8 * 12 + 6,
+        initial_age=50,
+        compact_agents=True,
+        output={"level": level, "snapshots": True},
+    )
+    CervicalModel(scenario_dir, 0, logger=LoggerFactory().create_logger()).run()
+    return scenario_dir
+
+
+def test_snapshots_match_timelines(tmp_path):
+    scenario_dir = run_with_snapshots(tmp_path, "full")
+
+    snapshot_dir = scenario_dir.joinpath("iteration_0", "snapshots")
+    panel = np.load(snapshot_dir.joinpath(f"{LifeState.id}.npy"), mmap_mode="r")
+    assert panel.dtype == np.int8 and panel.shape == (9, 3000)
+
+    # ----- Analysis loads the panels instead of rebuilding the timelines, with the same results
+    analysis = Analysis(scenario_dir, 0)
+    shutil.move(snapshot_dir, tmp_path.joinpath("snapshots"))
+    expected = Analysis(scenario_dir, 0)
+    for chart_id in expected.chart_ids:
+        assert analysis.agent_timeline[chart_id].astype(int).equals(expected.agent_timeline[chart_id].astype(int))
+    pd.testing.assert_series_equal(
+        analysis.prevalence(HpvStrain.HIGH_RISK.name, (HpvState.HPV.value,), {HivState.id: HivState.HIV.value}),
+        expected.prevalence(HpvStrain.HIGH_RISK.name, (HpvState.HPV.value,), {HivState.id: HivState.HIV.value}),
+    )
+    incidence = analysis.incidence(CancerState.id, CancerState.LOCAL.value)
+    pd.testing.assert_series_equal(incidence, expected.incidence(CancerState.id, CancerState.LOCAL.value))
+
+
+def test_snapshots_without_state_changes(tmp_path):
+    # ----- Summary runs don't write the state changes: prevalence only needs the snapshots
+    full = Analysis(run_with_snapshots(tmp_path.joinpath("full"), "full"), 0)
+    scenario_dir = run_with_snapshots(tmp_path.joinpath("summary"), "summary")
+    assert not scenario_dir.joinpath("iteration_0", "state_changes.parquet").exists()
+    analysis = Analysis(scenario_dir, 0)
+    pd.testing.assert_series_equal(
+        analysis.prevalence(HpvStrain.HIGH_RISK.name, (HpvState.HPV.value,), {HivState.id: HivState.HIV.value}),
+        full.prevalence(HpvStrain.HIGH_RISK.name, (HpvState.HPV.value,), {HivState.id: HivState.HIV.value}),
+    )
+    with pytest.raises(FileNotFoundError):
+        analysis.incidence(CancerState.id, CancerState.LOCAL.value)
+
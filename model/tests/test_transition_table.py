@@ -0,0 +1,110 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+from model.state import CancerState, HivState, HpvState
+from model.transition_table import PackedLookup, TransitionTable, load_transition_table
+
+
+def make_life_dict():
+    return {
+        (age, hiv.value, cancer.value): age / 1000 + hiv.value / 100 + cancer.value / 10
+        for age in range(9, 12)
+        for hiv in HivState
+        for cancer in CancerState
+    }
+
+
+def test_from_dict():
+    # ----- Every key in the dictionary should be available in the table
+    life_dict = make_life_dict()
+    table = TransitionTable.from_dict(life_dict)
+    assert len(table) == len(life_dict)
+    assert table.offsets == (9, 1, 1)
+    for key, value in life_dict.items():
+        assert table[key] == value
+    with pytest.raises(KeyError):
+        table[(8, 1, 1)]
+
+
+def test_gather():
+    # ----- Vectorized lookups should match the dictionary lookups
+    life_dict = make_life_dict()
+    table = TransitionTable.from_dict(life_dict)
+    hiv = np.array([1, 2, 2, 1], dtype=np.int8)
+    cancer = np.array([1, 1, 3, 5], dtype=np.int8)
+    expected = [life_dict[(10, h, c)] for h, c in zip(hiv, cancer)]
+    assert np.allclose(table.gather(10, hiv, cancer), expected)
+
+    # ----- Keys without a value raise a KeyError, as the dictionaries did
+    table = TransitionTable.from_dict({key: value for key, value in life_dict.items() if key[2] != 3})
+    with pytest.raises(KeyError, match="3"):
+        table.gather(10, hiv, cancer)
+    with pytest.raises(KeyError):
+        table.gather(12, hiv, np.ones(4))
+
+
+def test_scalar_keys():
+    detection_dict = {state.value: state.value / 10 for state in CancerState}
+    table = TransitionTable.from_dict(detection_dict)
+    assert table[CancerState.LOCAL.value] == 0.2
+    assert np.allclose(table.gather(np.array([1, 4])), [0.1, 0.4])
+    assert table.to_dict() == detection_dict
+
+
+def test_leave_probabilities():
+    table = TransitionTable.empty(axes=[HpvState], num_states=len(HpvState))
+    table[(HpvState.NORMAL.value,)] = [0.9, 0.1, 0, 0, 0]
+    table[(HpvState.HPV.value,)] = [0.2, 0.7, 0.1, 0, 0]
+    leave = table.leave_probabilities(state_axis=0)
+    assert np.isclose(leave[(HpvState.NORMAL.value,)], 0.1)
+    assert np.isclose(leave[(HpvState.HPV.value,)], 0.3)
+    assert (HpvState.CIN_1.value,) not in leave
+
+
+def test_conditional_cdf():
+    table = TransitionTable.empty(axes=[HpvState], num_states=len(HpvState))
+    table[(HpvState.HPV.value,)] = [0.2, 0.7, 0.1, 0, 0]
+    table[(HpvState.CANCER.value,)] = [0, 0, 0, 0, 1]
+    cdf = table.conditional_cdf(state_axis=0)
+    # ----- The current state is removed and the remaining probabilities are normalized
+    assert np.allclose(cdf[(HpvState.HPV.value,)], [2 / 3, 2 / 3, 1, 1, 1])
+    # ----- States that cannot be left keep their probability
+    assert np.allclose(cdf[(HpvState.CANCER.value,)], [0, 0, 0, 0, 1])
+    # ----- The table is shared by all agents, so it cannot be changed
+    with pytest.raises(ValueError):
+        cdf[(HpvState.HPV.value,)][0] = 0
+
+
+def test_packed_lookup():
+    # ----- Packed lookups should match the vectorized lookups, including after the age changes
+    table = TransitionTable.from_dict(make_life_dict())
+    lookup = PackedLookup(table, age_axis=0)
+    hiv = np.array([1, 2, 2, 1], dtype=np.int8)
+    cancer = np.array([1, 1, 3, 5], dtype=np.int8)
+    for age in [9, 11]:
+        assert np.array_equal(lookup.lookup(age, hiv, cancer), table.gather(age, hiv, cancer))
+    assert lookup.encode(hiv, cancer).dtype == np.int16
+
+
+def test_load_transition_table(tmp_path):
+    # ----- Older pickled dictionaries are still readable
+    life_dict = make_life_dict()
+    with open(tmp_path.joinpath("life_dictionary.pickle"), "wb") as handle:
+        pickle.dump(life_dict, handle)
+    table = load_transition_table(tmp_path, "life")
+    assert table.to_dict() == life_dict
+
+    # ----- Saved tables take priority over the pickle
+    table[(9, 1, 1)] = 0.5
+    table.save(tmp_path.joinpath("life_table.npz"))
+    loaded = load_transition_table(tmp_path, "life")
+    assert loaded[(9, 1, 1)] == 0.5
+    assert np.array_equal(loaded.data, table.data)
+
+    # ----- Unless the pickle is newer than the saved table
+    table_time = tmp_path.joinpath("life_table.npz").stat().st_mtime
+    os.utime(tmp_path.joinpath("life_dictionary.pickle"), (table_time + 1, table_time + 1))
+    assert load_transition_table(tmp_path, "life").to_dict() == life_dict
@@ -0,0 +1,31 @@
+import numpy as np
+
+from model.tests.fixtures import model_screening
+from model.waiting_times import WaitingTimes
+
+
+def test_schedule(model_screening):
+    waiting_times = WaitingTimes(model=model_screening, count=30_000)
+    unique_ids = np.arange(30_000)
+    probabilities = np.full(30_000, 0.2)
+    probabilities[:10] = [1, 1, 1, 1, 1, 0, 0, 0, 0, 0]
+    waiting_times.schedule(unique_ids, probabilities)
+
+    # ----- Certain transitions happen at the first step, and impossible transitions are never scheduled
+    assert all(waiting_times.due_time[:5] == 0)
+    assert all(waiting_times.due_time[5:10] == -1)
+    # ----- Transitions happen at each step with the agent's probability
+    due = waiting_times.due(unique_ids[10:])
+    assert np.isclose(len(due) / len(unique_ids[10:]), 0.2, atol=0.01)
+    model_screening.time = 1
+    due = waiting_times.due(unique_ids[10:])
+    assert np.isclose(len(due) / len(unique_ids[10:]), 0.2 * 0.8, atol=0.01)
+
+    # ----- Agents that have been rescheduled or are no longer eligible are not due
+    model_screening.time = 2
+    waiting_times.schedule(unique_ids[:5], np.ones(5))
+    waiting_times.schedule(unique_ids[:1], np.zeros(1))
+    assert list(waiting_times.due(unique_ids[2:5])) == [2, 3, 4]
+
+
+__all__ = ["model_screening"]
@@ -0,0 +1,306 @@
+import pickle
+from itertools import product
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+
+
+class TransitionTable:
+    """ A dense, array-backed transition table.
+
+    A transition table maps a key, such as `(age, strain, immunity, hpv_state, hiv)`, to either a single probability
+    or to a list of probabilities (one per to-state). Each key field is stored as one axis of `self.data`. Tables with
+    a list of probabilities have a final to-state axis, where index `i` holds the probability of moving to
+    state `i + 1`.
+
+    Key values along each axis must be consecutive integers starting at `self.offsets[axis]`. This holds for every
+    state enum in `model.state` and for the age groups.
+
+    The table supports the same item access as the dictionaries it replaces (`table[key]`, `table[key] = value`,
+    `keys()`, `items()`, ...), as well as vectorized lookups over whole agent arrays with `gather`.
+    """
+
+    def __init__(self, data: np.ndarray, offsets: tuple, defined: np.ndarray = None, scalar_key: bool = False):
+        """
+        Args:
+            data (np.ndarray): Probabilities. One axis per key field, plus an optional final to-state axis.
+            offsets (tuple): The smallest key value of each key field.
+            defined (np.ndarray, optional): Which keys have been given a value. Defaults to all keys.
+            scalar_key (bool, optional): Keys are single integers rather than tuples. Defaults to False.
+        """
+        self.data = data
+        self.offsets = tuple(int(item) for item in offsets)
+        if defined is None:
+            defined = np.ones(data.shape[: len(self.offsets)], dtype=bool)
+        self.defined = defined
+        self.scalar_key = scalar_key
+
+    @classmethod
+    def empty(cls, axes: List[Iterable[int]], num_states: int = None, scalar_key: bool = False):
+        """ Create a table with no defined keys.
+
+        Args:
+            axes (List[Iterable[int]]): The possible values of each key field. State enums can be passed directly.
+            num_states (int, optional): The number of to-states. Defaults to None for single probability tables.
+            scalar_key (bool, optional): Keys are single integers rather than tuples. Defaults to False.
+        """
+        values = [sorted(int(item) for item in axis) for axis in axes]
+        for axis in values:
+            if axis != list(range(axis[0], axis[0] + len(axis))):
+                raise ValueError(f"Key values must be consecutive integers. Found: {axis}")
+        shape = tuple(len(axis) for axis in values)
+        if num_states is not None:
+            shape = shape + (num_states,)
+        data = np.full(shape, np.nan)
+        defined = np.zeros(shape[: len(values)], dtype=bool)
+        return cls(data=data, offsets=tuple(axis[0] for axis in values), defined=defined, scalar_key=scalar_key)
+
+    @classmethod
+    def from_dict(cls, transition_dict: dict):
+        """ Create a table from a tuple-keyed (or integer-keyed) dictionary of probabilities.
+        """
+        keys = list(transition_dict.keys())
+        scalar_key = not isinstance(keys[0], tuple)
+        key_tuples = [(key,) if scalar_key else key for key in keys]
+        first_value = transition_dict[keys[0]]
+        num_states = len(first_value) if np.ndim(first_value) == 1 else None
+
+        axes = []
+        for field in zip(*key_tuples):
+            axes.append(range(min(field), max(field) + 1))
+        table = cls.empty(axes=axes, num_states=num_states, scalar_key=scalar_key)
+        for key, value in transition_dict.items():
+            table[key] = value
+        return table
+
+    @classmethod
+    def load(cls, path: Path):
+        """ Load a table saved with `save`.
+        """
+        with np.load(path) as stored:
+            return cls(
+                data=stored["data"],
+                offsets=tuple(stored["offsets"]),
+                defined=stored["defined"],
+                scalar_key=bool(stored["scalar_key"]),
+            )
+
+    def save(self, path: Path):
+        """ Save the table as an uncompressed `.npz` file.
+        """
+        with open(path, "wb") as handle:
+            np.savez(
+                handle, data=self.data, offsets=np.array(self.offsets), defined=self.defined, scalar_key=self.scalar_key
+            )
+
+    def to_dict(self) -> dict:
+        """ Convert the table back into a dictionary of probabilities.
+        """
+        return {key: (list(value) if self.has_states else value) for key, value in self.items()}
+
+    # ----- Vectorized access ------------------------------------------------------------------------------------------
+    @property
+    def has_states(self) -> bool:
+        """ True if each key maps to a list of to-state probabilities.
+        """
+        return self.data.ndim > len(self.offsets)
+
+    @property
+    def key_shape(self) -> tuple:
+        return self.data.shape[: len(self.offsets)]
+
+    def gather(self, *fields) -> np.ndarray:
+        """ Look up the probabilities for many keys at once.
+
+        Each argument is one key field, given as a scalar or as an array of values (one per agent). Scalars broadcast
+        against the arrays, so `gather(age, hiv.values, cancer.values)` returns one entry per agent. As with the
+        dictionaries, a KeyError is raised if any key has not been given a value.
+        """
+        index = tuple(np.broadcast_arrays(*self.index(*fields)))
+        valid = np.ones(index[0].shape, dtype=bool)
+        for position, size in zip(index, self.key_shape):
+            valid &= (position >= 0) & (position < size)
+        if valid.all():
+            valid = self.defined[index]
+        if not valid.all():
+            key = tuple(int(position[~valid][0]) + offset for position, offset in zip(index, self.offsets))
+            raise KeyError(key[0] if self.scalar_key else key)
+        return self.data[index]
+
+    def index(self, *fields) -> tuple:
+        """ Convert key fields into an index tuple for `self.data`.
+        """
+        if len(fields) != len(self.offsets):
+            raise ValueError(f"Expected {len(self.offsets)} key fields, received {len(fields)}.")
+        return tuple(np.asarray(field, dtype=np.intp) - offset for field, offset in zip(fields, self.offsets))
+
+    def select(self, axis: int, value: int):
+        """ Return a table restricted to a single value of one key field. Keys keep their original form.
+        """
+        position = int(value) - self.offsets[axis]
+        if not 0 <= position < self.data.shape[axis]:
+            raise KeyError(value)
+        window = slice(position, position + 1)
+        data = self.data[(slice(None),) * axis + (window,)]
+        defined = self.defined[(slice(None),) * axis + (window,)]
+        offsets = self.offsets[:axis] + (value,) + self.offsets[axis + 1 :]
+        return TransitionTable(data=data.copy(), offsets=offsets, defined=defined.copy(), scalar_key=self.scalar_key)
+
+    def current_state_mask(self, state_axis: int) -> np.ndarray:
+        """ Return a boolean array, shaped like `self.data`, that is True where the to-state equals the current state.
+        `state_axis` is the key field holding the current state.
+        """
+        if not self.has_states:
+            raise ValueError("This operation requires a table with a to-state axis.")
+        mask = np.zeros(self.data.shape, dtype=bool)
+        for position in range(self.data.shape[state_axis]):
+            state = position + self.offsets[state_axis]
+            mask[(slice(None),) * state_axis + (position, Ellipsis, state - 1)] = True
+        return mask
+
+    def leave_probabilities(self, state_axis: int):
+        """ Return a table of the probability of leaving the current state, where `state_axis` is the key field
+        holding the current state.
+        """
+        stay = np.where(self.current_state_mask(state_axis), self.data, 0).sum(axis=-1)
+        return TransitionTable(
+            data=1 - stay, offsets=self.offsets, defined=self.defined.copy(), scalar_key=self.scalar_key
+        )
+
+    def conditional_cdf(self, state_axis: int):
+        """ Return a read-only table of cumulative to-state probabilities, given that an agent leaves its current state.
+
+        The current state's probability is removed and the remaining probabilities are normalized. Keys that have no
+        chance of leaving their current state keep all of their probability on the current state.
+        """
+        current = self.current_state_mask(state_axis)
+        leave = np.where(current, 0, self.data)
+        total = leave.sum(axis=-1, keepdims=True)
+        conditional = np.where(total > 0, leave / np.where(total > 0, total, 1), current)
+        cdf = np.cumsum(conditional, axis=-1)
+        cdf[..., -1] = 1
+        cdf.setflags(write=False)
+        return TransitionTable(data=cdf, offsets=self.offsets, defined=self.defined.copy(), scalar_key=self.scalar_key)
+
+    # ----- Dictionary compatible access -------------------------------------------------------------------------------
+    def _key_index(self, key) -> tuple:
+        fields = (key,) if self.scalar_key else key
+        if not isinstance(fields, tuple) or len(fields) != len(self.offsets):
+            raise KeyError(key)
+        index = tuple(int(field) - offset for field, offset in zip(fields, self.offsets))
+        if not all(0 <= i < size for i, size in zip(index, self.key_shape)):
+            raise KeyError(key)
+        return index
+
+    def __getitem__(self, key):
+        index = self._key_index(key)
+        if not self.defined[index]:
+            raise KeyError(key)
+        return self.data[index]
+
+    def __setitem__(self, key, value):
+        index = self._key_index(key)
+        self.data[index] = value
+        self.defined[index] = True
+
+    def __contains__(self, key) -> bool:
+        try:
+            return bool(self.defined[self._key_index(key)])
+        except KeyError:
+            return False
+
+    def __len__(self) -> int:
+        return int(self.defined.sum())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self) -> list:
+        keys = []
+        for index in product(*[range(size) for size in self.key_shape]):
+            if self.defined[index]:
+                key = tuple(i + offset for i, offset in zip(index, self.offsets))
+                keys.append(key[0] if self.scalar_key else key)
+        return keys
+
+    def values(self) -> list:
+        return [self[key] for key in self.keys()]
+
+    def items(self) -> list:
+        return [(key, self[key]) for key in self.keys()]
+
+
+class PackedLookup:
+    """ Look up probabilities using one packed state code per agent.
+
+    The key fields other than age are packed into a single small integer code, and the probabilities for one age are
+    stored as a flat array indexed by that code. All agents in the model share the same age, so looking up every
+    agent's probability is a single gather from a table with a few dozen entries.
+    """
+
+    def __init__(self, table: TransitionTable, age_axis: int = None):
+        """
+        Args:
+            table (TransitionTable): A table of single probabilities (no to-state axis).
+            age_axis (int, optional): The key field holding age. Defaults to None for tables that don't use age.
+        """
+        if table.has_states:
+            raise ValueError("A packed lookup requires a table of single probabilities.")
+        self.table = table
+        self.age_axis = age_axis
+        self.code_axes = [axis for axis in range(len(table.offsets)) if axis != age_axis]
+        shape = [table.key_shape[axis] for axis in self.code_axes]
+        self.strides = [int(np.prod(shape[i + 1 :])) for i in range(len(shape))]
+        self.dtype = np.int16 if np.prod(shape) <= np.iinfo(np.int16).max else np.intp
+        self.age = None
+        self.values = None if age_axis is not None else table.data.ravel()
+
+    def encode(self, *fields) -> np.ndarray:
+        """ Pack the key fields (excluding age) into one code per agent.
+        """
+        code = self.dtype(0)
+        for field, axis, stride in zip(fields, self.code_axes, self.strides):
+            code = code + (np.asarray(field).astype(self.dtype) - self.table.offsets[axis]) * self.dtype(stride)
+        return code
+
+    def age_values(self, age: int = None) -> np.ndarray:
+        """ Return the probability of every code at the given age. The age is ignored if the table doesn't use age.
+        """
+        if self.age_axis is not None and age != self.age:
+            age_index = int(age) - self.table.offsets[self.age_axis]
+            self.values = np.take(self.table.data, age_index, axis=self.age_axis).ravel()
+            self.age = age
+        return self.values
+
+    def classes(self, *fields) -> tuple:
+        """ Return the packed code of each agent, and the probability of every code at the agents' age. Fields are
+        given in the same order as `gather`.
+        """
+        age = None
+        if self.age_axis is not None:
+            age = fields[self.age_axis]
+            fields = fields[: self.age_axis] + fields[self.age_axis + 1 :]
+        return self.encode(*fields), self.age_values(age)
+
+    def lookup(self, *fields) -> np.ndarray:
+        """ Look up the probabilities for the given key fields. Fields are given in the same order as `gather`.
+        """
+        codes, values = self.classes(*fields)
+        return values[codes]
+
+
+def load_transition_table(transition_dir: Path, name: str) -> TransitionTable:
+    """ Load a transition table from a directory of transition files.
+
+    The `{name}_table.npz` file is used if it exists and is at least as new as the `{name}_dictionary.pickle` file.
+    Otherwise the table is built from the pickle, so a recalibrated pickle is never shadowed by a stale table.
+    """
+    transition_dir = Path(transition_dir)
+    table_file = transition_dir.joinpath(f"{name}_table.npz")
+    pickle_file = transition_dir.joinpath(f"{name}_dictionary.pickle")
+    if table_file.exists():
+        if not pickle_file.exists() or table_file.stat().st_mtime >= pickle_file.stat().st_mtime:
+            return TransitionTable.load(table_file)
+    with open(pickle_file, "rb") as openfile:
+        return TransitionTable.from_dict(pickle.load(openfile))
@@ -1,3 +1,8 @@
+import numpy as np
+
+from model.random_streams import draw_randoms
+
+
 class CinTreatmentMethod:
     def __init__(self, name, params, rng):
         self.name = name
@@ -5,19 +10,37 @@ class CinTreatmentMethod:
         self.rng = rng
 
     def is_effective(self):
-        return self.rng.random() < self.params.effectiveness
+        return self.effective(1)[0]
+
+    def effective(self, count: int, agents: np.array = None) -> np.array:
+        """ Return a boolean array that is True for each of `count` treatments that is effective. The positions of the
+        treated women (`agents`) are required when simulating replications.
+        """
+        return draw_randoms(self.rng, count, agents) < self.params.effectiveness
 
 
 class CinTreatmentMethodFactory:
     def __init__(self, model):
         self.model = model
         self.params = model.params.treatment
+        self.rng = model.streams.stream("treatment")
         self.methods = [
-            CinTreatmentMethod("leep", self.params.leep, self.model.rng),
-            CinTreatmentMethod("cryo", self.params.cryo, self.model.rng),
+            CinTreatmentMethod("leep", self.params.leep, self.rng),
+            CinTreatmentMethod("cryo", self.params.cryo, self.rng),
         ]
         self.proportions = [m.params.proportion for m in self.methods]
-        self.options = [i for i in range(len(self.methods))]
+        if not np.isclose(sum(self.proportions), 1):
+            raise ValueError(f"Treatment method proportions must sum to 1, not {sum(self.proportions)}.")
 
     def get_method(self):
-        return self.model.rng.choice(self.options, p=self.proportions)
+        return self.get_methods(1)[0]
+
+    def get_methods(self, count: int, agents: np.array = None) -> np.array:
+        """ Return the index of a randomly chosen method for each of `count` women, drawn with one categorical draw.
+        The positions of the women (`agents`) are required when simulating replications.
+        """
+        cdf = np.cumsum(self.proportions)
+        # Rounding can leave the last entry just below 1
+        cdf[-1] = 1
+        methods = np.searchsorted(cdf, draw_randoms(self.rng, count, agents), side="right")
+        return methods.astype(np.int8)
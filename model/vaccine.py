@@ -1,17 +1,16 @@
-import numpy as np
+from model.random_streams import agent_random
 
 
 class VaccinationProtocol:
     def __init__(self, model):
         self.model = model
         self.params = model.params.vaccination
+        self.rng = model.streams.stream("vaccination")
 
     def apply(self):
         # ----- Check vacination schedule:
         if self.model.age in self.params.schedule:
             p = self.params.schedule[self.model.age]
-            unique_ids = self.model.unique_ids[self.model.life.living]
-            selected_agents = np.array([p] * len(unique_ids)) > self.model.rng.rand(len(unique_ids))
-
-            for unique_id in unique_ids[selected_agents]:
-                self.model.vaccinate(unique_id)
+            unique_ids = self.model.active_sets.alive
+            selected_agents = p > agent_random(self.rng, unique_ids)
+            self.model.vaccinate_many(unique_ids[selected_agents])
@@ -0,0 +1,75 @@
+import numpy as np
+
+from model.active_sets import contains
+from model.random_streams import agent_random
+
+
+class WaitingTimes:
+    def __init__(self, model, count: int, rng: np.random.Generator = None):
+        """ Schedule each agent's next transition by drawing a geometric waiting time, instead of drawing a random
+        number for every agent at every step.
+            - An agent's probability is fixed until it changes state or the model changes age, so the number of steps
+              until its next transition is geometric. Agents are rescheduled whenever their probability changes.
+            - Waiting times are only kept until the next yearly update, when every eligible agent is rescheduled.
+            - `self.calendar` maps a time step to the arrays of agents due to transition at that step
+            - Waiting times are drawn from `rng` (the model's general stream by default)
+        """
+        self.model = model
+        self.rng = model.rng if rng is None else rng
+        self.calendar = dict()
+        self.due_time = None
+        # The first time step that has not yet been stepped for this state
+        self.start = 0
+        self.reset(count)
+
+    def reset(self, count: int):
+        """ Forget every scheduled transition
+        """
+        self.calendar = dict()
+        self.due_time = np.full(count, -1, dtype=np.int32)
+
+    def schedule(self, unique_ids: np.array, probabilities: np.array):
+        """ Draw the step of each agent's next transition, starting from the next step that has not been simulated
+        """
+        unique_ids = np.atleast_1d(unique_ids)
+        probabilities = np.atleast_1d(probabilities)
+        self.due_time[unique_ids] = -1
+        if len(unique_ids) == 0:
+            return
+
+        randoms = 1 - agent_random(self.rng, unique_ids)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            waits = np.floor(np.log(randoms) / np.log1p(-probabilities))
+        waits[probabilities <= 0] = np.inf
+        due = self.start + waits
+
+        # ----- Agents due after the next yearly update will be rescheduled by it
+        steps_per_year = self.model.params.steps_per_year
+        horizon = (self.model.time // steps_per_year + 1) * steps_per_year
+        scheduled = due < horizon
+        unique_ids = unique_ids[scheduled]
+        due = due[scheduled].astype(np.int32)
+        self.due_time[unique_ids] = due
+
+        if len(unique_ids) == 1:
+            self.calendar.setdefault(int(due[0]), []).append(unique_ids)
+            return
+        order = np.argsort(due, kind="stable")
+        times, starts = np.unique(due[order], return_index=True)
+        for time, group in zip(times, np.split(unique_ids[order], starts[1:])):
+            self.calendar.setdefault(int(time), []).append(group)
+
+    def due(self, eligible: np.array) -> np.array:
+        """ Return the eligible agents that are due to transition at the current step
+        """
+        time = self.model.time
+        self.start = time + 1
+        bucket = self.calendar.pop(time, [])
+        if len(bucket) == 0:
+            return eligible[:0]
+        unique_ids = np.unique(np.concatenate(bucket))
+        # Agents that were rescheduled since being added to this bucket are no longer due
+        unique_ids = unique_ids[self.due_time[unique_ids] == time]
+        unique_ids = unique_ids[contains(eligible, unique_ids)]
+        self.due_time[unique_ids] = -1
+        return unique_ids
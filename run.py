@@ -1,6 +1,5 @@
 import argparse
 import multiprocessing
-import random
 from pathlib import Path
 
 from model.cervical_model import CervicalModel
@@ -9,18 +8,17 @@ from src.run_mass_runs import get_run_analysis
 
 
 class Runner:
-    def __init__(self, directory: str, cpus: int, num_iterations: int, seed: int = 1111):
+    def __init__(self, directory: str, cpus: int, num_iterations: int, seed: int = 1111, replications: int = 1):
         self.directory = Path(directory)
         self.cpus = cpus
         self.num_iterations = num_iterations
         self.seed = seed
+        # The number of iterations each model simulates together
+        self.replications = replications
         self.logger_factory = LoggerFactory()
         self.is_experiment = not self.directory.name.startswith("scenario")
         self.logger = self.logger_factory.create_logger(self.directory.joinpath("run.log"))
 
-        self.rng = random.Random()
-        self.rng.seed(seed)
-
         if self.is_experiment:
             self.scenario_dirs = [d for d in self.directory.iterdir() if d.is_dir() and d.name.startswith("scenario")]
         else:
@@ -61,7 +59,8 @@ class Runner:
         self.logger.info("All tasks complete")
 
     def _get_scenario_tasks(self, directory, pool):
-        for iteration in range(self.num_iterations):
+        for iteration in range(0, self.num_iterations, self.replications):
+            replications = min(self.replications, self.num_iterations - iteration)
             self.logger.debug("Adding iteration [{}] to queue".format(iteration))
             yield {
                 "scenario": directory.name,
@@ -72,13 +71,17 @@ class Runner:
                         scenario_dir=directory,
                         iteration=iteration,
                         logger_factory=self.logger_factory,
-                        seed=self.rng.randint(1, 2 ** 30),
+                        # Each model derives its streams from the seed, scenario, and iteration
+                        seed=self.seed,
+                        replications=replications,
                     ),
                 ),
             }
 
 
-def run_iteration(scenario_dir: Path, logger_factory: LoggerFactory, iteration: int, seed: int = 1111):
+def run_iteration(
+    scenario_dir: Path, logger_factory: LoggerFactory, iteration: int, seed: int = 1111, replications: int = 1
+):
 
     iteration_dir = scenario_dir.joinpath(f"iteration_{iteration}")
     iteration_dir.mkdir(exist_ok=True)
@@ -86,7 +89,9 @@ def run_iteration(scenario_dir: Path, logger_factory: LoggerFactory, iteration:
 
     try:
         logger.info("Initializing the model")
-        model = CervicalModel(scenario_dir=scenario_dir, iteration=iteration, logger=logger, seed=seed)
+        model = CervicalModel(
+            scenario_dir=scenario_dir, iteration=iteration, logger=logger, seed=seed, replications=replications
+        )
 
         logger.info("Running the model")
         model.run()
@@ -118,8 +123,20 @@ if __name__ == "__main__":
     parser.add_argument(
         "--seed", type=int, default=1111, help="seed for the random number generator (default: %(default)s)"
     )
+    parser.add_argument(
+        "--replications",
+        type=int,
+        default=1,
+        help="number of iterations to simulate together in each model (default: %(default)s)",
+    )
     args = parser.parse_args()
 
     print(args)
-    runner = Runner(directory=args.input_dir, cpus=args.cpus, num_iterations=args.n, seed=args.seed,)
+    runner = Runner(
+        directory=args.input_dir,
+        cpus=args.cpus,
+        num_iterations=args.n,
+        seed=args.seed,
+        replications=args.replications,
+    )
     runner.run()
@@ -38,27 +38,12 @@ def analyze(scenario_dir: Path, iteration: int = 0):
     params = Parameters()
     params.update_from_file(iteration_path.parent.joinpath("parameters.yml"))
 
-    agent_index = pd.Index(range(params.num_agents))
-
-    # Read all of the state changes
-    temp_df = pd.read_parquet(iteration_path.joinpath("state_changes.parquet"))
-
-    # At what time did each agent die?
-    death_time = temp_df[temp_df.State == LifeState.id][["Time", "Unique_ID"]]
-    death_time = (
-        death_time.set_index("Unique_ID")
-        .rename(columns={"Time": "death_time"})
-        .reindex(agent_index)
-        .fillna(params.num_steps)
-    )
-    # At what time did each agent get cancer?
-    cancer_time = temp_df[temp_df.State == CancerDetectionState.id][["Time", "Unique_ID"]]
-    cancer_time = cancer_time.set_index("Unique_ID").rename(columns={"Time": "cancer_time"}).reindex(agent_index)
-    # At what time did each agent get cancer?
-    hiv_time = temp_df[temp_df.State == HivState.id][["Time", "Unique_ID"]]
-    hiv_time = hiv_time.set_index("Unique_ID").rename(columns={"Time": "hiv_time"}).reindex(agent_index)
-
-    agents = pd.concat(objs=(death_time, cancer_time, hiv_time), axis=1,)
+    # Runs with the first_passage output level keep the time each agent first entered each state
+    first_passage = iteration_path.joinpath("first_passage.parquet").exists()
+    if first_passage:
+        agents = read_first_passage(iteration_path, params)
+    else:
+        agents = read_state_changes(iteration_path, params)
 
     # Compute the age in years. We're rounding to help avoid floating point issues when using these ages later.
     for field in ("death", "cancer", "hiv"):
@@ -79,9 +64,13 @@ def analyze(scenario_dir: Path, iteration: int = 0):
     # ------------------------------------------------------------------------------------------------------------------
     # Gather the cost data.
 
-    costs = pd.read_parquet(iteration_path.joinpath("events.parquet"))
-    # Calculate age
-    costs["Age"] = params.initial_age + costs["Time"] / params.steps_per_year
+    if first_passage:
+        # Summarized events hold the total cost of each event at each age
+        costs = pd.read_parquet(iteration_path.joinpath("event_summary.parquet"))
+    else:
+        costs = pd.read_parquet(iteration_path.joinpath("events.parquet"))
+        # Calculate age
+        costs["Age"] = params.initial_age + costs["Time"] / params.steps_per_year
 
     # Create column of costs for each event
     for e in Event:
@@ -117,8 +106,11 @@ def analyze(scenario_dir: Path, iteration: int = 0):
 
     # ------------------------------------------------------------------------------------------------------------------
     # Cancer Incidence
-    analysis = Analysis(scenario_dir, iteration)
-    ci = 100_000 * analysis.incidence(CancerState.id, CancerState.LOCAL.value)
+    if first_passage:
+        ci = 100_000 * first_passage_incidence(agents["cancer_local_time"], agents["death_time"], params)
+    else:
+        analysis = Analysis(scenario_dir, iteration)
+        ci = 100_000 * analysis.incidence(CancerState.id, CancerState.LOCAL.value)
     cancer_age_groups = [15, 40, 45, 50, 55, 60]
     for i in range(len(cancer_age_groups) - 1):
         age_range = range(cancer_age_groups[i], cancer_age_groups[i + 1])
@@ -130,6 +122,67 @@ def analyze(scenario_dir: Path, iteration: int = 0):
     pd.DataFrame(results, index=[0]).to_csv(iteration_path.joinpath("results.csv"), index=False)
 
 
+def read_state_changes(iteration_path: Path, params: Parameters) -> pd.DataFrame:
+    """ Return the times each agent died, had cancer detected, and got HIV, from the state changes
+    """
+    agent_index = pd.Index(range(params.num_agents))
+
+    # Read all of the state changes
+    temp_df = pd.read_parquet(iteration_path.joinpath("state_changes.parquet"))
+
+    # At what time did each agent die?
+    death_time = temp_df[temp_df.State == LifeState.id][["Time", "Unique_ID"]]
+    death_time = (
+        death_time.set_index("Unique_ID")
+        .rename(columns={"Time": "death_time"})
+        .reindex(agent_index)
+        .fillna(params.num_steps)
+    )
+    # At what time did each agent get cancer?
+    cancer_time = temp_df[temp_df.State == CancerDetectionState.id][["Time", "Unique_ID"]]
+    cancer_time = cancer_time.set_index("Unique_ID").rename(columns={"Time": "cancer_time"}).reindex(agent_index)
+    # At what time did each agent get cancer?
+    hiv_time = temp_df[temp_df.State == HivState.id][["Time", "Unique_ID"]]
+    hiv_time = hiv_time.set_index("Unique_ID").rename(columns={"Time": "hiv_time"}).reindex(agent_index)
+
+    return pd.concat(objs=(death_time, cancer_time, hiv_time), axis=1,)
+
+
+def read_first_passage(iteration_path: Path, params: Parameters) -> pd.DataFrame:
+    """ Return the same times as `read_state_changes` (and the time of cancer onset) from the first passage times
+    """
+    times = pd.read_parquet(iteration_path.joinpath("first_passage.parquet")).set_index("Unique_ID")
+    # Agents that never entered a state have a time of -1
+    times = times.where(times >= 0).astype(float)
+    agents = pd.DataFrame(
+        {
+            "death_time": times["dead"].fillna(params.num_steps),
+            "cancer_time": times["cancer_detected"],
+            "hiv_time": times["hiv"],
+            "cancer_local_time": times["cancer_local"],
+        }
+    )
+    agents.index.name = None
+    return agents
+
+
+def first_passage_incidence(entry_time: pd.Series, death_time: pd.Series, params: Parameters) -> pd.Series:
+    """ Return the incidence of a state that agents enter at most once, as `Analysis.incidence` computes it
+    """
+    ages = int(params.num_steps / params.steps_per_year + 1)
+    age_index = pd.Index(range(params.initial_age, params.initial_age + ages))
+    # As in `Analysis`, a time step belongs to age `initial_age + round(time / steps_per_year)`
+    entry_age = (entry_time / params.steps_per_year).round() + params.initial_age
+    death_age = (death_time.where(death_time < params.num_steps) / params.steps_per_year).round() + params.initial_age
+    death_age = death_age.fillna(age_index[-1] + 1)
+    # Agents are counted at an age if they are alive at its end
+    alive = pd.Series([(death_age > age).sum() for age in age_index], index=age_index)
+    entries = entry_age[entry_age < death_age].value_counts().reindex(age_index).fillna(0)
+    alive_count = alive.rolling(2).mean()
+    alive_count[params.initial_age] = alive[params.initial_age]
+    return entries / alive_count
+
+
 def main(args):
     analyze(args.scenario_dir, args.iteration)
 
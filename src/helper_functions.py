@@ -3,6 +3,8 @@ import math
 from pathlib import Path
 
 import pandas as pd
+from model.cervical_model import first_passage_states
+from model.state import int_map
 
 
 def combine_age_groups(df, ages, target):
@@ -25,6 +27,32 @@ def combine_age_groups(df, ages, target):
     return df_final
 
 
+def count_entries(iteration_dir: Path, field: str, state: int) -> int:
+    """ Return the number of times agents entered a state of a field (a State ID or the name of an HPV strain), from
+    whichever state output the run saved: every state change, the state summary, or the first passage times. First
+    passage times only keep each agent's first entry, so they count entries into states that agents never leave.
+    """
+    iteration_dir = Path(iteration_dir)
+    path = iteration_dir.joinpath("state_changes.parquet")
+    if path.exists():
+        changes = pd.read_parquet(path, columns=["State", "To"])
+        return int(((changes["State"] == field) & (changes["To"] == state)).sum())
+
+    path = iteration_dir.joinpath("state_summary.parquet")
+    if path.exists():
+        summary = pd.read_parquet(path)
+        return int(summary.loc[(summary["State"] == field) & (summary["To"] == state), "Count"].sum())
+
+    path = iteration_dir.joinpath("first_passage.parquet")
+    state_ids = {name: state_id for state_id, name in int_map.items()}
+    names = [name for name, key in first_passage_states().items() if key == (state_ids[field], state)]
+    if path.exists() and names:
+        # Agents that never entered the state have a time of -1
+        return int((pd.read_parquet(path, columns=names)[names[0]] >= 0).sum())
+
+    raise FileNotFoundError(f"{iteration_dir} has no output to count entries into state {state} of {field} from.")
+
+
 def get_pool_count():
     """Return a reasonable CPU count to use
     """
@@ -1,5 +1,4 @@
 import argparse
-import pickle
 from copy import copy
 from distutils.dir_util import copy_tree
 from pathlib import Path
@@ -8,6 +7,7 @@ from shutil import copyfile
 import numpy as np
 import pandas as pd
 from model.state import AgeGroup, CancerDetectionState, CancerState, HivState, HpvImmunity, HpvState, HpvStrain
+from model.transition_table import TransitionTable
 
 
 def to_monthly_prob(val: float, per: int = 1000) -> float:
@@ -58,7 +58,7 @@ def main(args):
         baseline = mortality.set_index("age").apply(to_monthly_prob, per=10_000)
     baseline.columns = [HivState.NORMAL.name, HivState.HIV.name]
 
-    life_dict = dict()
+    life_table = TransitionTable.empty(axes=[baseline.index, HivState, CancerState])
     for age in baseline.index:
         a = AgeGroup["AGE_{}".format(age)]
         for hiv in HivState:
@@ -73,7 +73,7 @@ def main(args):
                     p = 1 - survival[survival.Type == "Distant"].Value.values[0] ** (1 / float(60))
                 if cancer.value == CancerState.DEAD:  # 0: Can't die if you are already dead
                     p = 0
-                life_dict[(a.value, hiv.value, cancer.value)] = p
+                life_table[(a.value, hiv.value, cancer.value)] = p
 
     # ------------------------------------------------------------------------------------------------------------------
     # ----- HPV matrix
@@ -119,7 +119,9 @@ def main(args):
     # chart image. Instead, we looked it up in Table 2 of the paper and record it here as 371.7 per 1,000 woman-years.
     baseline_hpv_to_normal = to_monthly_prob(371.7)
 
-    hpv_dict = dict()
+    hpv_table = TransitionTable.empty(
+        axes=[baseline.index, HpvStrain, HpvImmunity, HpvState, HivState], num_states=len(HpvState)
+    )
     for age in baseline.index:
         a = AgeGroup["AGE_{}".format(age)]
         for hpv_strain in HpvStrain:
@@ -151,19 +153,22 @@ def main(args):
 
                     for hiv_status in HivState:
                         key = (a.value, hpv_strain.value, hpv_imm.value, hpv_state.value, hiv_status.value)
-                        hpv_dict[key] = copy(p_values)
+                        hpv_table[key] = copy(p_values)
 
     # ------------------------------------------------------------------------------------------------------------------
     # ----- HIV matrix: Only Zambia has HIV probabilities
+    hiv_table = TransitionTable.empty(axes=[baseline.index])
     if is_zambia:
         baseline_normal_to_hiv = make_baseline(pd.read_csv(base_documents_dir.joinpath("data/normal_to_hiv.csv")))
-        hiv_dict = {(k,): baseline_normal_to_hiv.at[k, "hiv"] for k in baseline.index}
+        for k in baseline.index:
+            hiv_table[(k,)] = baseline_normal_to_hiv.at[k, "hiv"]
     else:
-        hiv_dict = {(k,): 0 for k in baseline.index}
+        for k in baseline.index:
+            hiv_table[(k,)] = 0
 
     # ------------------------------------------------------------------------------------------------------------------
     # ----- Cancer matrix
-    cancer_dict = dict()
+    cancer_table = TransitionTable.empty(axes=[CancerDetectionState, CancerState], num_states=len(CancerState))
     # local to regional: The rates of cancer progression are taken from Table 2 of paper.
     p1 = to_monthly_prob(242.3)
     # regional to distant: The rates of cancer progression are taken from Table 2 of paper.
@@ -171,38 +176,33 @@ def main(args):
 
     # --- Only Local to Regional and Regional to Distant are allowed.
     # --- We don't model cancer incidence here. Additional events will trigger a transition out of the NORMAL state.
-    cancer_dict[(CancerDetectionState.UNDETECTED.value, CancerState.NORMAL.value)] = [1, 0, 0, 0, 0]
-    cancer_dict[(CancerDetectionState.UNDETECTED.value, CancerState.LOCAL.value)] = [0, 1 - p1, p1, 0, 0]
-    cancer_dict[(CancerDetectionState.UNDETECTED.value, CancerState.REGIONAL.value)] = [0, 0, 1 - p2, p2, 0]
-    cancer_dict[(CancerDetectionState.UNDETECTED.value, CancerState.DISTANT.value)] = [0, 0, 0, 1, 0]
-    cancer_dict[(CancerDetectionState.UNDETECTED.value, CancerState.DEAD.value)] = [0, 0, 0, 0, 1]
+    cancer_table[(CancerDetectionState.UNDETECTED.value, CancerState.NORMAL.value)] = [1, 0, 0, 0, 0]
+    cancer_table[(CancerDetectionState.UNDETECTED.value, CancerState.LOCAL.value)] = [0, 1 - p1, p1, 0, 0]
+    cancer_table[(CancerDetectionState.UNDETECTED.value, CancerState.REGIONAL.value)] = [0, 0, 1 - p2, p2, 0]
+    cancer_table[(CancerDetectionState.UNDETECTED.value, CancerState.DISTANT.value)] = [0, 0, 0, 1, 0]
+    cancer_table[(CancerDetectionState.UNDETECTED.value, CancerState.DEAD.value)] = [0, 0, 0, 0, 1]
     # --- Once detected, no one changes states
-    cancer_dict[(CancerDetectionState.DETECTED.value, CancerState.NORMAL.value)] = [1, 0, 0, 0, 0]
-    cancer_dict[(CancerDetectionState.DETECTED.value, CancerState.LOCAL.value)] = [0, 1, 0, 0, 0]
-    cancer_dict[(CancerDetectionState.DETECTED.value, CancerState.REGIONAL.value)] = [0, 0, 1, 0, 0]
-    cancer_dict[(CancerDetectionState.DETECTED.value, CancerState.DISTANT.value)] = [0, 0, 0, 1, 0]
-    cancer_dict[(CancerDetectionState.DETECTED.value, CancerState.DEAD.value)] = [0, 0, 0, 0, 1]
+    cancer_table[(CancerDetectionState.DETECTED.value, CancerState.NORMAL.value)] = [1, 0, 0, 0, 0]
+    cancer_table[(CancerDetectionState.DETECTED.value, CancerState.LOCAL.value)] = [0, 1, 0, 0, 0]
+    cancer_table[(CancerDetectionState.DETECTED.value, CancerState.REGIONAL.value)] = [0, 0, 1, 0, 0]
+    cancer_table[(CancerDetectionState.DETECTED.value, CancerState.DISTANT.value)] = [0, 0, 0, 1, 0]
+    cancer_table[(CancerDetectionState.DETECTED.value, CancerState.DEAD.value)] = [0, 0, 0, 0, 1]
 
     # ------------------------------------------------------------------------------------------------------------------
     # ----- CancerDetection matrix
-    detection_dict = dict()
-    detection_dict[CancerState.NORMAL.value] = 0
-    detection_dict[CancerState.LOCAL.value] = to_monthly_prob(210.6)
-    detection_dict[CancerState.REGIONAL.value] = to_monthly_prob(916.1)
-    detection_dict[CancerState.DISTANT.value] = to_monthly_prob(2302.6)
-    detection_dict[CancerState.DEAD.value] = 0
-
-    # Save Transition Dictionaries
-    with open(transition_dictionary_dir.joinpath("life_dictionary.pickle"), "wb") as handle:
-        pickle.dump(life_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-    with open(transition_dictionary_dir.joinpath("hpv_dictionary.pickle"), "wb") as handle:
-        pickle.dump(hpv_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-    with open(transition_dictionary_dir.joinpath("hiv_dictionary.pickle"), "wb") as handle:
-        pickle.dump(hiv_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-    with open(transition_dictionary_dir.joinpath("cancer_dictionary.pickle"), "wb") as handle:
-        pickle.dump(cancer_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
-    with open(transition_dictionary_dir.joinpath("cancer_detection_dictionary.pickle"), "wb") as handle:
-        pickle.dump(detection_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    detection_table = TransitionTable.empty(axes=[CancerState], scalar_key=True)
+    detection_table[CancerState.NORMAL.value] = 0
+    detection_table[CancerState.LOCAL.value] = to_monthly_prob(210.6)
+    detection_table[CancerState.REGIONAL.value] = to_monthly_prob(916.1)
+    detection_table[CancerState.DISTANT.value] = to_monthly_prob(2302.6)
+    detection_table[CancerState.DEAD.value] = 0
+
+    # Save Transition Tables
+    life_table.save(transition_dictionary_dir.joinpath("life_table.npz"))
+    hpv_table.save(transition_dictionary_dir.joinpath("hpv_table.npz"))
+    hiv_table.save(transition_dictionary_dir.joinpath("hiv_table.npz"))
+    cancer_table.save(transition_dictionary_dir.joinpath("cancer_table.npz"))
+    detection_table.save(transition_dictionary_dir.joinpath("cancer_detection_table.npz"))
 
     # ----- Create base scenario examples:
     tdd = transition_dictionary_dir
@@ -217,7 +217,7 @@ def main(args):
 
     # ------------------------------------------------------------------------------------------------------------------
     # Lets run a quick check of the HPV keys
-    keys = pd.DataFrame(list(hpv_dict.keys()))
+    keys = pd.DataFrame(list(hpv_table.keys()))
     # Age
     ages = keys[0].unique()
     assert min(ages) == 9
@@ -140,10 +140,9 @@ def main(batch: str, country: str):
                 transition_dir = iteration_dir.joinpath("transition_dictionaries")
                 transition_dir.mkdir(exist_ok=True)
 
-                # Save the pickles as alias files
-                for dict_name in ["cancer_detection", "cancer", "hpv", "hiv", "life"]:
-                    dst = transition_dir.joinpath(dict_name + "_dictionary.pickle")
-                    src = source.joinpath("transition_dictionaries", dict_name + "_dictionary.pickle")
+                # Save the transition files (tables or older pickles) as alias files
+                for src in source.joinpath("transition_dictionaries").iterdir():
+                    dst = transition_dir.joinpath(src.name)
                     try:
                         try:
                             dst.unlink()
@@ -1,13 +1,12 @@
 import pickle
-import shutil
 from copy import deepcopy
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import yaml
-from model.misc_functions import normalize
 from model.state import AgeGroup, CancerState, HivState, HpvImmunity, HpvState, HpvStrain
+from model.transition_table import TransitionTable, load_transition_table
 
 
 def create_multipliers(df: pd.DataFrame, rng: np.random.RandomState = None, use_selected: bool = False) -> list:
@@ -99,62 +98,71 @@ def create_list_of_updates(df: pd.DataFrame, multipliers: list) -> list:
     return updates
 
 
-def find_all_keys(keys: list, filters: dict) -> list:
-    """Given a list of keys and a dictionary of filters, find all keys that match these filters
+def find_all_keys(table: TransitionTable, filters: dict) -> np.ndarray:
+    """Given a transition table and a dictionary of filters, find all keys that match these filters
 
     Args:
-        keys (list): [...]
-        filters (dict): [...]
+        table (TransitionTable): [...]
+        filters (dict): The allowed values of each key field, by the field's position in the key
 
     Returns:
-        list: A list of keys that match the filters
+        np.ndarray: A boolean mask over the table's keys that is True for each defined key that matches the filters
     """
-    final_keys = keys
+    mask = table.defined.copy()
     for k, v in filters.items():
-        final_keys = [key for key in final_keys if key[k] in v]
+        shape = [1] * mask.ndim
+        shape[k] = -1
+        values = np.arange(mask.shape[k]) + table.offsets[k]
+        mask &= np.isin(values, v).reshape(shape)
 
-    return final_keys
+    return mask
+
+
+def normalize_table(table: TransitionTable) -> None:
+    """Normalize the to-state probabilities of every defined key back to 1
+
+    Args:
+        table (TransitionTable): [...]
+    """
+    probabilities = table.data[table.defined]
+    table.data[table.defined] = probabilities / probabilities.sum(axis=-1, keepdims=True)
 
 
 def save_cancer(baseline_dir: Path, scenario_dir: Path) -> None:
-    """Save the Cancer dictionaries as pickles
+    """Save the Cancer transition tables
 
     Args:
         baseline_dir [Path]: [...]
         scenario_dir [Path]: [...]
     """
     for item in ["cancer", "cancer_detection"]:
-        shutil.copyfile(
-            baseline_dir.joinpath(item + "_dictionary.pickle"),
-            scenario_dir.joinpath("transition_dictionaries/" + item + "_dictionary.pickle"),
-        )
+        table = load_transition_table(baseline_dir, item)
+        table.save(scenario_dir.joinpath("transition_dictionaries/" + item + "_table.npz"))
 
 
 def update_and_save_life(baseline_dir: Path, scenario_dir: Path) -> None:
-    """Save the life dictionary as a pickle
+    """Save the life transition table
 
     Args:
         baseline_dir [Path]: [...]
         scenario_dir [Path]: [...]
     """
-    with open(baseline_dir.joinpath("life_dictionary.pickle"), "rb") as handle:
-        life_dict = pickle.load(handle)
+    life_dict = load_transition_table(baseline_dir, "life")
     life_multiplier = pd.read_csv(baseline_dir.parent.joinpath("base_documents/life_multiplier.csv")).Value[0]
     for k, v in life_dict.items():
         if k[2] == CancerState.NORMAL.value:
             life_dict[k] = v * (1 / life_multiplier)
-    with open(scenario_dir.joinpath("transition_dictionaries/life_dictionary.pickle"), "wb") as handle:
-        pickle.dump(life_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    life_dict.save(scenario_dir.joinpath("transition_dictionaries/life_table.npz"))
 
 
-def update_hiv(hiv_dict: dict) -> dict:
+def update_hiv(hiv_dict: TransitionTable) -> TransitionTable:
     """Update the HIV probabilities using the HIV multipliers
 
     Args:
-        hiv_dict (dict): [...]
+        hiv_dict (TransitionTable): [...]
 
     Returns:
-        [dict]: An updated dictionary of HIV probabilities
+        [TransitionTable]: An updated table of HIV probabilities
     """
     hiv_multipliers = pd.read_csv("experiments/zambia/base_documents/hiv_multipliers.csv")
     age_ranges = []
@@ -176,21 +184,19 @@ def update_hiv(hiv_dict: dict) -> dict:
 
 
 def update_and_save_hiv(baseline_dir: Path, scenario_dir: Path) -> None:
-    """Save the HIV dictionary as a pickle
+    """Save the HIV transition table
 
     Args:
         baseline_dir [Path]: [...]
         scenario_dir [Path]: [...]
     """
-    with open(baseline_dir.joinpath("hiv_dictionary.pickle"), "rb") as handle:
-        hiv_dict = pickle.load(handle)
+    hiv_dict = load_transition_table(baseline_dir, "hiv")
     if "zambia" in str(scenario_dir):
         hiv_dict = update_hiv(hiv_dict=hiv_dict)
-    with open(scenario_dir.joinpath("transition_dictionaries/hiv_dictionary.pickle"), "wb") as handle:
-        pickle.dump(hiv_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    hiv_dict.save(scenario_dir.joinpath("transition_dictionaries/hiv_table.npz"))
 
 
-def update_hpv(hpv_dict: dict, base_updates: list, cm_df: pd.DataFrame) -> dict:
+def update_hpv(hpv_dict: TransitionTable, base_updates: list, cm_df: pd.DataFrame) -> TransitionTable:
     """ Update the HPV probabilty dictionary using a list of updates
     """
     hpv_dict_copy = deepcopy(hpv_dict)
@@ -208,20 +214,18 @@ def update_hpv(hpv_dict: dict, base_updates: list, cm_df: pd.DataFrame) -> dict:
         if "hiv" in update:
             filters[4] = [update["hiv"]]
 
-        keys = find_all_keys(hpv_dict.keys(), filters)
+        keys = find_all_keys(hpv_dict, filters)
         # Find the element of the list to update
         to_value = update["to"] - 1
-        # Multiple probability by the multiplier`
-        for key in keys:
-            # If Immunity - the value should be (1 - current value), as this is a percent reduction
-            multiplier = update["multiplier"]
-            if "immunity" in update:
-                multiplier = 1 - multiplier
-            hpv_dict_copy[key][to_value] = hpv_dict_copy[key][to_value] * multiplier
+        # If Immunity - the value should be (1 - current value), as this is a percent reduction
+        multiplier = update["multiplier"]
+        if "immunity" in update:
+            multiplier = 1 - multiplier
+        # Multiple probability by the multiplier
+        hpv_dict_copy.data[keys, to_value] *= multiplier
 
     # ----- Normalize all of the probabilities back to 1
-    for key in hpv_dict_copy.keys():
-        hpv_dict_copy[key] = normalize(hpv_dict_copy[key], return_cdf=False)
+    normalize_table(hpv_dict_copy)
 
     # ----- CURVE MULTIPLIER UPDATES -----------------------------------------------------------------------------------
     age_ranges = []
@@ -259,13 +263,12 @@ def update_hpv(hpv_dict: dict, base_updates: list, cm_df: pd.DataFrame) -> dict:
                     if temp_row.HIV != "ALL":
                         filters[4] = [HivState[temp_row.HIV].value]  # HIV
 
-                    keys = find_all_keys(hpv_dict.keys(), filters)
+                    keys = find_all_keys(hpv_dict, filters)
                     list_location = combo[1] - 1
                     multiplier = temp_row["Current"]
                     if combo[1] < combo[0]:
                         multiplier = 1 / temp_row["Current"]
-                    for key in keys:
-                        hpv_dict_copy[key][list_location] *= multiplier
+                    hpv_dict_copy.data[keys, list_location] *= multiplier
 
             # ----- CIN23
             if temp_row.State == "CIN23":
@@ -283,13 +286,12 @@ def update_hpv(hpv_dict: dict, base_updates: list, cm_df: pd.DataFrame) -> dict:
                         3: [combo[0]],  # Current Hpv State
                         4: [HivState[temp_row.HIV].value],  # HIV
                     }
-                    keys = find_all_keys(hpv_dict.keys(), filters)
+                    keys = find_all_keys(hpv_dict, filters)
                     list_location = combo[1] - 1
                     multiplier = temp_row["Current"]
                     if combo[1] < combo[0]:
                         multiplier = 1 / temp_row["Current"]
-                    for key in keys:
-                        hpv_dict_copy[key][list_location] *= multiplier
+                    hpv_dict_copy.data[keys, list_location] *= multiplier
 
             # ----- CANCER
             if temp_row.State == "CANCER":
@@ -298,21 +300,19 @@ def update_hpv(hpv_dict: dict, base_updates: list, cm_df: pd.DataFrame) -> dict:
                     0: [AgeGroup[value].value],  # Age
                     3: [HpvState.CIN_2_3.value],  # Current Hpv State
                 }
-                keys = find_all_keys(hpv_dict.keys(), filters)
+                keys = find_all_keys(hpv_dict, filters)
                 multiplier = temp_row["Current"]
                 list_location = HpvState.CANCER.value - 1
-                for key in keys:
-                    hpv_dict_copy[key][list_location] *= multiplier
+                hpv_dict_copy.data[keys, list_location] *= multiplier
 
     # ----- Normalize all of the probabilities back to 1
-    for key in hpv_dict_copy.keys():
-        hpv_dict_copy[key] = normalize(probability_list=hpv_dict_copy[key], return_cdf=False)
+    normalize_table(hpv_dict_copy)
 
     return hpv_dict_copy
 
 
 def update_and_save_hpv(baseline_dir: Path, scenario_dir: Path, base_updates: list, cm_df: pd.DataFrame):
-    """Update and Save the HPV dictionary as a pickle
+    """Update and Save the HPV transition table
 
     Args:
         baseline_dir [Path]: [...]
@@ -320,13 +320,11 @@ def update_and_save_hpv(baseline_dir: Path, scenario_dir: Path, base_updates: li
         updates [list]: [...]
     """
 
-    with open(baseline_dir.joinpath("hpv_dictionary.pickle"), "rb") as handle:
-        hpv_dict = pickle.load(handle)
+    hpv_dict = load_transition_table(baseline_dir, "hpv")
 
     hpv_dict = update_hpv(hpv_dict, base_updates, cm_df)
 
-    with open(scenario_dir.joinpath("transition_dictionaries/hpv_dictionary.pickle"), "wb") as handle:
-        pickle.dump(hpv_dict, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    hpv_dict.save(scenario_dir.joinpath("transition_dictionaries/hpv_table.npz"))
 
 
 def prepare_scenario(